@@ -42,9 +42,24 @@ coverage run -a tests/test_models_systems_configuration.py
 echo ; echo ; echo "########################################################################################################################"
 coverage run -a tests/test_models_deployments_configuration.py
 
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_models_task_execution.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_models_kind_registry.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_models_manifest_bundle.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_models_configuration_diff.py
+
 echo ; echo ; echo "########################################################################################################################"
 coverage run -a tests/test_utils_parser2.py
 
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_utils_parser.py
+
 echo ; echo ; echo "########################################################################################################################"
 coverage run -a tests/test_verbacratis.py
 
@@ -54,6 +69,18 @@ coverage run -a tests/test_utils_cli_arguments.py
 echo ; echo ; echo "########################################################################################################################"
 coverage run -a tests/test_utils_git_integration.py
 
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_utils_build_context.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_utils_manifest_fetcher.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_utils_location_mirror.py
+
+echo ; echo ; echo "########################################################################################################################"
+coverage run -a tests/test_utils_git_mirror_cache.py
+
 echo ; echo ; echo "########################################################################################################################"
 coverage run -a tests/test_utils_http_requests_io.py
 
@@ -76,7 +103,6 @@ echo "Report available in file://$PWD/reports/index.html"
 # coverage run -a tests/test_aws.py
 # coverage run -a tests/test_functions.py
 # coverage run -a tests/test_functions_aws_helpers.py
-# coverage run -a tests/test_utils_parser.py
 
 docker container stop echo_server
 docker container rm echo_server
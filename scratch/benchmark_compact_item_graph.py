@@ -0,0 +1,109 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+# Compares the memory use and traversal time of the name based Items model against the CompactItemGraph for a large
+# generated estate.
+#
+# Run from the project root with:
+#
+#   python3 scratch/benchmark_compact_item_graph.py [QTY_ITEMS]
+
+import sys
+import os
+import random
+import time
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from verbacratis.models.ordering import Item, Items, CompactItemGraph
+
+
+QTY_ITEMS = 50000
+QTY_SCOPES = 8
+MAX_PARENTS = 3
+
+
+def generate_items(qty: int)->Items:
+    random.seed(42)
+    items = Items()
+    for i in range(qty):
+        item = Item(name='project-{:06d}'.format(i), use_default_scope=False)
+        for scope_idx in random.sample(range(QTY_SCOPES), 3):
+            item.add_scope(scope_name='env{}'.format(scope_idx))
+        if i > 0:
+            for parent_idx in random.sample(range(max(0, i-1000), i), min(i, random.randint(0, MAX_PARENTS))):
+                item.add_parent_item_name(parent_item_name='project-{:06d}'.format(parent_idx))
+        items.add_item(item=item)
+    return items
+
+
+def name_based_descendants(items: Items, scope_name: str, changed_item_names: list)->set:
+    # The traversal as it would be done directly on the Item objects, without the compact graph
+    children = dict()
+    for item_name in items.items:
+        children[item_name] = list()
+    for item_name, item in items.items.items():
+        for parent_item_name in item.parent_item_names:
+            if parent_item_name in children:
+                children[parent_item_name].append(item_name)
+    affected = set()
+    pending = list()
+    for item_name in changed_item_names:
+        if scope_name in items.items[item_name].scopes:
+            affected.add(item_name)
+            pending.append(item_name)
+    while len(pending) > 0:
+        current_item_name = pending.pop()
+        for child_item_name in children[current_item_name]:
+            if child_item_name not in affected and scope_name in items.items[child_item_name].scopes:
+                affected.add(child_item_name)
+                pending.append(child_item_name)
+    return affected
+
+
+def measure_memory(f):
+    tracemalloc.start()
+    result = f()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def measure_time(f, repeat: int=5)->float:
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        f()
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+if __name__ == '__main__':
+    qty = QTY_ITEMS
+    if len(sys.argv) > 1:
+        qty = int(sys.argv[1])
+    items, items_memory = measure_memory(lambda: generate_items(qty=qty))
+    graph, graph_memory = measure_memory(lambda: CompactItemGraph(items=items))
+    print('Items                        : {}'.format(qty))
+    print('Memory - Items model         : {:.1f} MiB'.format(items_memory / 1048576))
+    print('Memory - CompactItemGraph    : {:.1f} MiB'.format(graph_memory / 1048576))
+    print('Build  - CompactItemGraph    : {:.2f} ms'.format(measure_time(lambda: CompactItemGraph(items=items), repeat=1) * 1000))
+
+    changed = ['project-{:06d}'.format(i) for i in range(0, qty, max(1, qty // 20))]
+    name_based = measure_time(lambda: name_based_descendants(items=items, scope_name='env1', changed_item_names=changed))
+    start_ids = [graph.ids[name] for name in changed]
+    compact = measure_time(lambda: graph.get_reachable_ids(start_ids=start_ids, scope_name='env1'))
+    ordered = measure_time(lambda: items.get_affected_item_names(scope_name='env1', changed_item_names=changed))
+    qty_affected = len(graph.get_reachable_ids(start_ids=start_ids, scope_name='env1'))
+    assert len(name_based_descendants(items=items, scope_name='env1', changed_item_names=changed)) == qty_affected
+    print('Affected items               : {}'.format(qty_affected))
+    print('Traverse - name based        : {:.2f} ms'.format(name_based * 1000))
+    print('Traverse - CompactItemGraph  : {:.2f} ms'.format(compact * 1000))
+    print('Affected + ordered (Items)   : {:.2f} ms'.format(ordered * 1000))
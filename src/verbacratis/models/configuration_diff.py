@@ -0,0 +1,246 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import json
+import hashlib
+from verbacratis.models.systems_configuration import SystemConfigurations
+from verbacratis.models.deployments_configuration import Projects
+
+
+# Increment when the way object hashes are calculated changes, so that trees of older versions are never compared
+HASH_TREE_VERSION = 1
+
+
+def get_data_hash(data: object)->str:
+    """The SHA256 hash of the canonical JSON form of `data` (sorted keys, no white space)"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+
+
+def get_object_hash(item: object)->str:
+    """The hash of the `as_dict()` value of an object"""
+    return get_data_hash(data=item.as_dict())
+
+
+def _get_name_bucket(name: str)->str:
+    return hashlib.sha256(name.encode('utf-8')).hexdigest()[:2]
+
+
+def _get_combined_hash(hashes: dict)->str:
+    h = hashlib.sha256()
+    for key in sorted(hashes.keys()):
+        h.update('{}:{}\n'.format(key, hashes[key]).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ConfigurationHashTree:
+    """A Merkle tree of the objects of a configuration
+
+    Objects are kept by kind and name with the hash of the object. Below each kind, the names are spread over 256
+    buckets by the hash of the name. The hash of a bucket combines the hashes of its objects, the hash of a kind
+    combines the hashes of its buckets, and the root hash combines the hashes of the kinds. Two trees are compared from
+    the root down, only descending where the hashes differ (see :func:`diff_hash_trees`).
+
+    A tree can be saved with :meth:`as_dict` after a build, and restored with :meth:`from_dict` to compare the next
+    build against it.
+
+    Attributes:
+        objects: The kind as key, with a dictionary by bucket of dictionaries of object hashes by name as value
+    """
+
+    def __init__(self):
+        self.objects = dict()
+        self._bucket_hashes = None
+        self._kind_hashes = None
+        self._root_hash = None
+
+    def add(self, kind: str, name: str, object_hash: str):
+        bucket = _get_name_bucket(name=name)
+        if kind not in self.objects:
+            self.objects[kind] = dict()
+        if bucket not in self.objects[kind]:
+            self.objects[kind][bucket] = dict()
+        self.objects[kind][bucket][name] = object_hash
+        self._bucket_hashes = None
+        self._kind_hashes = None
+        self._root_hash = None
+
+    def _calculate_hashes(self):
+        self._bucket_hashes = dict()
+        self._kind_hashes = dict()
+        for kind, buckets in self.objects.items():
+            self._bucket_hashes[kind] = dict()
+            for bucket, object_hashes in buckets.items():
+                self._bucket_hashes[kind][bucket] = _get_combined_hash(hashes=object_hashes)
+            self._kind_hashes[kind] = _get_combined_hash(hashes=self._bucket_hashes[kind])
+        self._root_hash = _get_combined_hash(hashes=self._kind_hashes)
+
+    def get_root_hash(self)->str:
+        if self._root_hash is None:
+            self._calculate_hashes()
+        return self._root_hash
+
+    def get_kind_hashes(self)->dict:
+        if self._kind_hashes is None:
+            self._calculate_hashes()
+        return self._kind_hashes
+
+    def get_bucket_hashes(self, kind: str)->dict:
+        if self._bucket_hashes is None:
+            self._calculate_hashes()
+        return self._bucket_hashes.get(kind, dict())
+
+    def get_object_hashes(self, kind: str, bucket: str)->dict:
+        return self.objects.get(kind, dict()).get(bucket, dict())
+
+    def get_object_qty(self)->int:
+        qty = 0
+        for buckets in self.objects.values():
+            for object_hashes in buckets.values():
+                qty += len(object_hashes)
+        return qty
+
+    def as_dict(self)->dict:
+        root = dict()
+        root['version'] = HASH_TREE_VERSION
+        root['rootHash'] = self.get_root_hash()
+        root['objects'] = dict()
+        for kind, buckets in self.objects.items():
+            root['objects'][kind] = dict()
+            for object_hashes in buckets.values():
+                root['objects'][kind].update(object_hashes)
+        return root
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Restore a tree saved with :meth:`as_dict`
+
+        Raises:
+            Exception: If the tree was saved by another version
+        """
+        if data.get('version') != HASH_TREE_VERSION:
+            raise Exception('Hash tree version {} is not supported (expected version {})'.format(data.get('version'), HASH_TREE_VERSION))
+        tree = cls()
+        for kind, object_hashes in data['objects'].items():
+            for name, object_hash in object_hashes.items():
+                tree.add(kind=kind, name=name, object_hash=object_hash)
+        return tree
+
+
+class ConfigurationDiff:
+    """The differences between two configurations
+
+    Attributes:
+        added: A list of (kind, name) tuples of objects only in the current configuration
+        removed: A list of (kind, name) tuples of objects only in the previous configuration
+        changed: A list of (kind, name) tuples of objects in both configurations, with a different hash
+    """
+
+    def __init__(self):
+        self.added = list()
+        self.removed = list()
+        self.changed = list()
+
+    def is_empty(self)->bool:
+        return len(self.added) == 0 and len(self.removed) == 0 and len(self.changed) == 0
+
+    def get_names(self, kind: str)->list:
+        """The names of the added, removed and changed objects of a kind"""
+        names = list()
+        for object_kind, name in self.added + self.removed + self.changed:
+            if object_kind == kind and name not in names:
+                names.append(name)
+        return names
+
+    def as_dict(self)->dict:
+        root = dict()
+        for key, items in (('added', self.added), ('removed', self.removed), ('changed', self.changed)):
+            root[key] = [{'kind': kind, 'name': name} for kind, name in items]
+        return root
+
+
+def diff_hash_trees(previous: ConfigurationHashTree, current: ConfigurationHashTree)->ConfigurationDiff:
+    """Compare two hash trees
+
+    Kinds and buckets with the same hash in both trees are skipped, so for a small change only the buckets holding the
+    changed objects are compared.
+
+    Returns:
+        ConfigurationDiff: The differences, each list sorted by kind and name
+    """
+    diff = ConfigurationDiff()
+    if previous.get_root_hash() == current.get_root_hash():
+        return diff
+    previous_kind_hashes = previous.get_kind_hashes()
+    current_kind_hashes = current.get_kind_hashes()
+    for kind in sorted(set(previous_kind_hashes.keys()) | set(current_kind_hashes.keys())):
+        if previous_kind_hashes.get(kind) == current_kind_hashes.get(kind):
+            continue
+        previous_bucket_hashes = previous.get_bucket_hashes(kind=kind)
+        current_bucket_hashes = current.get_bucket_hashes(kind=kind)
+        for bucket in set(previous_bucket_hashes.keys()) | set(current_bucket_hashes.keys()):
+            if previous_bucket_hashes.get(bucket) == current_bucket_hashes.get(bucket):
+                continue
+            previous_object_hashes = previous.get_object_hashes(kind=kind, bucket=bucket)
+            current_object_hashes = current.get_object_hashes(kind=kind, bucket=bucket)
+            for name, object_hash in current_object_hashes.items():
+                if name not in previous_object_hashes:
+                    diff.added.append((kind, name))
+                elif previous_object_hashes[name] != object_hash:
+                    diff.changed.append((kind, name))
+            for name in previous_object_hashes:
+                if name not in current_object_hashes:
+                    diff.removed.append((kind, name))
+    diff.added.sort()
+    diff.removed.sort()
+    diff.changed.sort()
+    return diff
+
+
+def get_system_configurations_hash_tree(system_configurations: SystemConfigurations)->ConfigurationHashTree:
+    """The hash tree of all objects of a :class:`verbacratis.models.systems_configuration.SystemConfigurations` instance, by bucket (kind) and name
+
+    Objects that were not created yet (see :meth:`verbacratis.models.systems_configuration.SystemConfigurations.set_target_environments`) are created first.
+    """
+    tree = ConfigurationHashTree()
+    for kind, documents in system_configurations.as_dict().items():
+        for name, data in documents.items():
+            tree.add(kind=kind, name=name, object_hash=get_data_hash(data=data))
+    return tree
+
+
+def get_projects_hash_tree(projects: Projects)->ConfigurationHashTree:
+    """The hash tree of the projects and manifest locations of a :class:`verbacratis.models.deployments_configuration.Projects` instance
+
+    The hash of a manifest location includes its checksum, so a location whose files changed is reported as changed.
+    """
+    tree = ConfigurationHashTree()
+    for name, project in projects.items.items():
+        tree.add(kind='Project', name=name, object_hash=get_object_hash(item=project))
+    for location in projects.iter_locations():
+        data = location.as_dict()
+        tree.add(kind=data['kind'], name=location.manifest_name, object_hash=get_data_hash(data={'manifest': data, 'checksum': location.checksum}))
+    return tree
+
+
+def get_configuration_hash_tree(configuration: object)->ConfigurationHashTree:
+    if isinstance(configuration, SystemConfigurations):
+        return get_system_configurations_hash_tree(system_configurations=configuration)
+    if isinstance(configuration, Projects):
+        return get_projects_hash_tree(projects=configuration)
+    raise Exception('Configuration type "{}" not recognized'.format(configuration.__class__.__name__))
+
+
+def diff_configurations(previous: object, current: object)->ConfigurationDiff:
+    """Compare two :class:`verbacratis.models.systems_configuration.SystemConfigurations` or two :class:`verbacratis.models.deployments_configuration.Projects` instances
+
+    A previous configuration may also be given as a :class:`ConfigurationHashTree`, for example one restored with
+    :meth:`ConfigurationHashTree.from_dict`.
+    """
+    if isinstance(previous, ConfigurationHashTree) is False:
+        previous = get_configuration_hash_tree(configuration=previous)
+    return diff_hash_trees(previous=previous, current=get_configuration_hash_tree(configuration=current))
@@ -6,16 +6,20 @@
     https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
 """
 
+import io
 import yaml
 import hashlib
 import os
 import traceback
 from verbacratis.models import GenericLogger
-from verbacratis.models.ordering import Item, Items
+from verbacratis.models.ordering import Item, Items, TraversalDirection
+from verbacratis.models.kind_registry import KindRegistry, get_item_manifest_name
 from verbacratis.utils.file_io import PathTypes, identify_local_path_type, create_tmp_dir, remove_tmp_dir_recursively, copy_file, get_file_from_path, file_checksum, find_matching_files
-from verbacratis.utils.git_integration import is_url_a_git_repo, git_clone_checkout_and_return_list_of_files, extract_parameters_from_url, random_word
-from verbacratis.utils.http_requests_io import download_files
-from verbacratis.utils.parser2 import parse_yaml_file
+from verbacratis.utils.git_integration import is_url_a_git_repo, git_clone_checkout_and_return_list_of_files, extract_parameters_from_url, random_word, get_git_remote_branch_commit, get_sparse_checkout_directory
+from verbacratis.utils.http_requests_io import download_files, get_url_validator
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.location_mirror import LocationMirror, DEFAULT_MIRROR_ROOT, get_local_files_fingerprint
+from verbacratis.utils.parser2 import parse_yaml_file, iter_parsed_files, dump_documents, ParsedDocumentCache, DEFAULT_PARALLEL_PARSING_THRESHOLD
 
 
 class LocationType:
@@ -60,7 +64,9 @@ class ManifestLocation:
         set_no_verify_ssl: bool=False,
         branch: str='main',
         relative_start_directory: str='/',
-        ssh_private_key_path: str=None
+        ssh_private_key_path: str=None,
+        build_context: BuildContext=None,
+        mirror_root: str=DEFAULT_MIRROR_ROOT
     ):
         self.manifest_name = manifest_name
         self.reference = reference
@@ -80,25 +86,99 @@ class ManifestLocation:
         self.relative_start_directory = relative_start_directory
         self.ssh_private_key_path = ssh_private_key_path
 
+        # Bounds the time spent fetching remote locations
+        self.build_context = build_context
+
+        # Files are kept in a persistent mirror, so that a following sync only processes what changed
+        self.mirror_root = mirror_root
+        self.mirror = None
+
+    def __getstate__(self)->dict:
+        # The build context and caches belong to the build that created the location (see verbacratis.models.manifest_bundle)
+        state = dict(self.__dict__)
+        state['build_context'] = None
+        state['mirror'] = None
+        if 'git_mirror_cache' in state:
+            state['git_mirror_cache'] = None
+        return state
+
+    def _get_mirror_key(self)->str:
+        if self.location_type == LocationType.GIT_URL:
+            # Each start directory has a sparse checkout, and therefore a mirror, of its own
+            sparse_checkout_directory = get_sparse_checkout_directory(relative_start_directory=self.relative_start_directory)
+            if sparse_checkout_directory is None:
+                return '{}#{}'.format(self.reference, self.branch)
+            return '{}#{}#{}'.format(self.reference, self.branch, sparse_checkout_directory)
+        return self.reference
+
     def _update_checksum_from_work_dir_files(self)->str:
-        raw_string = ''
-        for file in self.files:
-            raw_string = '{}{}\n'.format(raw_string, file_checksum(path=file))
-        self.checksum = hashlib.sha256(raw_string.encode('utf-8')).hexdigest()
+        h = hashlib.sha256()
+        for checksum in self.mirror.get_checksums(paths=self.files):
+            h.update('{}\n'.format(checksum).encode('utf-8'))
+        self.checksum = h.hexdigest()
 
     def cleanup_work_dir(self):
-        remove_tmp_dir_recursively(dir=self.work_dir)
+        """Remove the mirror of this location from disk. The next sync will be a cold start.
+
+        Local files that are read in place are never removed.
+        """
+        if self.mirror is None:
+            self.mirror = LocationMirror(reference=self._get_mirror_key(), mirror_root=self.mirror_root)
+        self.mirror.acquire_lock(build_context=self.build_context)
+        try:
+            self.mirror.remove()
+        finally:
+            self.mirror.release_lock()
         self.files = list()
         self.work_dir = None
 
     def get_files(self)->list:
         raise Exception('Implement in ManifestLocation sub-classes')
 
+    def get_source_fingerprint(self)->str:
+        """A value that changes when the source of the location changes, determined without fetching the location
+
+        Local files are only read when their size, modification time or inode changed (see
+        :func:`verbacratis.utils.location_mirror.get_local_files_fingerprint`). Git locations use the commit of the
+        branch on the remote, and file URLs the `ETag` or `Last-Modified` header.
+
+        Returns:
+            The fingerprint, or None if it could not be determined
+        """
+        try:
+            if self.location_type == LocationType.LOCAL_FILE:
+                return get_local_files_fingerprint(reference=self.reference, files=[self.reference,], mirror_root=self.mirror_root)
+            if self.location_type == LocationType.LOCAL_DIRECTORY:
+                files = find_matching_files(start_dir=self.reference, pattern=self.include_file_regex)
+                return get_local_files_fingerprint(reference=self.reference, files=files, mirror_root=self.mirror_root)
+            if self.location_type == LocationType.FILE_URL:
+                return get_url_validator(url=self.reference, set_no_verify_ssl=self.set_no_verify_ssl, build_context=self.build_context)
+            if self.location_type == LocationType.GIT_URL:
+                commit = get_git_remote_branch_commit(url=self.reference, branch=self.branch, build_context=self.build_context)
+                if commit is not None:
+                    return 'git:{}'.format(commit)
+        except:
+            traceback.print_exc()
+        return None
+
     def sync(self):
-        self.cleanup_work_dir()
-        self.work_dir = create_tmp_dir(sub_dir='Location__{}'.format(hashlib.sha256(self.reference.encode('utf-8')).hexdigest()))
-        self.get_files()
-        self._update_checksum_from_work_dir_files()
+        """Bring the mirror of the location up to date and recalculate the checksum of changed files only
+
+        The mirror is locked for the duration of the sync, so concurrent builds on this machine take turns.
+        """
+        if self.mirror is None:
+            self.mirror = LocationMirror(reference=self._get_mirror_key(), mirror_root=self.mirror_root)
+        self.files = list()
+        self.work_dir = self.mirror.files_dir
+        self.mirror.acquire_lock(build_context=self.build_context)
+        try:
+            self.get_files()
+            self._update_checksum_from_work_dir_files()
+            if self.location_type != LocationType.GIT_URL:
+                self.mirror.remove_stale_files(files=self.files)
+            self.mirror.save_index()
+        finally:
+            self.mirror.release_lock()
 
     def as_dict(self):
         root = dict()
@@ -110,6 +190,9 @@ class ManifestLocation:
         root['metadata']['name'] = self.manifest_name
         if self.location_type == LocationType.LOCAL_DIRECTORY or self.location_type == LocationType.GIT_URL:
             root['spec']['include_file_regex'] = self.include_file_regex
+        if self.location_type == LocationType.LOCAL_FILE or self.location_type == LocationType.LOCAL_DIRECTORY:
+            if self.isolate is True:
+                root['spec']['isolate'] = True
         if self.location_type == LocationType.FILE_URL:
             root['spec']['set_no_verify_ssl'] = self.set_no_verify_ssl
         if self.location_type == LocationType.GIT_URL:
@@ -127,66 +210,87 @@ class ManifestLocation:
 
 
 class LocalFileManifestLocation(ManifestLocation):
+    """A local manifest file
+
+    The file is read in place. Set `isolate` to True to rather parse a snapshot of the file that is kept in the mirror,
+    for example when the file may be changed while a build is running.
+    """
 
-    def __init__(self, reference: str, manifest_name: str):
-        super().__init__(reference, manifest_name)
+    def __init__(self, reference: str, manifest_name: str, isolate: bool=False, mirror_root: str=DEFAULT_MIRROR_ROOT):
+        super().__init__(reference, manifest_name, mirror_root=mirror_root)
         self.location_type = LocationType.LOCAL_FILE
+        self.isolate = isolate
         self.sync()
 
     def get_files(self)->list:
-        self.files.append(copy_file(source_file=self.reference, file_name=get_file_from_path(input_path=self.reference), tmp_dir=self.work_dir))
+        if self.isolate is False:
+            self.work_dir = os.path.dirname(os.path.abspath(self.reference))
+            self.files = [self.reference,]
+            return
+        self.files = self.mirror.sync_local_files(
+            source_files=[self.reference,],
+            target_file_names=[get_file_from_path(input_path=self.reference),]
+        )
 
 
 class LocalDirectoryManifestLocation(ManifestLocation):
+    """A local directory with manifest files
 
-    def __init__(self, reference: str, manifest_name: str, include_file_regex: str='.*\.yml|.*\.yaml'):
-        super().__init__(reference, manifest_name, include_file_regex)
+    Matching files are read in place. Set `isolate` to True to rather parse snapshots of the files that are kept in the
+    mirror, for example when files may be changed while a build is running.
+    """
+
+    def __init__(self, reference: str, manifest_name: str, include_file_regex: str='.*\.yml|.*\.yaml', isolate: bool=False, mirror_root: str=DEFAULT_MIRROR_ROOT):
+        super().__init__(reference, manifest_name, include_file_regex, mirror_root=mirror_root)
         self.location_type = LocationType.LOCAL_DIRECTORY
+        self.isolate = isolate
         self.sync()
 
     def get_files(self)->list:
-        for file in find_matching_files(start_dir=self.reference, pattern=self.include_file_regex):
-            self.files.append(
-                copy_file(
-                    source_file=file,
-                    file_name=hashlib.sha256(file.encode('utf-8')).hexdigest(),
-                    tmp_dir=self.work_dir
-                )
-            )
+        source_files = find_matching_files(start_dir=self.reference, pattern=self.include_file_regex)
+        if self.isolate is False:
+            self.work_dir = self.reference
+            self.files = source_files
+            return
+        self.files = self.mirror.sync_local_files(
+            source_files=source_files,
+            target_file_names=[hashlib.sha256(file.encode('utf-8')).hexdigest() for file in source_files]
+        )
 
 
 class FileUrlManifestLocation(ManifestLocation):
 
-    def __init__(self, reference: str, manifest_name: str, set_no_verify_ssl: bool=False):
-        super().__init__(reference, manifest_name, set_no_verify_ssl)
+    def __init__(self, reference: str, manifest_name: str, set_no_verify_ssl: bool=False, build_context: BuildContext=None, mirror_root: str=DEFAULT_MIRROR_ROOT):
+        super().__init__(reference, manifest_name, set_no_verify_ssl=set_no_verify_ssl, build_context=build_context, mirror_root=mirror_root)
         self.location_type = LocationType.FILE_URL
         self.sync()
 
     def get_files(self)->list:
-        files = download_files(
-            urls=[self.reference,],
-            target_dir=self.work_dir,
-            set_no_verify_ssl=self.set_no_verify_ssl
+        self.files = self.mirror.sync_url(
+            url=self.reference,
+            set_no_verify_ssl=self.set_no_verify_ssl,
+            build_context=self.build_context
         )
-        self.files = files
 
 
 class GitManifestLocation(ManifestLocation):
 
-    def __init__(self, reference: str, manifest_name: str, include_file_regex: str='.*\.yml|.*\.yaml', branch: str='main', relative_start_directory: str='/', ssh_private_key_path: str=None, set_no_verify_ssl: bool=False):
-        super().__init__(reference, manifest_name, include_file_regex, set_no_verify_ssl, branch, relative_start_directory, ssh_private_key_path)
+    def __init__(self, reference: str, manifest_name: str, include_file_regex: str='.*\.yml|.*\.yaml', branch: str='main', relative_start_directory: str='/', ssh_private_key_path: str=None, set_no_verify_ssl: bool=False, build_context: BuildContext=None, mirror_root: str=DEFAULT_MIRROR_ROOT, git_mirror_cache: object=None):
+        super().__init__(reference, manifest_name, include_file_regex, set_no_verify_ssl, branch, relative_start_directory, ssh_private_key_path, build_context, mirror_root)
         self.location_type = LocationType.GIT_URL
+        self.git_mirror_cache = git_mirror_cache
         self.sync()
 
     def get_files(self)->list:
-        self.files = git_clone_checkout_and_return_list_of_files(
+        self.files = self.mirror.sync_git(
             git_clone_url=self.reference,
             branch=self.branch,
             relative_start_directory=self.relative_start_directory,
             include_files_regex=self.include_file_regex,
-            target_dir=self.work_dir,
             ssh_private_key_path=self.ssh_private_key_path,
-            set_no_verify_ssl=self.set_no_verify_ssl
+            set_no_verify_ssl=self.set_no_verify_ssl,
+            build_context=self.build_context,
+            git_mirror_cache=self.git_mirror_cache
         )
 
 
@@ -239,19 +343,47 @@ class Project(Item):
         root['spec'] = data
         return root
 
-    def __str__(self)->str:
-        yaml_str = ''
+    def iter_documents(self):
+        """Yield the `as_dict()` values of the manifest locations and then of the project"""
         for loc in self.locations:
-            yaml_str = '{}---\n{}'.format(yaml_str, str(loc))
-        return '{}---\n{}'.format(yaml_str, yaml.dump(self.as_dict()))
+            yield loc.as_dict()
+        yield self.as_dict()
+
+    def __str__(self)->str:
+        stream = io.StringIO()
+        dump_documents(documents=self.iter_documents(), stream=stream)
+        return stream.getvalue()
 
 
 class Projects(Items):
+    """A collection of projects
+
+    Documents are processed through a :class:`verbacratis.models.kind_registry.KindRegistry`. The default is
+    `project_kind_registry`, to which plugins can add their own kinds.
+    """
 
-    def __init__(self, logger: GenericLogger = GenericLogger()):
+    def __init__(self, logger: GenericLogger = GenericLogger(), kind_registry: KindRegistry=None):
         super().__init__(logger)
+        if kind_registry is None:
+            kind_registry = project_kind_registry
+        self.kind_registry = kind_registry
         self.project_names_per_environment = dict()
         self.location_manifests = dict()
+        self.pending_projects = list()   # (Project, location names) tuples waiting for link_references()
+        # Optional shared GitMirrorCache for the GitManifestLocation manifests
+        self.git_mirror_cache = None
+
+    def __getstate__(self)->dict:
+        state = dict(self.__dict__)
+        state['git_mirror_cache'] = None
+        if state['kind_registry'] is project_kind_registry:
+            state['kind_registry'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self.kind_registry is None:
+            self.kind_registry = project_kind_registry
 
     def add_project(self, project: Project):
         self.add_item(item=project)
@@ -269,87 +401,228 @@ class Projects(Items):
     def get_project_by_name(self, project_name: str)->Project:
         return self.get_item_by_name(name=project_name)
 
+    def get_location_checksums(self)->dict:
+        """Get the current checksum of every manifest location used by the projects
+
+        The result can be persisted after a successful build and supplied to :meth:`get_changed_project_names` or
+        :meth:`get_affected_project_names` on a following build.
+
+        Returns:
+            dict: The location manifest name as key and the location checksum as value
+        """
+        checksums = dict()
+        for project_name, project in self.items.items():
+            for location in project.locations:
+                checksums[location.manifest_name] = location.checksum
+        return checksums
+
+    def get_changed_project_names(self, previous_location_checksums: dict)->list:
+        """Get the names of projects with at least one manifest location whose checksum changed
+
+        A location not present in ``previous_location_checksums`` is considered changed.
+
+        Args:
+            previous_location_checksums: The value of :meth:`get_location_checksums` from the last successful build
+
+        Returns:
+            list: Project names, in the order the projects were added
+        """
+        changed_project_names = list()
+        for project_name, project in self.items.items():
+            for location in project.locations:
+                if location.manifest_name not in previous_location_checksums or previous_location_checksums[location.manifest_name] != location.checksum:
+                    changed_project_names.append(project_name)
+                    break
+        return changed_project_names
+
+    def get_affected_project_names(self, environment_name: str, previous_location_checksums: dict, direction: int=TraversalDirection.DESCENDANTS)->list:
+        """Get the minimal set of projects to deploy in an environment given the location checksums of the last build
+
+        Args:
+            environment_name: The environment name
+            previous_location_checksums: The value of :meth:`get_location_checksums` from the last successful build
+            direction: ``TraversalDirection.DESCENDANTS`` (default) to include projects depending on the changed projects, or ``TraversalDirection.ANCESTORS`` to include the projects the changed projects depend on
+
+        Returns:
+            list: Project names, ordered so that parent projects are always before their child projects
+        """
+        return self.get_affected_item_names(
+            scope_name=environment_name,
+            changed_item_names=self.get_changed_project_names(previous_location_checksums=previous_location_checksums),
+            direction=direction
+        )
+
+    def get_deployment_plans(self, environment_names: list)->dict:
+        """Get the deployment order and waves of projects for several environments at once
+
+        See :meth:`verbacratis.models.ordering.Items.get_plans_for_scopes` for the structure of each plan.
+
+        Args:
+            environment_names: A list of environment names
+
+        Returns:
+            dict: The environment name as key and the plan as value
+
+        Raises:
+            Exception: If an environment name is not used by any project
+        """
+        for environment_name in environment_names:
+            if environment_name not in self.project_names_per_environment:
+                raise Exception('Environment named "{}" not found in collection of projects'.format(environment_name))
+        return self.get_plans_for_scopes(scope_names=environment_names)
+
+    def store_kind_item(self, bucket: str, name: str, item: object):
+        getattr(self, bucket)[name] = item
+
+    def _get_location_parameters(self, data: dict)->dict:
+        parameters = data['spec']
+        parameters['reference'] = parameters['location']
+        parameters['manifest_name'] = data['metadata']['name']
+        parameters.pop('location')
+        return parameters
+
+    def _create_LocalDirectoryManifestLocation_instance_from_data(self, data: dict)->LocalDirectoryManifestLocation:
+        return LocalDirectoryManifestLocation(**self._get_location_parameters(data=data))
+
+    def _create_LocalFileManifestLocation_instance_from_data(self, data: dict)->LocalFileManifestLocation:
+        return LocalFileManifestLocation(**self._get_location_parameters(data=data))
+
+    def _create_FileUrlManifestLocation_instance_from_data(self, data: dict)->FileUrlManifestLocation:
+        return FileUrlManifestLocation(**self._get_location_parameters(data=data))
+
+    def _create_GitManifestLocation_instance_from_data(self, data: dict)->GitManifestLocation:
+        parameters = self._get_location_parameters(data=data)
+        parameters['git_mirror_cache'] = self.git_mirror_cache
+        return GitManifestLocation(**parameters)
+
+    def _create_Project_instance_from_data(self, data: dict)->Project:
+        """Create a project and keep it with the names of its locations until :meth:`link_references`
+
+        Returns:
+            None, since the project is only added by :meth:`link_references`
+        """
+        if 'spec' in data:
+            spec = data['spec'] 
+            if 'locations' in spec:
+                use_default_scope = True
+                if 'environments' in data['metadata']:
+                    use_default_scope = False
+                project = Project(name=data['metadata']['name'], use_default_scope=use_default_scope)
+                if 'environments' in data['metadata']:
+                    for env_name in data['metadata']['environments']:
+                        project.add_environment(environment_name=env_name)
+                if 'parentProjects' in spec:
+                    for parent_project_data in spec['parentProjects']:
+                        project.add_parent_project(parent_project_name=parent_project_data)
+                self.pending_projects.append((project, spec['locations']))
+        return None
+
+    def add_document(self, data: dict):
+        """Process a single parsed YAML document
+
+        Manifest locations are kept until :meth:`link_references`, and projects are created with the names of their
+        locations, which are also only linked by :meth:`link_references`, so the documents may be in any order.
+        """
+        if isinstance(data, dict):
+            converted_data = dict((k.lower(),v) for k,v in data.items()) # Convert keys to lowercase
+            self.kind_registry.create(collection=self, data=converted_data)
+
+    def link_references(self):
+        """Link the kept manifest locations to the pending projects, and add the projects"""
+        for project, location_names in self.pending_projects:
+            for loc_name in location_names:
+                if loc_name in self.location_manifests:
+                    project.add_manifest_location(location=self.location_manifests[loc_name])
+            self.add_project(project=project)
+        self.pending_projects = list()
+        self.location_manifests = dict()
+
+    def parse_documents(self, documents):
+        """Parse parsed YAML documents into the various Objects.
+
+        The documents are processed one at a time as they are produced, so `documents` may be a generator that parses
+        them on demand (see :func:`verbacratis.utils.parser2.iter_yaml_file_documents`). Projects are linked to the
+        manifest locations in the same documents after the last document.
+        """
+        for data in documents:
+            self.add_document(data=data)
+        self.link_references()
+
     def parse_yaml(self, raw_data: dict):
         """Parse data into the various Objects.
 
         Use something like parse_yaml_file() from `verbacratis.utils.parser2` to obtain the dictionary value from a parsed YAML file
         """
-        # Create individual class instances and add to the parsed_configuration for each type
-
-        # First extract all location manifests
-        for part, data in raw_data.items():
-            if isinstance(data, dict):
-                converted_data = dict((k.lower(),v) for k,v in data.items()) # Convert keys to lowercase
-                if converted_data['kind'] in ('LocalDirectoryManifestLocation', 'LocalFileManifestLocation', 'FileUrlManifestLocation', 'GitManifestLocation',):
-                    parameters = converted_data['spec']
-                    parameters['reference'] = parameters['location']
-                    parameters['manifest_name'] = converted_data['metadata']['name']
-                    parameters.pop('location')
-                    if converted_data['kind'] == 'LocalDirectoryManifestLocation':
-                        self.location_manifests[converted_data['metadata']['name']] = LocalDirectoryManifestLocation(**parameters)
-                    elif converted_data['kind'] == 'LocalFileManifestLocation':
-                        self.location_manifests[converted_data['metadata']['name']] = LocalFileManifestLocation(**parameters)
-                    elif converted_data['kind'] == 'FileUrlManifestLocation':
-                        self.location_manifests[converted_data['metadata']['name']] = FileUrlManifestLocation(**parameters)
-                    elif converted_data['kind'] == 'GitManifestLocation':
-                        self.location_manifests[converted_data['metadata']['name']] = GitManifestLocation(**parameters)
-
-        # Next, extract project manifests and link the relevant location manifests to each project
-        for part, data in raw_data.items():
-            if isinstance(data, dict):
-                converted_data = dict((k.lower(),v) for k,v in data.items()) # Convert keys to lowercase
-                if 'kind' in converted_data:
-                    if converted_data['kind'].lower() == 'project':
-                        location_names = list()
-                        spec = dict()
-                        if 'spec' in converted_data:
-                            spec = converted_data['spec'] 
-                            if 'locations' in spec:
-                                location_names = spec['locations']
-                                use_default_scope = True
-                                if 'environments' in converted_data['metadata']:
-                                    use_default_scope = False
-                                project = Project(name=converted_data['metadata']['name'], use_default_scope=use_default_scope)
-                                if 'environments' in converted_data['metadata']:
-                                    for env_name in converted_data['metadata']['environments']:
-                                        project.add_environment(environment_name=env_name)
-                                if 'parentProjects' in spec:
-                                    for parent_project_data in spec['parentProjects']:
-                                        project.add_parent_project(parent_project_name=parent_project_data)
-                                for loc_name in location_names:
-                                    if loc_name in self.location_manifests:
-                                        project.add_manifest_location(location=self.location_manifests[loc_name])
-                                self.add_project(project=project)
-        self.location_manifests = None
+        self.parse_documents(documents=raw_data.values())
 
-    def __str__(self)->str:
-        yaml_str = ''
+    def iter_locations(self):
+        """Yield the manifest locations of all projects, once per location, in project order"""
+        seen_location_ids = set()
         for project_name, project in self.items.items():
-            yaml_str = '{}{}'.format(yaml_str, str(project))
-        return yaml_str
+            for location in project.locations:
+                if id(location) not in seen_location_ids:
+                    seen_location_ids.add(id(location))
+                    yield location
+
+    def iter_documents(self):
+        """Yield the `as_dict()` value of every project, each preceded by those of its locations that were not yielded before"""
+        seen_location_ids = set()
+        for project_name, project in self.items.items():
+            for location in project.locations:
+                if id(location) not in seen_location_ids:
+                    seen_location_ids.add(id(location))
+                    yield location.as_dict()
+            yield project.as_dict()
+
+    def as_dict(self)->dict:
+        """A snapshot of all projects and manifest locations: the kind as key, with a dictionary of the `as_dict()` values by name as value"""
+        root = dict()
+        root['Project'] = dict()
+        for project_name, project in self.items.items():
+            root['Project'][project_name] = project.as_dict()
+        for location in self.iter_locations():
+            data = location.as_dict()
+            if data['kind'] not in root:
+                root[data['kind']] = dict()
+            root[data['kind']][location.manifest_name] = data
+        return root
+
+    def __str__(self)->str:
+        stream = io.StringIO()
+        dump_documents(documents=self.iter_documents(), stream=stream)
+        return stream.getvalue()
+
+
+project_kind_registry = KindRegistry()
+project_kind_registry.register(kind='LocalDirectoryManifestLocation', factory=Projects._create_LocalDirectoryManifestLocation_instance_from_data, bucket='location_manifests', name_accessor=get_item_manifest_name, item_class=LocalDirectoryManifestLocation)
+project_kind_registry.register(kind='LocalFileManifestLocation', factory=Projects._create_LocalFileManifestLocation_instance_from_data, bucket='location_manifests', name_accessor=get_item_manifest_name, item_class=LocalFileManifestLocation)
+project_kind_registry.register(kind='FileUrlManifestLocation', factory=Projects._create_FileUrlManifestLocation_instance_from_data, bucket='location_manifests', name_accessor=get_item_manifest_name, item_class=FileUrlManifestLocation)
+project_kind_registry.register(kind='GitManifestLocation', factory=Projects._create_GitManifestLocation_instance_from_data, bucket='location_manifests', name_accessor=get_item_manifest_name, item_class=GitManifestLocation)
+project_kind_registry.register(kind='Project', factory=Projects._create_Project_instance_from_data)
 
 
-def get_project_from_files(files: list, projects = Projects())->Projects:
+def get_project_from_files(files: list, projects = Projects(), parse_cache: ParsedDocumentCache=None, parallel_parsing_threshold: int=DEFAULT_PARALLEL_PARSING_THRESHOLD)->Projects:
     try:
-        for file in files:
-            projects.parse_yaml(raw_data=parse_yaml_file(file_path=file))
+        for file, documents in iter_parsed_files(files=files, parse_cache=parse_cache, parallel_parsing_threshold=parallel_parsing_threshold):
+            projects.parse_documents(documents=documents)
     except:
         traceback.print_exc()
     return projects
 
 
-def get_project_configuration_from_url(urls: list, set_no_verify_ssl: bool=False, projects = Projects())->Projects:
+def get_project_configuration_from_url(urls: list, set_no_verify_ssl: bool=False, projects = Projects(), build_context: BuildContext=None)->Projects:
     """Parse the file specified in the URL to return a SystemConfigurations instance
 
     Args:
         urls: A list of strings containing the URLs to the YAML files to download and parse
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
 
     Returns:
         `SystemConfigurations` instance with the parsed configuration
     """
     tmp_dir = create_tmp_dir(sub_dir=random_word(length=32))
-    files = download_files(urls=urls, target_dir=tmp_dir, set_no_verify_ssl=set_no_verify_ssl)
+    files = download_files(urls=urls, target_dir=tmp_dir, set_no_verify_ssl=set_no_verify_ssl, build_context=build_context)
     projects = get_project_from_files(files=files, projects=projects)
     remove_tmp_dir_recursively(dir=tmp_dir)
     return projects
@@ -362,7 +635,8 @@ def get_project_configuration_from_git(
     include_files_regex: str='.*\.yaml$|.*\.yml$',
     ssh_private_key_path: str=None,
     set_no_verify_ssl: bool=False,
-    projects = Projects()
+    projects = Projects(),
+    build_context: BuildContext=None
 )->Projects:
     """Parse files from a Git repository matching a file pattern withing a branch and directory to return a SystemConfigurations instance
 
@@ -373,6 +647,7 @@ def get_project_configuration_from_git(
         include_files_regex: A regular expression string for files to match. Default is matching YAML files.
         ssh_private_key_path: A string containing the SSH private key to use. Optional, and if value is `None`, the default transport (HTTPS) will be used.
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
 
     Returns:
         `SystemConfigurations` instance with the parsed configuration
@@ -385,7 +660,8 @@ def get_project_configuration_from_git(
         include_files_regex=include_files_regex,
         target_dir=tmp_dir,
         ssh_private_key_path=ssh_private_key_path,
-        set_no_verify_ssl=set_no_verify_ssl
+        set_no_verify_ssl=set_no_verify_ssl,
+        build_context=build_context
     )
     projects = get_project_from_files(files=files, projects=projects)
     remove_tmp_dir_recursively(dir=tmp_dir)
@@ -0,0 +1,105 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+
+def get_item_name(item: object)->str:
+    return item.name
+
+
+def get_item_account_name(item: object)->str:
+    return item.account_name
+
+
+def get_item_manifest_name(item: object)->str:
+    return item.manifest_name
+
+
+def get_document_name(data: dict)->str:
+    return data['metadata']['name']
+
+
+class KindDefinition:
+    """How the documents of one manifest `kind` are turned into objects, and where the objects are kept
+
+    Attributes:
+        kind: The kind as used in manifests, for example `UnixInfrastructureAccount`
+        factory: A function called with the collection and the document (with lowercase top level keys), returning the new object, or None if the collection keeps the object itself
+        bucket: The name of the bucket in the collection holding the objects of this kind (see `store_kind_item()` of the collection), or None
+        name_accessor: A function returning the name of an object, used as key in the bucket
+        item_class: The class of the objects created by `factory`, used to find the definition of an existing object
+        document_name_accessor: A function returning the name of the object a document (with lowercase top level keys) will create, so that a collection can keep the document and create the object later
+    """
+
+    def __init__(self, kind: str, factory: object, bucket: str=None, name_accessor: object=get_item_name, item_class: type=None, document_name_accessor: object=get_document_name):
+        self.kind = kind
+        self.factory = factory
+        self.bucket = bucket
+        self.name_accessor = name_accessor
+        self.item_class = item_class
+        self.document_name_accessor = document_name_accessor
+
+
+class KindRegistry:
+    """Maps manifest kinds to their :class:`KindDefinition`
+
+    Kinds are matched without regard to case. A collection using a registry must implement
+    `store_kind_item(bucket, name, item)`, keeping an object by name in the bucket.
+
+    Plugins can add their own kinds to the registries of the system and project collections with :meth:`register`.
+    """
+
+    def __init__(self):
+        self.definitions = dict()
+        self.definitions_by_class = dict()
+
+    def register(self, kind: str, factory: object, bucket: str=None, name_accessor: object=get_item_name, item_class: type=None, document_name_accessor: object=get_document_name)->KindDefinition:
+        """Add a kind, replacing an existing definition of the same kind"""
+        definition = KindDefinition(kind=kind, factory=factory, bucket=bucket, name_accessor=name_accessor, item_class=item_class, document_name_accessor=document_name_accessor)
+        self.definitions[kind.lower()] = definition
+        if item_class is not None:
+            self.definitions_by_class[item_class] = definition
+        return definition
+
+    def get(self, kind: str)->KindDefinition:
+        """The definition of a kind, or None if the kind is not registered"""
+        if isinstance(kind, str) is False:
+            return None
+        return self.definitions.get(kind.lower())
+
+    def get_for_item(self, item: object)->KindDefinition:
+        """The definition of the exact class of an object, or None if the class is not registered"""
+        return self.definitions_by_class.get(item.__class__)
+
+    def get_buckets(self)->list:
+        """The bucket names, in the order the kinds were registered"""
+        buckets = list()
+        for definition in self.definitions.values():
+            if definition.bucket is not None and definition.bucket not in buckets:
+                buckets.append(definition.bucket)
+        return buckets
+
+    def store(self, collection: object, definition: KindDefinition, item: object):
+        collection.store_kind_item(bucket=definition.bucket, name=definition.name_accessor(item), item=item)
+
+    def create(self, collection: object, data: dict)->object:
+        """Create the object for a document and keep it in its bucket of `collection`
+
+        Args:
+            collection: The collection, for example a :class:`verbacratis.models.systems_configuration.SystemConfigurations` instance
+            data: The document, with lowercase top level keys
+
+        Returns:
+            The new object, or None if the kind is not registered or the factory did not return an object
+        """
+        definition = self.get(kind=data.get('kind'))
+        if definition is None:
+            return None
+        item = definition.factory(collection, data)
+        if item is not None and definition.bucket is not None:
+            self.store(collection=collection, definition=definition, item=item)
+        return item
@@ -0,0 +1,236 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import pickle
+import hashlib
+import threading
+from verbacratis.models.systems_configuration import SystemConfigurations
+from verbacratis.models.deployments_configuration import Projects
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.location_mirror import DEFAULT_MIRROR_ROOT
+from verbacratis.utils.manifest_fetcher import get_location_fingerprint
+
+
+BUNDLE_MAGIC = b'VCBUNDLE'
+# Increment when the layout of the bundle or the pickled classes change, so that older bundles are no longer loaded
+BUNDLE_FORMAT_VERSION = 3
+_BUNDLE_PREFIX = struct.Struct('>8sHI')     # Magic, format version, header length
+
+
+def get_source_fingerprints(
+    system_manifest_locations: list,
+    project_manifest_locations: list,
+    projects: Projects=None,
+    mirror_root: str=DEFAULT_MIRROR_ROOT,
+    build_context: BuildContext=None
+)->dict:
+    """Determine the fingerprints of the content of the sources of a bundle, without fetching or parsing them
+
+    The system (`-s`) and project (`-p`) manifest locations are fingerprinted with
+    :func:`verbacratis.utils.manifest_fetcher.get_location_fingerprint`, and the manifest locations of the projects with
+    :meth:`verbacratis.models.deployments_configuration.ManifestLocation.get_source_fingerprint`. Unchanged local files
+    only cost a `stat()`, and remote locations a single request each.
+
+    Returns:
+        dict: The fingerprint (None if it could not be determined) by `system:<location>`, `project:<location>` and `location:<manifest name>`
+    """
+    fingerprints = dict()
+    for location in system_manifest_locations:
+        fingerprints['system:{}'.format(location)] = get_location_fingerprint(location=location, mirror_root=mirror_root, build_context=build_context)
+    for location in project_manifest_locations:
+        fingerprints['project:{}'.format(location)] = get_location_fingerprint(location=location, mirror_root=mirror_root, build_context=build_context)
+    if projects is not None:
+        for location in projects.iter_locations():
+            fingerprints['location:{}'.format(location.manifest_name)] = location.get_source_fingerprint()
+    return fingerprints
+
+
+def get_bundle_source_checksum(system_manifest_locations: list, project_manifest_locations: list, location_checksums: dict=dict(), source_fingerprints: dict=dict())->str:
+    """The checksum of the sources of a bundle
+
+    Args:
+        system_manifest_locations: The system manifest locations (`-s`), in order
+        project_manifest_locations: The project manifest locations (`-p`), in order
+        location_checksums: The `ManifestLocation.checksum` values by manifest name (see :meth:`verbacratis.models.deployments_configuration.Projects.get_location_checksums`)
+        source_fingerprints: The fingerprints of the content of the sources (see :func:`get_source_fingerprints`)
+
+    Returns:
+        str: A SHA256 checksum
+    """
+    h = hashlib.sha256()
+    h.update('format:{}\n'.format(BUNDLE_FORMAT_VERSION).encode('utf-8'))
+    for location in system_manifest_locations:
+        h.update('system:{}\n'.format(location).encode('utf-8'))
+    for location in project_manifest_locations:
+        h.update('project:{}\n'.format(location).encode('utf-8'))
+    for manifest_name in sorted(location_checksums.keys()):
+        h.update('location:{}:{}\n'.format(manifest_name, location_checksums[manifest_name]).encode('utf-8'))
+    for key in sorted(source_fingerprints.keys()):
+        h.update('fingerprint:{}:{}\n'.format(key, source_fingerprints[key]).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ManifestBundle:
+    """Parsed and linked system configurations and projects, kept in a single file
+
+    A bundle is compiled once from the manifest locations (see `--compile`) and can then be loaded (see `--bundle`)
+    without parsing YAML or fetching anything from Git or web servers.
+
+    The file starts with `BUNDLE_MAGIC`, the format version and the length of a JSON header, followed by the header
+    and the zlib compressed pickle of the collections. The header can be read without loading the collections, and
+    holds the source locations, the location checksums, the fingerprints of the content of the sources (see
+    :func:`get_source_fingerprints`) and the checksum of all of these, used to detect a stale bundle.
+
+    Attributes:
+        system_configurations: A :class:`verbacratis.models.systems_configuration.SystemConfigurations` instance
+        projects: A :class:`verbacratis.models.deployments_configuration.Projects` instance
+        system_manifest_locations: The system manifest locations the bundle was compiled from
+        project_manifest_locations: The project manifest locations the bundle was compiled from
+        location_checksums: The checksums of the manifest locations of the projects when the bundle was compiled
+        source_fingerprints: The fingerprints of the content of the sources when the bundle was compiled
+        source_checksum: See :func:`get_bundle_source_checksum`
+        created: The UNIX time the bundle was compiled
+    """
+
+    def __init__(
+        self,
+        system_configurations: SystemConfigurations,
+        projects: Projects,
+        system_manifest_locations: list=list(),
+        project_manifest_locations: list=list(),
+        location_checksums: dict=None,
+        source_fingerprints: dict=None,
+        created: float=None
+    ):
+        self.system_configurations = system_configurations
+        self.projects = projects
+        self.system_manifest_locations = list(system_manifest_locations)
+        self.project_manifest_locations = list(project_manifest_locations)
+        if location_checksums is None:
+            location_checksums = projects.get_location_checksums()
+        self.location_checksums = dict(location_checksums)
+        if source_fingerprints is None:
+            source_fingerprints = dict()
+        self.source_fingerprints = dict(source_fingerprints)
+        self.source_checksum = get_bundle_source_checksum(
+            system_manifest_locations=self.system_manifest_locations,
+            project_manifest_locations=self.project_manifest_locations,
+            location_checksums=self.location_checksums,
+            source_fingerprints=self.source_fingerprints
+        )
+        if created is None:
+            created = time.time()
+        self.created = created
+
+    def get_header(self)->dict:
+        return {
+            'formatVersion': BUNDLE_FORMAT_VERSION,
+            'pythonVersion': '{}.{}'.format(sys.version_info[0], sys.version_info[1]),
+            'created': self.created,
+            'systemManifestLocations': self.system_manifest_locations,
+            'projectManifestLocations': self.project_manifest_locations,
+            'locationChecksums': self.location_checksums,
+            'sourceFingerprints': self.source_fingerprints,
+            'sourceChecksum': self.source_checksum,
+        }
+
+    def is_stale(self, system_manifest_locations: list, project_manifest_locations: list, location_checksums: dict=None, source_fingerprints: dict=None)->bool:
+        """Check if the bundle was compiled from other sources, or from sources of which the content changed since
+
+        Args:
+            system_manifest_locations: The current system manifest locations
+            project_manifest_locations: The current project manifest locations
+            location_checksums: Optional current location checksums. If None, those of the bundle are used
+            source_fingerprints: Optional current fingerprints (see :func:`get_source_fingerprints`). If None, those of the bundle are used
+
+        Returns:
+            bool: True if the bundle does not match the sources, or if the fingerprint of a source could not be determined
+        """
+        if location_checksums is None:
+            location_checksums = self.location_checksums
+        if source_fingerprints is None:
+            source_fingerprints = self.source_fingerprints
+        if None in source_fingerprints.values():
+            return True
+        return get_bundle_source_checksum(
+            system_manifest_locations=system_manifest_locations,
+            project_manifest_locations=project_manifest_locations,
+            location_checksums=location_checksums,
+            source_fingerprints=source_fingerprints
+        ) != self.source_checksum
+
+    def write(self, bundle_file: str):
+        """Write the bundle. The file is replaced in one step, so a running deployment never reads a partial bundle."""
+        payload = zlib.compress(pickle.dumps((self.system_configurations, self.projects), protocol=pickle.HIGHEST_PROTOCOL))
+        header = self.get_header()
+        header['payloadChecksum'] = hashlib.sha256(payload).hexdigest()
+        header_data = json.dumps(header, sort_keys=True).encode('utf-8')
+        tmp_file = '{}.{}.tmp'.format(bundle_file, threading.get_ident())
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(_BUNDLE_PREFIX.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_data)))
+                f.write(header_data)
+                f.write(payload)
+            os.replace(tmp_file, bundle_file)
+        except:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+
+def _read_bundle_header(f)->dict:
+    prefix = f.read(_BUNDLE_PREFIX.size)
+    if len(prefix) != _BUNDLE_PREFIX.size:
+        raise Exception('Not a manifest bundle')
+    magic, format_version, header_length = _BUNDLE_PREFIX.unpack(prefix)
+    if magic != BUNDLE_MAGIC:
+        raise Exception('Not a manifest bundle')
+    if format_version != BUNDLE_FORMAT_VERSION:
+        raise Exception('Manifest bundle format version {} is not supported (expected version {})'.format(format_version, BUNDLE_FORMAT_VERSION))
+    return json.loads(f.read(header_length).decode('utf-8'))
+
+
+def read_bundle_header(bundle_file: str)->dict:
+    """Read only the header of a bundle
+
+    Raises:
+        Exception: If the file is not a bundle of the current format version
+    """
+    with open(bundle_file, 'rb') as f:
+        return _read_bundle_header(f)
+
+
+def load_bundle(bundle_file: str)->ManifestBundle:
+    """Load a bundle written by :meth:`ManifestBundle.write`
+
+    Only load bundles from a trusted source, as the collections are restored with pickle.
+
+    Raises:
+        Exception: If the file is not a bundle of the current format version, or if it is damaged
+    """
+    with open(bundle_file, 'rb') as f:
+        header = _read_bundle_header(f)
+        payload = f.read()
+    if hashlib.sha256(payload).hexdigest() != header.get('payloadChecksum'):
+        raise Exception('Manifest bundle "{}" is damaged'.format(bundle_file))
+    system_configurations, projects = pickle.loads(zlib.decompress(payload))
+    return ManifestBundle(
+        system_configurations=system_configurations,
+        projects=projects,
+        system_manifest_locations=header['systemManifestLocations'],
+        project_manifest_locations=header['projectManifestLocations'],
+        location_checksums=header['locationChecksums'],
+        source_fingerprints=header['sourceFingerprints'],
+        created=header['created']
+    )
@@ -6,10 +6,17 @@
     https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
 """
 
-import copy
+import heapq
+from array import array
 from verbacratis.models import GenericLogger
 
 
+class TraversalDirection:
+    DESCENDANTS = 1     # The item and every item that (indirectly) depends on it
+    ANCESTORS = 2       # The item and every item it (indirectly) depends on
+    directions = range(1,3)
+
+
 class Item:
 
     def __init__(self, name, logger: GenericLogger=GenericLogger(), use_default_scope: bool=True):
@@ -19,16 +26,25 @@ class Item:
         if use_default_scope is True:
             self.scopes.append('default')
         self.logger = logger
+        self._owners = list()   # The Items instances this item was added to, which are told when the item changes
+
+    def _notify_owners(self):
+        for owner in self._owners:
+            owner.invalidate_compact_graph()
 
     def add_parent_item_name(self, parent_item_name:str):
         if parent_item_name not in self.parent_item_names:
             self.parent_item_names.append(parent_item_name)
+            self._notify_owners()
 
     def add_scope(self, scope_name: str, replace_default_if_exists: bool=True):
+        scopes = list(self.scopes)
         if replace_default_if_exists is True and 'default' in self.scopes:
             self.scopes.remove('default')
         if scope_name not in self.scopes:
             self.scopes.append(scope_name)
+        if self.scopes != scopes:
+            self._notify_owners()
 
 
 class Items:
@@ -36,10 +52,14 @@ class Items:
     def __init__(self, logger: GenericLogger=GenericLogger()):
         self.items = dict()
         self.logger = logger
+        self._compact_graph = None
 
     def add_item(self, item: Item):
         if item.name not in self.items:
             self.items[item.name] = item
+            if self not in item._owners:
+                item._owners.append(self)
+            self.invalidate_compact_graph()
 
     def add_item_scope(self, item_name: str, scope_name: str, replace_default_if_exists: bool=True):
         if item_name in self.items:
@@ -60,6 +80,25 @@ class Items:
             raise Exception('At least one scope name must be present in both parent and sibling')
         self.items[sibling_item_name].add_parent_item_name(parent_item_name)
 
+    def invalidate_compact_graph(self):
+        """Discard the compact graph, forcing a rebuild on the next query.
+
+        Added items call this when their scopes or parents change through :meth:`Item.add_scope` or
+        :meth:`Item.add_parent_item_name`. Only call it after changing the ``scopes`` or ``parent_item_names`` lists of
+        an added item directly.
+        """
+        self._compact_graph = None
+
+    def get_compact_graph(self):
+        """Get the :class:`CompactItemGraph` for the current items, building it if required
+
+        Returns:
+            CompactItemGraph: The compact graph
+        """
+        if self._compact_graph is None:
+            self._compact_graph = CompactItemGraph(items=self)
+        return self._compact_graph
+
     def get_item_by_name(self, name: str)->Item:
         if name in self.items:
             return self.items[name]
@@ -71,31 +110,393 @@ class Items:
                 return item_name
         raise Exception('No matching items found for scope named "{}"'.format(scope_name))
 
+    def get_child_item_names_map(self)->dict:
+        """Calculate the reverse of the parent links: for each item name, the names of items that list it as a parent
 
-def get_ordered_item_list_for_named_scope(items: Items, scope_name: str, start_item: Item, ordered_item_names: list=list(), logger: GenericLogger=GenericLogger())->list:
-    logger.debug('   Evaluating item named "{}"'.format(start_item.name))
-    parent_added = False
-    if scope_name in start_item.scopes:
-        if start_item.name not in ordered_item_names:
-            ordered_item_names.append(start_item.name)
-            logger.debug('      Adding start item "{}" to ordered list'.format(start_item.name))
-        for item_name in start_item.parent_item_names:
-            item = items.get_item_by_name(name=item_name)
-            if scope_name in item.scopes:
-                if item.name not in ordered_item_names:
-                    start_item_idx = ordered_item_names.index(start_item.name)
-                    ordered_item_names.insert(start_item_idx, item.name)
-                    logger.debug('      Inserting item "{}" to ordered list before "{}"'.format(item.name, start_item.name))
-                    parent_added = True
-                    ordered_item_names = get_ordered_item_list_for_named_scope(
-                        items=items,
-                        scope_name=scope_name,
-                        start_item=item,
-                        ordered_item_names=copy.deepcopy(ordered_item_names)
-                    )
+        Returns:
+            dict: Item name as key with a list of child item names as value, in the order the children were added
+        """
+        graph = self.get_compact_graph()
+        children = dict()
+        for node_id, item_name in enumerate(graph.names):
+            children[item_name] = [graph.names[child_id] for child_id in graph.get_child_ids(node_id=node_id)]
+        return children
+
+    def get_affected_item_names(self, scope_name: str, changed_item_names: list, direction: int=TraversalDirection.DESCENDANTS)->list:
+        """Get the minimal set of items in a scope that is affected by a set of changed items
+
+        With ``direction`` set to ``TraversalDirection.DESCENDANTS`` the result contains the changed items and every
+        item that depends on them (directly or indirectly), which is the set that needs to be redeployed after a
+        change. With ``direction`` set to ``TraversalDirection.ANCESTORS`` the result contains the changed items and
+        every item they depend on, which is the set required for a targeted deployment of the changed items.
+
+        Only items in the named scope are considered. Changed item names not in the scope are ignored.
+
+        Args:
+            scope_name: The scope (environment) name
+            changed_item_names: A list of item names that changed
+            direction: One of the ``TraversalDirection`` values
+
+        Returns:
+            list: The affected item names, ordered so that parents are always before the items depending on them
+
+        Raises:
+            Exception: If a changed item name is not known or if the direction is not recognized
+        """
+        if direction not in TraversalDirection.directions:
+            raise Exception('Traversal direction "{}" not recognized'.format(direction))
+        graph = self.get_compact_graph()
+        start_ids = list()
+        for item_name in changed_item_names:
+            self.get_item_by_name(name=item_name)
+            start_ids.append(graph.ids[item_name])
+        node_ids = graph.get_reachable_ids(start_ids=start_ids, scope_name=scope_name, direction=direction)
+        ordered_ids, circular_ids = graph.order_ids_parents_first(node_ids=node_ids)
+        for node_id in circular_ids:
+            self.logger.warn('Item "{}" is part of a circular reference'.format(graph.names[node_id]))
+        return [graph.names[node_id] for node_id in ordered_ids + circular_ids]
+
+    def get_plans_for_scopes(self, scope_names: list)->dict:
+        """Calculate the deployment order and deployment waves of several scopes in one pass over the item graph
+
+        A wave is a list of items whose parents (in the same scope) are all in earlier waves, therefore all items in a
+        wave can be processed in parallel. The graph is only walked once for all the scopes, instead of once per scope.
+
+        Items that are part of, or depend on, a circular reference in a scope are not placed in any wave. They are added
+        to the end of the order, listed under the ``circular`` key and a warning is logged.
+
+        Args:
+            scope_names: A list of scope (environment) names
+
+        Returns:
+            dict: The scope name as key, and a plan as value. The plan is a dict with the keys ``order`` (a list of item
+            names, parents before children), ``waves`` (a list of lists of item names) and ``circular`` (a list of item
+            names)
+        """
+        graph = self.get_compact_graph()
+        scope_waves, scope_circular_ids = graph.get_waves_for_scopes(scope_names=scope_names)
+        plans = dict()
+        for scope_name in scope_waves:
+            waves = list()
+            order = list()
+            for wave in scope_waves[scope_name]:
+                wave_names = [graph.names[node_id] for node_id in wave]
+                waves.append(wave_names)
+                order += wave_names
+            circular = [graph.names[node_id] for node_id in scope_circular_ids[scope_name]]
+            for item_name in circular:
+                self.logger.warn('Item "{}" in scope "{}" is part of a circular reference'.format(item_name, scope_name))
+            plans[scope_name] = {
+                'order': order + circular,
+                'waves': waves,
+                'circular': circular,
+            }
+        return plans
+
+
+class CompactItemGraph:
+    """A read-only, integer indexed representation of the graph of :class:`Items`
+
+    Every item name is interned to an integer node id, in the order the items were added. Parent and child links are
+    stored CSR style: the links of node ``n`` are ``parent_ids[parent_offsets[n]:parent_offsets[n+1]]`` (and the same for
+    children), in typed arrays instead of lists of strings. Scope membership is a bitset per scope name, with bit ``n``
+    set when node ``n`` is in the scope.
+
+    For large generated estates this keeps traversals to integer and array operations, instead of name lookups in
+    dictionaries and membership tests in lists.
+
+    Attributes:
+        names: A list of item names, indexed by node id
+        ids: A dict with the item name as key and the node id as value
+        parent_offsets: An array with ``len(names)+1`` offsets into ``parent_ids``
+        parent_ids: An array with the parent node ids of all nodes
+        child_offsets: An array with ``len(names)+1`` offsets into ``child_ids``
+        child_ids: An array with the child node ids of all nodes
+        scope_bitsets: A dict with the scope name as key and a bytearray bitset as value
+        missing_parent_names: A dict with the node id as key and a list of parent names that are not items as value
+    """
+
+    def __init__(self, items: Items):
+        self.names = list(items.items.keys())
+        self.ids = dict()
+        for node_id, item_name in enumerate(self.names):
+            self.ids[item_name] = node_id
+        qty = len(self.names)
+        bitset_size = (qty >> 3) + 1
+        self.scope_bitsets = dict()
+        self.missing_parent_names = dict()
+        self.parent_offsets = array('l', [0])
+        self.parent_ids = array('l')
+        child_counts = array('l', [0]) * (qty + 1)
+        for node_id, item_name in enumerate(self.names):
+            item = items.items[item_name]
+            for scope_name in item.scopes:
+                if scope_name not in self.scope_bitsets:
+                    self.scope_bitsets[scope_name] = bytearray(bitset_size)
+                self.scope_bitsets[scope_name][node_id >> 3] |= 1 << (node_id & 7)
+            seen_parent_ids = set()
+            for parent_item_name in item.parent_item_names:
+                if parent_item_name in self.ids:
+                    parent_id = self.ids[parent_item_name]
+                    if parent_id not in seen_parent_ids:
+                        seen_parent_ids.add(parent_id)
+                        self.parent_ids.append(parent_id)
+                        child_counts[parent_id + 1] += 1
                 else:
-                    logger.debug('      Item "{}" already in ordered list'.format(item.name))
-    if parent_added is True:
-        logger.debug('         Current ordered_item_names: {}'.format(ordered_item_names))
-    return ordered_item_names
+                    self.missing_parent_names.setdefault(node_id, list()).append(parent_item_name)
+            self.parent_offsets.append(len(self.parent_ids))
+        # Children: a counting sort of the parent links, keeping children in node id order
+        for node_id in range(qty):
+            child_counts[node_id + 1] += child_counts[node_id]
+        self.child_offsets = array('l', child_counts)
+        self.child_ids = array('l', [0]) * len(self.parent_ids)
+        next_slot = array('l', child_counts)
+        for node_id in range(qty):
+            for parent_id in self.get_parent_ids(node_id=node_id):
+                self.child_ids[next_slot[parent_id]] = node_id
+                next_slot[parent_id] += 1
+
+    def get_parent_ids(self, node_id: int)->array:
+        return self.parent_ids[self.parent_offsets[node_id]:self.parent_offsets[node_id+1]]
+
+    def get_child_ids(self, node_id: int)->array:
+        return self.child_ids[self.child_offsets[node_id]:self.child_offsets[node_id+1]]
+
+    def is_in_scope(self, node_id: int, scope_name: str)->bool:
+        if scope_name not in self.scope_bitsets:
+            return False
+        return (self.scope_bitsets[scope_name][node_id >> 3] >> (node_id & 7)) & 1 == 1
 
+    def get_scope_node_ids(self, scope_name: str)->list:
+        return [node_id for node_id in range(len(self.names)) if self.is_in_scope(node_id=node_id, scope_name=scope_name)]
+
+    def get_reachable_ids(self, start_ids: list, scope_name: str, direction: int=TraversalDirection.DESCENDANTS)->list:
+        """Get the start nodes in the scope, and all the nodes in the scope reachable from them
+
+        Traversal never passes through nodes outside the scope.
+
+        Args:
+            start_ids: A list of node ids to start from
+            scope_name: The scope name
+            direction: One of the ``TraversalDirection`` values
+
+        Returns:
+            list: Node ids, in no specific order
+
+        Raises:
+            Exception: When traversing ancestors and a parent name is not a known item
+        """
+        if scope_name not in self.scope_bitsets:
+            return list()
+        scope_bits = self.scope_bitsets[scope_name]
+        if direction == TraversalDirection.DESCENDANTS:
+            offsets, links = self.child_offsets, self.child_ids
+        else:
+            offsets, links = self.parent_offsets, self.parent_ids
+        visited = bytearray(len(self.names))
+        reachable = list()
+        pending = list()
+        for node_id in start_ids:
+            if visited[node_id] == 0 and (scope_bits[node_id >> 3] >> (node_id & 7)) & 1:
+                visited[node_id] = 1
+                pending.append(node_id)
+        while len(pending) > 0:
+            node_id = pending.pop()
+            reachable.append(node_id)
+            if direction == TraversalDirection.ANCESTORS and node_id in self.missing_parent_names:
+                raise Exception('Item named "{}" not found, Current items: {}'.format(self.missing_parent_names[node_id][0], self.names))
+            for idx in range(offsets[node_id], offsets[node_id+1]):
+                next_id = links[idx]
+                if visited[next_id] == 0 and (scope_bits[next_id >> 3] >> (next_id & 7)) & 1:
+                    visited[next_id] = 1
+                    pending.append(next_id)
+        return reachable
+
+    def get_ancestor_ids_parents_first(self, start_id: int, scope_name: str, visited_ids: list=list())->list:
+        """Get a node in a scope and all its ancestors in the scope, each node after its parents
+
+        The parents of a node are visited in the order they were linked. A link that closes a circular reference is
+        ignored, so the start node is always last.
+
+        Args:
+            start_id: The node id to start from
+            scope_name: The scope name
+            visited_ids: Node ids to leave out, and not to traverse through
+
+        Returns:
+            list: Node ids, parents first. Empty if the start node is not in the scope
+
+        Raises:
+            Exception: When a parent name of a visited node is not a known item
+        """
+        if self.is_in_scope(node_id=start_id, scope_name=scope_name) is False:
+            return list()
+        scope_bits = self.scope_bitsets[scope_name]
+        visited = bytearray(len(self.names))
+        for node_id in visited_ids:
+            visited[node_id] = 1
+        if visited[start_id] == 1:
+            return list()
+        ordered_ids = list()
+        visited[start_id] = 1
+        pending = [[start_id, self.parent_offsets[start_id]],]
+        while len(pending) > 0:
+            node_id, idx = pending[-1]
+            if idx == self.parent_offsets[node_id] and node_id in self.missing_parent_names:
+                raise Exception('Item named "{}" not found, Current items: {}'.format(self.missing_parent_names[node_id][0], self.names))
+            next_id = None
+            while idx < self.parent_offsets[node_id+1] and next_id is None:
+                parent_id = self.parent_ids[idx]
+                idx += 1
+                if visited[parent_id] == 0 and (scope_bits[parent_id >> 3] >> (parent_id & 7)) & 1:
+                    next_id = parent_id
+            pending[-1][1] = idx
+            if next_id is None:
+                pending.pop()
+                ordered_ids.append(node_id)
+            else:
+                visited[next_id] = 1
+                pending.append([next_id, self.parent_offsets[next_id]])
+        return ordered_ids
+
+    def order_ids_parents_first(self, node_ids: list)->tuple:
+        """Order a set of nodes so that parents are before their children
+
+        Only links between the supplied nodes are considered. Ties are broken by node id (the order in which the items
+        were added) so the result is deterministic.
+
+        Args:
+            node_ids: A list of node ids
+
+        Returns:
+            tuple: A list of ordered node ids and a list of node ids that are part of, or depend on, a circular reference
+        """
+        member = bytearray(len(self.names))
+        for node_id in node_ids:
+            member[node_id] = 1
+        remaining_parent_count = dict()
+        ready = list()
+        for node_id in node_ids:
+            count = 0
+            for parent_id in self.get_parent_ids(node_id=node_id):
+                if member[parent_id] == 1 and parent_id != node_id:
+                    count += 1
+            remaining_parent_count[node_id] = count
+            if count == 0:
+                ready.append(node_id)
+        heapq.heapify(ready)
+        ordered_ids = list()
+        while len(ready) > 0:
+            node_id = heapq.heappop(ready)
+            ordered_ids.append(node_id)
+            for child_id in self.get_child_ids(node_id=node_id):
+                if member[child_id] == 1 and child_id != node_id:
+                    remaining_parent_count[child_id] -= 1
+                    if remaining_parent_count[child_id] == 0:
+                        heapq.heappush(ready, child_id)
+        circular_ids = list()
+        if len(ordered_ids) < len(remaining_parent_count):
+            circular_ids = sorted([node_id for node_id, count in remaining_parent_count.items() if count > 0])
+        return (ordered_ids, circular_ids)
+
+    def get_waves_for_scopes(self, scope_names: list)->tuple:
+        """Group the nodes of each scope into waves, walking the graph once for all scopes
+
+        The wave of a node in a scope is one more than the highest wave of its parents in the same scope. A single
+        topological order of the whole graph is shared by all scopes, and each node's parent links are read once for
+        all the scopes the node belongs to. Only scopes containing a circular reference fall back to a separate
+        ordering of that scope's nodes.
+
+        Args:
+            scope_names: A list of scope names
+
+        Returns:
+            tuple: A dict with the scope name as key and a list of waves (lists of node ids, in node id order) as value,
+            and a dict with the scope name as key and the list of circular node ids in that scope as value
+        """
+        qty = len(self.names)
+        ordered_ids, circular_ids = self.order_ids_parents_first(node_ids=range(qty))
+        circular = bytearray(qty)
+        for node_id in circular_ids:
+            circular[node_id] = 1
+        levels = dict()
+        scope_waves = dict()
+        scope_circular_ids = dict()
+        node_scopes = [list() for node_id in range(qty)]
+        for scope_name in scope_names:
+            if scope_name in levels:
+                continue
+            levels[scope_name] = array('l', [-1]) * qty
+            scope_waves[scope_name] = list()
+            scope_circular_ids[scope_name] = list()
+            if scope_name not in self.scope_bitsets:
+                continue
+            scope_bits = self.scope_bitsets[scope_name]
+            for node_id in range(qty):
+                if (scope_bits[node_id >> 3] >> (node_id & 7)) & 1:
+                    node_scopes[node_id].append(scope_name)
+                    if circular[node_id] == 1:
+                        scope_circular_ids[scope_name].append(node_id)
+
+        # Scopes with a circular reference get their own ordering, as the global order does not cover those nodes
+        separately_ordered_scope_names = list()
+        for scope_name in levels:
+            if len(scope_circular_ids[scope_name]) > 0:
+                separately_ordered_scope_names.append(scope_name)
+                scope_ordered_ids, scope_circular_ids[scope_name] = self.order_ids_parents_first(node_ids=self.get_scope_node_ids(scope_name=scope_name))
+                for node_id in scope_ordered_ids:
+                    self._set_node_level(node_id=node_id, level=levels[scope_name], waves=scope_waves[scope_name])
+
+        for node_id in ordered_ids:
+            if len(node_scopes[node_id]) == 0:
+                continue
+            parent_ids = self.get_parent_ids(node_id=node_id)
+            for scope_name in node_scopes[node_id]:
+                if scope_name not in separately_ordered_scope_names:
+                    self._set_node_level(node_id=node_id, level=levels[scope_name], waves=scope_waves[scope_name], parent_ids=parent_ids)
+        for scope_name in scope_waves:
+            for wave in scope_waves[scope_name]:
+                wave.sort()
+        return (scope_waves, scope_circular_ids)
+
+    def _set_node_level(self, node_id: int, level: array, waves: list, parent_ids: array=None):
+        if parent_ids is None:
+            parent_ids = self.get_parent_ids(node_id=node_id)
+        node_level = 0
+        for parent_id in parent_ids:
+            if parent_id != node_id and level[parent_id] >= node_level:
+                node_level = level[parent_id] + 1
+        level[node_id] = node_level
+        if node_level == len(waves):
+            waves.append(list())
+        waves[node_level].append(node_id)
+
+
+def get_ordered_item_list_for_named_scope(items: Items, scope_name: str, start_item: Item, ordered_item_names: list=list(), logger: GenericLogger=GenericLogger())->list:
+    """Get the start item and all the items it (indirectly) depends on in a scope, each item after its parents
+
+    The traversal runs on the compact graph of the items (see :meth:`CompactItemGraph.get_ancestor_ids_parents_first`).
+
+    Args:
+        items: The items
+        scope_name: The scope (environment) name
+        start_item: The item to start from
+        ordered_item_names: Item names that are already ordered. They are kept at the start of the result, and are not
+            traversed again
+        logger: The logger
+
+    Returns:
+        list: A new list with `ordered_item_names`, followed by the names of the other items
+
+    Raises:
+        Exception: If a parent of a traversed item is not a known item
+    """
+    logger.debug('   Evaluating item named "{}"'.format(start_item.name))
+    items.get_item_by_name(name=start_item.name)
+    graph = items.get_compact_graph()
+    result = list(ordered_item_names)
+    visited_ids = [graph.ids[item_name] for item_name in ordered_item_names if item_name in graph.ids]
+    for node_id in graph.get_ancestor_ids_parents_first(start_id=graph.ids[start_item.name], scope_name=scope_name, visited_ids=visited_ids):
+        logger.debug('      Adding item "{}" to ordered list'.format(graph.names[node_id]))
+        result.append(graph.names[node_id])
+    return result
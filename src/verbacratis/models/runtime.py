@@ -12,6 +12,7 @@ from verbacratis.utils import get_logger
 from verbacratis.utils.parser import variable_snippet_extract, validate_configuration
 from verbacratis.utils.os_integration import exec_shell_cmd
 from verbacratis.utils.function_runner import execute_function
+from verbacratis.utils.build_context import BuildContext
 from verbacratis.functions import user_function_factory
 import subprocess, shlex
 import hashlib
@@ -93,9 +94,10 @@ class VariableStateStore:
         variables (:obj:`dict`): A dictionary of Variable objects partitioned by the Variable classification
         registered_functions (:obj:`dict`): A dictionary of functions
         logger (:obj:`Logger`): A logger object, for logging
+        build_context (:obj:`BuildContext`): Optional build deadline and cancellation state for shell commands and functions
     """
 
-    def __init__(self, logger=get_logger(), registered_functions: dict=FUNCTIONS):
+    def __init__(self, logger=get_logger(), registered_functions: dict=FUNCTIONS, build_context: BuildContext=None):
         self.variables = dict()
         self.variables['build-variable'] = dict()
         self.variables['ref'] = dict()
@@ -106,6 +108,7 @@ class VariableStateStore:
         self.variables['env'] = dict()
         self.logger = logger
         self.registered_functions = registered_functions
+        self.build_context = build_context
         self.logger.debug('registered_functions={}'.format(self.registered_functions))
 
     def update_variable(self, variable: Variable):
@@ -160,13 +163,14 @@ class VariableStateStore:
             value = os.getenv(variable.value, default=default_value)
             return value
         elif classification == 'shell':
-            return exec_shell_cmd(cmd=variable.value, logger=self.logger)
+            return exec_shell_cmd(cmd=variable.value, logger=self.logger, build_context=self.build_context)
         elif classification == 'func':
             function_exec_result = execute_function(
                 function_template=variable.value,                     # Comes from Variable.value
                 function_fixed_parameters=function_fixed_parameters,
                 logger=self.logger,
-                registered_functions=self.registered_functions
+                registered_functions=self.registered_functions,
+                build_context=self.build_context
             )
             self.logger.debug('function_exec_result={}'.format(function_exec_result))
             return function_exec_result
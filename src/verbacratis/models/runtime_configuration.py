@@ -20,7 +20,13 @@ from verbacratis.utils.file_io import get_directory_from_path, get_file_from_pat
 from verbacratis.models import GenericLogger, DEFAULT_CONFIG_DIR, DEFAULT_GLOBAL_CONFIG, DEFAULT_STATE_DB
 from verbacratis.models.systems_configuration import *
 from verbacratis.models.deployments_configuration import *
+from verbacratis.models.manifest_bundle import ManifestBundle, load_bundle, get_source_fingerprints
 from verbacratis.utils.git_integration import is_url_a_git_repo, extract_parameters_from_url
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.http_requests_io import DownloadCache
+from verbacratis.utils.manifest_fetcher import fetch_locations, cleanup_fetched_locations, get_parse_pool, DEFAULT_MAX_PARALLEL_FETCHES
+from verbacratis.utils.parser2 import ParsedDocumentCache, dump_documents, DEFAULT_PARALLEL_PARSING_THRESHOLD
+from verbacratis.utils.git_mirror_cache import GitMirrorCache
 
 
 class StateStore:
@@ -79,6 +85,7 @@ class ApplicationState:
 
     def __init__(self, logger=GenericLogger()) -> None:
         self.environment = 'default'
+        self.environments = ['default',]
         self.project = 'default'
         self.config_directory = DEFAULT_CONFIG_DIR
         self.config_file = 'verbacratis.yaml'
@@ -88,6 +95,19 @@ class ApplicationState:
         self.application_configuration = ApplicationRuntimeConfiguration(raw_global_configuration=DEFAULT_GLOBAL_CONFIG, logger=self.logger)
         self.system_manifest_locations = list()
         self.project_manifest_locations = list()
+        self.build_context = BuildContext(logger=self.logger)
+        self.max_parallel_fetches = DEFAULT_MAX_PARALLEL_FETCHES
+        self.enable_parse_cache = True
+        self.enable_git_mirror_cache = True
+        self.read_git_objects = False
+        self.git_mirror_cache = None
+        self.enable_download_cache = True
+        self.parallel_parsing_threshold = DEFAULT_PARALLEL_PARSING_THRESHOLD    # For the files of all locations together
+        self.max_parse_processes = None
+        self.bundle_file = None             # Load the manifests from this bundle instead of the locations
+        self.compile_bundle_file = None     # Compile the manifests of the locations into this bundle
+        self.export_file = None             # Write the effective configuration to this file after loading the manifests
+        self.export_format = 'yaml'
 
     def _read_global_configuration_file_content(self):
         self.application_configuration = ApplicationRuntimeConfiguration(raw_global_configuration=DEFAULT_GLOBAL_CONFIG, logger=self.logger)
@@ -108,43 +128,213 @@ class ApplicationState:
         self.config_directory = get_directory_from_path(input_path=config_file)
         init_application_dir(dir=self.config_directory)
         self.config_file = get_file_from_path(input_path=config_file)
+        self.git_mirror_cache = None
         self._read_global_configuration_file_content()
 
+    def set_build_timeout(self, timeout: float):
+        """Limit the build to `timeout` seconds from now"""
+        self.build_context = BuildContext(timeout=timeout, logger=self.logger)
+
+    def get_parse_cache(self)->ParsedDocumentCache:
+        """The cache of parsed manifest files, kept in the configuration directory. Returns None if the cache is disabled."""
+        if self.enable_parse_cache is False:
+            return None
+        return ParsedDocumentCache(
+            cache_dir='{}{}cache{}parsed'.format(self.config_directory, os.sep, os.sep),
+            logger=self.logger
+        )
+
+    def get_git_mirror_cache(self)->GitMirrorCache:
+        """The Git mirror cache in the configuration directory, shared by all Git locations of the build. Returns None if the cache is disabled."""
+        if self.enable_git_mirror_cache is False:
+            return None
+        if self.git_mirror_cache is None:
+            self.git_mirror_cache = GitMirrorCache(
+                cache_dir='{}{}cache{}git'.format(self.config_directory, os.sep, os.sep),
+                logger=self.logger
+            )
+        return self.git_mirror_cache
+
+    def get_download_cache(self)->DownloadCache:
+        """The cache of downloaded manifest files, kept in the configuration directory. Returns None if the cache is disabled."""
+        if self.enable_download_cache is False:
+            return None
+        return DownloadCache(cache_dir='{}{}cache{}http'.format(self.config_directory, os.sep, os.sep))
+
+    def _get_parse_pool(self, fetched_locations: list, parse_cache: ParsedDocumentCache=None):
+        return get_parse_pool(
+            fetched_locations=fetched_locations,
+            parse_cache=parse_cache,
+            parallel_parsing_threshold=self.parallel_parsing_threshold,
+            max_parse_processes=self.max_parse_processes,
+            logger=self.logger
+        )
+
     def load_system_manifests(self):
-        for location in self.system_manifest_locations:
-            if location.startswith('http'):
-                if is_url_a_git_repo(url=location) is True:
-                    final_location, branch, relative_start_directory, ssh_private_key_path, set_no_verify_ssl = extract_parameters_from_url(location=location)
-                    self.application_configuration.system_configurations = get_system_configuration_from_git(
-                        git_clone_url=final_location,
-                        system_configurations=self.application_configuration.system_configurations,
-                        branch=branch,
-                        relative_start_directory=relative_start_directory,
-                        ssh_private_key_path=ssh_private_key_path,
-                        set_no_verify_ssl=set_no_verify_ssl
-                    )
-                else:
-                    self.application_configuration.system_configurations = get_system_configuration_from_url(urls=[location,], system_configurations=self.application_configuration.system_configurations)
-            else:
-                self.application_configuration.system_configurations = get_system_configuration_from_files(files=[location,], system_configurations=self.application_configuration.system_configurations)
+        """Fetch all system manifest locations concurrently and parse them, in the order the locations were supplied
+
+        Only the infrastructure accounts of the targeted environments are created while parsing (see
+        :meth:`verbacratis.models.systems_configuration.SystemConfigurations.set_target_environments`).
+        """
+        parse_cache = self.get_parse_cache()
+        self.application_configuration.system_configurations.set_target_environments(environments=self.environments)
+        fetched_locations = fetch_locations(
+            locations=self.system_manifest_locations,
+            max_parallel_fetches=self.max_parallel_fetches,
+            build_context=self.build_context,
+            logger=self.logger,
+            git_mirror_cache=self.get_git_mirror_cache(),
+            read_git_objects=self.read_git_objects,
+            parse_cache=parse_cache,
+            download_cache=self.get_download_cache()
+        )
+        parse_pool = None
+        try:
+            parse_pool = self._get_parse_pool(fetched_locations=fetched_locations, parse_cache=parse_cache)
+            for fetched_location in fetched_locations:
+                self.build_context.check()
+                self.application_configuration.system_configurations.parse_documents(
+                    documents=fetched_location.iter_documents(parse_cache=parse_cache, build_context=self.build_context, logger=self.logger, parse_pool=parse_pool)
+                )
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+            cleanup_fetched_locations(fetched_locations=fetched_locations)
 
     def load_project_manifests(self):
-        for location in self.project_manifest_locations:
-            if location.startswith('http'):
-                if is_url_a_git_repo(url=location) is True:
-                    final_location, branch, relative_start_directory, ssh_private_key_path, set_no_verify_ssl = extract_parameters_from_url(location=location)
-                    self.application_configuration.projects = get_project_configuration_from_git(
-                        git_clone_url=final_location,
-                        projects=self.application_configuration.system_configurations,
-                        branch=branch,
-                        relative_start_directory=relative_start_directory,
-                        ssh_private_key_path=ssh_private_key_path,
-                        set_no_verify_ssl=set_no_verify_ssl
-                    )
-                else:
-                    self.application_configuration.system_configurations = get_project_configuration_from_url(urls=[location,], system_configurations=self.application_configuration.system_configurations)
-            else:
-                self.application_configuration.system_configurations = get_project_from_files(files=[location,], system_configurations=self.application_configuration.system_configurations)
-        
-        
+        """Fetch all project manifest locations concurrently and parse them, in the order the locations were supplied"""
+        parse_cache = self.get_parse_cache()
+        fetched_locations = fetch_locations(
+            locations=self.project_manifest_locations,
+            max_parallel_fetches=self.max_parallel_fetches,
+            build_context=self.build_context,
+            logger=self.logger,
+            git_mirror_cache=self.get_git_mirror_cache(),
+            read_git_objects=self.read_git_objects,
+            parse_cache=parse_cache,
+            download_cache=self.get_download_cache()
+        )
+        self.application_configuration.projects.git_mirror_cache = self.get_git_mirror_cache()
+        parse_pool = None
+        try:
+            parse_pool = self._get_parse_pool(fetched_locations=fetched_locations, parse_cache=parse_cache)
+            for fetched_location in fetched_locations:
+                self.build_context.check()
+                self.application_configuration.projects.parse_documents(
+                    documents=fetched_location.iter_documents(parse_cache=parse_cache, build_context=self.build_context, logger=self.logger, parse_pool=parse_pool)
+                )
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+            cleanup_fetched_locations(fetched_locations=fetched_locations)
+
+    def _start_load(self):
+        # The state may load the manifests more than once, and every load must see the current branches of the remotes
+        self.build_context.clear_remote_refs()
+        if self.git_mirror_cache is not None:
+            self.git_mirror_cache.clear_updated_branches()
+
+    def load_manifests(self):
+        """Load the system and project manifests, from the bundle in `bundle_file` if it is set and not stale"""
+        self._start_load()
+        if self.bundle_file is not None:
+            if self.load_bundle(bundle_file=self.bundle_file) is True:
+                return
+        self.load_system_manifests()
+        self.load_project_manifests()
+
+    def compile_bundle(self, bundle_file: str)->ManifestBundle:
+        """Load all manifests from the locations and write them as a bundle (see :class:`verbacratis.models.manifest_bundle.ManifestBundle`)
 
+        The objects of all environments are included, so that the bundle can be used for any environment. The
+        fingerprints of the system and project manifest locations are determined before they are loaded, so that a
+        change made while compiling makes the bundle stale.
+        """
+        self._start_load()
+        source_fingerprints = get_source_fingerprints(
+            system_manifest_locations=self.system_manifest_locations,
+            project_manifest_locations=self.project_manifest_locations,
+            build_context=self.build_context
+        )
+        self.load_system_manifests()
+        self.load_project_manifests()
+        source_fingerprints.update(get_source_fingerprints(system_manifest_locations=list(), project_manifest_locations=list(), projects=self.application_configuration.projects))
+        system_configurations = self.application_configuration.system_configurations
+        system_configurations.materialize_all()
+        system_configurations.target_environments = None
+        bundle = ManifestBundle(
+            system_configurations=system_configurations,
+            projects=self.application_configuration.projects,
+            system_manifest_locations=self.system_manifest_locations,
+            project_manifest_locations=self.project_manifest_locations,
+            source_fingerprints=source_fingerprints
+        )
+        bundle.write(bundle_file=bundle_file)
+        self.logger.info('Compiled manifest bundle "{}" with source checksum {}'.format(bundle_file, bundle.source_checksum))
+        return bundle
+
+    def load_bundle(self, bundle_file: str)->bool:
+        """Use the system configurations and projects of a bundle
+
+        The bundle is not used if it was compiled from other manifest locations than those of this state, or if the
+        content of a location changed since (see :func:`verbacratis.models.manifest_bundle.get_source_fingerprints`).
+
+        Returns:
+            bool: True if the bundle was loaded, or False if the bundle cannot be used
+        """
+        try:
+            bundle = load_bundle(bundle_file=bundle_file)
+        except:
+            self.logger.warn('Manifest bundle "{}" could not be loaded: {}'.format(bundle_file, traceback.format_exc()))
+            return False
+        source_fingerprints = get_source_fingerprints(
+            system_manifest_locations=self.system_manifest_locations,
+            project_manifest_locations=self.project_manifest_locations,
+            projects=bundle.projects,
+            build_context=self.build_context
+        )
+        if bundle.is_stale(system_manifest_locations=self.system_manifest_locations, project_manifest_locations=self.project_manifest_locations, source_fingerprints=source_fingerprints) is True:
+            self.logger.warn('Manifest bundle "{}" was compiled from other manifest locations, or their content changed, and is ignored'.format(bundle_file))
+            return False
+        self.application_configuration.system_configurations = bundle.system_configurations
+        self.application_configuration.projects = bundle.projects
+        self.application_configuration.projects.logger = self.logger
+        self.application_configuration.projects.git_mirror_cache = self.get_git_mirror_cache()
+        self.logger.info('Loaded manifest bundle "{}" with source checksum {}'.format(bundle_file, bundle.source_checksum))
+        return True
+
+    def _iter_configuration_documents(self, all_environments: bool=False):
+        environments = self.environments
+        if all_environments is True:
+            environments = None
+        for data in self.application_configuration.system_configurations.iter_documents(environments=environments):
+            yield data
+        for data in self.application_configuration.projects.iter_documents():
+            yield data
+
+    def export_configuration(self, stream, output_format: str='yaml', all_environments: bool=False):
+        """Write the effective system configurations and projects to a file-like object, for example for an audit trail
+
+        By default only the system objects of the targeted environments (see `environments`) are written, and the objects
+        of the other environments are not created just to be exported (see
+        :meth:`verbacratis.models.systems_configuration.SystemConfigurations.iter_documents`).
+
+        Args:
+            stream: A writable text file-like object
+            output_format: Either `yaml` (a multi-document stream) or `json` (an array of documents)
+            all_environments: If True, the system objects of all environments are created and written
+        """
+        dump_documents(documents=self._iter_configuration_documents(all_environments=all_environments), stream=stream, output_format=output_format)
+
+    def export_configuration_file(self, export_file: str, output_format: str='yaml', all_environments: bool=False):
+        """Write the effective configuration to a file (see :meth:`export_configuration`). The file is replaced in one step."""
+        tmp_file = '{}.tmp'.format(export_file)
+        try:
+            with open(tmp_file, 'w') as f:
+                self.export_configuration(stream=f, output_format=output_format, all_environments=all_environments)
+            os.replace(tmp_file, export_file)
+        except:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        self.logger.info('Exported the effective configuration to "{}"'.format(export_file))
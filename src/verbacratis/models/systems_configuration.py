@@ -6,14 +6,17 @@
     https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
 """
 
+import io
 import os
 import yaml
 import traceback
 from verbacratis.models import AWS_REGIONS
-from verbacratis.utils.parser2 import parse_yaml_file
+from verbacratis.models.kind_registry import KindRegistry, get_item_name, get_item_account_name
+from verbacratis.utils.parser2 import parse_yaml_file, iter_parsed_files, dump_documents, ParsedDocumentCache, DEFAULT_PARALLEL_PARSING_THRESHOLD
 from verbacratis.utils.git_integration import random_word, git_clone_checkout_and_return_list_of_files
 from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
 from verbacratis.utils.http_requests_io import download_files
+from verbacratis.utils.build_context import BuildContext
 
 
 class Authentication:
@@ -462,24 +465,59 @@ class AwsInfrastructureAccount(InfrastructureAccount):
 
 class SystemConfigurations:
     """Keeps a collection of Unix and AWS Cloud Infrastructure Accounts and Credentials
+
+    Documents are turned into objects through a :class:`verbacratis.models.kind_registry.KindRegistry`. The default is
+    `system_kind_registry`, to which plugins can add their own kinds.
+
+    Infrastructure accounts are indexed by name and by environment when they are stored, so that lookups do not have to
+    scan the buckets. The environment index reflects the environments of an account at the time it was stored, so
+    change the environments of a stored account with :meth:`set_account_environments`.
+
+    When target environments are set (see :meth:`set_target_environments`), only the infrastructure accounts of those
+    environments are created while parsing. The documents of all other objects (accounts of other environments,
+    authentication objects and plugin kinds) are kept as they are, and their objects are created when they are first
+    looked up, for example by :meth:`get_configuration_instance` when an account is linked to its authentication. Errors
+    in a kept document are therefore only raised when its object is created.
+
+    Attributes:
+        parsed_configuration: The bucket name (the kind) as key, with a dictionary of the objects by name as value
+        accounts_by_name: The account name as key, with a dictionary of the accounts by bucket name as value
+        accounts_by_environment: The environment name as key, with a dictionary by bucket name of dictionaries of the accounts by name as value. The keys are the environments of all accounts.
+        target_environments: A tuple of the environment names to create accounts for while parsing, or None to create all objects while parsing
+        deferred_documents: The bucket name as key, with a dictionary of the documents (with lowercase top level keys) by object name as value, for the objects not created yet
     """
-    def __init__(self):    
+    def __init__(self, kind_registry: KindRegistry=None, target_environments: list=None):    
+        if kind_registry is None:
+            kind_registry = system_kind_registry
+        self.kind_registry = kind_registry
         self.parsed_configuration = dict()
-        self.parsed_configuration['Authentication'] = dict()
-        self.parsed_configuration['UnixHostAuthentication'] = dict()
-        self.parsed_configuration['SshHostBasedAuthenticationConfig'] = dict()
-        self.parsed_configuration['SshCredentialsBasedAuthenticationConfig'] = dict()
-        self.parsed_configuration['SshPrivateKeyBasedAuthenticationConfig'] = dict()
-        self.parsed_configuration['AwsAuthentication'] = dict()
-        self.parsed_configuration['AwsKeyBasedAuthentication'] = dict()
-        self.parsed_configuration['AwsProfileBasedAuthentication'] = dict()
-        self.parsed_configuration['InfrastructureAccount'] = dict()
-        self.parsed_configuration['UnixInfrastructureAccount'] = dict()
-        self.parsed_configuration['AwsInfrastructureAccount'] = dict()
+        for bucket in self.kind_registry.get_buckets():
+            self.parsed_configuration[bucket] = dict()
+        self.accounts_by_name = dict()
+        self.accounts_by_environment = dict()
+        self._indexed_environments = dict()     # (bucket, account name) as key, with the indexed environments as value
+        self.target_environments = None
+        self.deferred_documents = dict()
+        self.deferred_accounts_by_environment = dict()  # Environment name as key, with a dictionary of (bucket, account name) keys as value
+        self._deferred_environments = dict()    # (bucket, account name) as key, with the environments of the kept document as value
 
         # Create a run-on-localhost account
-        self.parsed_configuration['Authentication']['no-auth'] = Authentication()
-        self.parsed_configuration['UnixInfrastructureAccount']['deployment-host'] = UnixInfrastructureAccount()
+        self.store_kind_item(bucket='Authentication', name='no-auth', item=Authentication())
+        self.store_kind_item(bucket='UnixInfrastructureAccount', name='deployment-host', item=UnixInfrastructureAccount())
+
+        if target_environments is not None:
+            self.set_target_environments(environments=target_environments)
+
+    def __getstate__(self)->dict:
+        state = dict(self.__dict__)
+        if state['kind_registry'] is system_kind_registry:
+            state['kind_registry'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self.kind_registry is None:
+            self.kind_registry = system_kind_registry
 
     def _create_Authentication_instance_from_data(self, data:dict)->Authentication: # pragma: no cover
         o = Authentication(name=data['metadata']['name'])
@@ -610,56 +648,139 @@ class SystemConfigurations:
         return o
 
 
-    def parse_yaml(self, raw_data: dict):
-        """Parse data into the various Objects.
+    def add_document(self, data: dict):
+        """Create the instance for a single parsed YAML document and add it to the configuration
 
-        Use something like parse_yaml_file() from `verbacratis.utils.parser2` to obtain the dictionary value from a parsed YAML file
+        Documents that are not a dictionary, or that have no registered `kind`, are ignored. References between
+        instances are only resolved by :meth:`link_references`.
         """
-        # Create individual class instances and add to the parsed_configuration for each type
-        for part, data in raw_data.items():
-            if isinstance(data, dict):
-                converted_data = dict((k.lower(),v) for k,v in data.items()) # Convert keys to lowercase
-                if 'kind' in converted_data:
-                    if converted_data['kind'].lower() == 'Authentication'.lower():
-                        self.add_configuration(item=self._create_Authentication_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'UnixHostAuthentication'.lower():
-                        self.add_configuration(item=self._create_UnixHostAuthentication_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'SshHostBasedAuthenticationConfig'.lower():
-                        self.add_configuration(item=self._create_SshHostBasedAuthenticationConfig_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'SshCredentialsBasedAuthenticationConfig'.lower():
-                        self.add_configuration(item=self._create_SshCredentialsBasedAuthenticationConfig_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'SshPrivateKeyBasedAuthenticationConfig'.lower():
-                        self.add_configuration(item=self._create_SshPrivateKeyBasedAuthenticationConfig_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'AwsAuthentication'.lower():
-                        self.add_configuration(item=self._create_AwsAuthentication_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'AwsKeyBasedAuthentication'.lower():
-                        self.add_configuration(item=self._create_AwsKeyBasedAuthentication_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'AwsProfileBasedAuthentication'.lower():
-                        self.add_configuration(item=self._create_AwsProfileBasedAuthentication_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'InfrastructureAccount'.lower():
-                        self.add_configuration(item=self._create_InfrastructureAccount_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'UnixInfrastructureAccount'.lower():
-                        self.add_configuration(item=self._create_UnixInfrastructureAccount_instance_from_data(data=converted_data))
-                    elif converted_data['kind'].lower() == 'AwsInfrastructureAccount'.lower():
-                        self.add_configuration(item=self._create_AwsInfrastructureAccount_instance_from_data(data=converted_data))
-        
+        if isinstance(data, dict):
+            converted_data = dict((k.lower(),v) for k,v in data.items()) # Convert keys to lowercase
+            if self._defer_document(data=converted_data) is False:
+                self.kind_registry.create(collection=self, data=converted_data)
+
+    def _get_document_environments(self, data: dict)->tuple:
+        environments = ['default',]
+        if isinstance(data.get('metadata'), dict) and 'environments' in data['metadata']:
+            environments = data['metadata']['environments']
+        return tuple(dict.fromkeys(environments))
+
+    def _pop_deferred_document(self, bucket: str, name: str)->dict:
+        for environment in self._deferred_environments.pop((bucket, name), tuple()):
+            self.deferred_accounts_by_environment[environment].pop((bucket, name), None)
+            if len(self.deferred_accounts_by_environment[environment]) == 0:
+                self.deferred_accounts_by_environment.pop(environment)
+        if bucket not in self.deferred_documents:
+            return None
+        data = self.deferred_documents[bucket].pop(name, None)
+        if len(self.deferred_documents[bucket]) == 0:
+            self.deferred_documents.pop(bucket)
+        return data
+
+    def _defer_document(self, data: dict)->bool:
+        """Keep a document instead of creating its object, unless the object is needed for the target environments
+
+        Returns:
+            True if the document was kept
+        """
+        if self.target_environments is None:
+            return False
+        definition = self.kind_registry.get(kind=data.get('kind'))
+        if definition is None or definition.bucket is None:
+            return False
+        try:
+            name = definition.document_name_accessor(data)
+        except Exception:
+            return False    # The factory reports the invalid document
+        self._pop_deferred_document(bucket=definition.bucket, name=name)
+        if name in self.parsed_configuration.get(definition.bucket, dict()):
+            return False    # Replace the object that was already created
+        if definition.item_class is not None and issubclass(definition.item_class, InfrastructureAccount):
+            environments = self._get_document_environments(data=data)
+            for environment in environments:
+                if environment in self.target_environments:
+                    return False
+            for environment in environments:
+                if environment not in self.deferred_accounts_by_environment:
+                    self.deferred_accounts_by_environment[environment] = dict()
+                self.deferred_accounts_by_environment[environment][(definition.bucket, name)] = None
+            self._deferred_environments[(definition.bucket, name)] = environments
+        if definition.bucket not in self.deferred_documents:
+            self.deferred_documents[definition.bucket] = dict()
+        self.deferred_documents[definition.bucket][name] = data
+        return True
+
+    def _materialize(self, bucket: str, name: str)->object:
+        """Create the object of a kept document, or return None if no document of that name is kept in the bucket"""
+        data = self._pop_deferred_document(bucket=bucket, name=name)
+        if data is None:
+            return None
+        item = self.kind_registry.create(collection=self, data=data)
+        if isinstance(item, InfrastructureAccount):
+            self._link_account(account=item)
+        return item
+
+    def _materialize_environment(self, environment_name: str):
+        for bucket, name in list(self.deferred_accounts_by_environment.get(environment_name, dict()).keys()):
+            self._materialize(bucket=bucket, name=name)
+
+    def materialize_all(self):
+        """Create the objects of all kept documents"""
+        for bucket, documents in list(self.deferred_documents.items()):
+            for name in list(documents.keys()):
+                self._materialize(bucket=bucket, name=name)
+
+    def set_target_environments(self, environments: list):
+        """Only create the infrastructure accounts of these environments while parsing
+
+        Accounts of these environments that were kept before are created now.
+        """
+        self.target_environments = tuple(environments)
+        for environment in self.target_environments:
+            self._materialize_environment(environment_name=environment)
+
+    def _link_account(self, account: InfrastructureAccount):
+        account.authentication_config = self.get_configuration_instance(
+            class_type_name=account.authentication_config_type,
+            instance_name=account.authentication_config.name
+        )
+
+    def link_references(self):
+        """Resolve the references between the added instances, once all documents were added"""
         # Go through all the InfrastructureAccount's and link their proper authentication classes based on the Authentication class name.
-        for object_class_type, objects in self.parsed_configuration.items():
+        for object_class_type, objects in list(self.parsed_configuration.items()):
             if object_class_type in ('InfrastructureAccount', 'UnixInfrastructureAccount', 'AwsInfrastructureAccount',):
-                for object_name, object_def in objects.items():
-                    object_def.authentication_config = self.get_configuration_instance(
-                        class_type_name=object_def.authentication_config_type,
-                        instance_name=object_def.authentication_config.name
-                    )
+                for object_name, object_def in list(objects.items()):
+                    self._link_account(account=object_def)
 
         # Update all our environments in our local deployment host
         self.update_local_deployment_host_with_all_environments()
 
+    def parse_documents(self, documents):
+        """Parse parsed YAML documents into the various Objects.
+
+        The documents are added one at a time as they are produced, so `documents` may be a generator that parses them
+        on demand (see :func:`verbacratis.utils.parser2.iter_yaml_file_documents`). The references are resolved after
+        the last document.
+        """
+        for data in documents:
+            self.add_document(data=data)
+        self.link_references()
+
+    def parse_yaml(self, raw_data: dict):
+        """Parse data into the various Objects.
+
+        Use something like parse_yaml_file() from `verbacratis.utils.parser2` to obtain the dictionary value from a parsed YAML file
+        """
+        self.parse_documents(documents=raw_data.values())
+
     def get_configuration_instance(self, class_type_name: str, instance_name: str):
         if class_type_name in self.parsed_configuration:
-            for object_name, object_instance in self.parsed_configuration[class_type_name].items():
-                if object_name == instance_name:
-                    return object_instance
+            if instance_name in self.parsed_configuration[class_type_name]:
+                return self.parsed_configuration[class_type_name][instance_name]
+        item = self._materialize(bucket=class_type_name, name=instance_name)
+        if item is not None:
+            return item
         raise Exception('"{}" of type "{}" NOT FOUND'.format(instance_name, class_type_name))
 
     def get_infrastructure_account_names(self)->tuple:
@@ -667,15 +788,20 @@ class SystemConfigurations:
         for object_class_type, objects in self.parsed_configuration.items():
             for object_name, object_def in objects.items():
                 names.append({'ObjectClassType': object_class_type, 'ObjectName': object_name}) # Something like {'ObjectClassType': 'Authentication', 'ObjectName': 'some-name'}
+        for object_class_type, documents in self.deferred_documents.items():
+            for object_name in documents:
+                names.append({'ObjectClassType': object_class_type, 'ObjectName': object_name})
         return tuple(names)
 
     def get_infrastructure_account_auth_config(self, infrastructure_account_name: str, search_scope: tuple=('InfrastructureAccount', 'UnixInfrastructureAccount', 'AwsInfrastructureAccount',))->list:
         authentication_configurations = list()
-        for object_class_type, objects in self.parsed_configuration.items():
-            if object_class_type in search_scope:
-                for object_name, object_def in objects.items():
-                    if object_name == infrastructure_account_name:
-                        authentication_configurations.append({'ObjectClassType': object_class_type, 'ObjectInstance': object_def})
+        for object_class_type in search_scope:
+            self._materialize(bucket=object_class_type, name=infrastructure_account_name)
+        if infrastructure_account_name in self.accounts_by_name:
+            accounts = self.accounts_by_name[infrastructure_account_name]
+            for object_class_type in self.parsed_configuration:
+                if object_class_type in search_scope and object_class_type in accounts:
+                    authentication_configurations.append({'ObjectClassType': object_class_type, 'ObjectInstance': accounts[object_class_type]})
         return authentication_configurations
 
     def find_local_deployment_host_account_name(self)->str:
@@ -686,40 +812,61 @@ class SystemConfigurations:
                 return object_name
         raise Exception('Critical error: No account found for running on local host')
 
+    def _unindex_account(self, bucket: str, name: str):
+        for environment in self._indexed_environments.pop((bucket, name), tuple()):
+            accounts = self.accounts_by_environment[environment]
+            accounts[bucket].pop(name, None)
+            if len(accounts[bucket]) == 0:
+                accounts.pop(bucket)
+            if len(accounts) == 0:
+                self.accounts_by_environment.pop(environment)
+        if name in self.accounts_by_name:
+            self.accounts_by_name[name].pop(bucket, None)
+            if len(self.accounts_by_name[name]) == 0:
+                self.accounts_by_name.pop(name)
+
+    def _index_account(self, bucket: str, name: str, account: InfrastructureAccount):
+        self._unindex_account(bucket=bucket, name=name)
+        if name not in self.accounts_by_name:
+            self.accounts_by_name[name] = dict()
+        self.accounts_by_name[name][bucket] = account
+        environments = tuple(dict.fromkeys(account.environments))
+        for environment in environments:
+            if environment not in self.accounts_by_environment:
+                self.accounts_by_environment[environment] = dict()
+            if bucket not in self.accounts_by_environment[environment]:
+                self.accounts_by_environment[environment][bucket] = dict()
+            self.accounts_by_environment[environment][bucket][name] = account
+        self._indexed_environments[(bucket, name)] = environments
+
+    def store_kind_item(self, bucket: str, name: str, item: object):
+        if bucket not in self.parsed_configuration:
+            self.parsed_configuration[bucket] = dict()
+        if name in self.parsed_configuration[bucket]:
+            self._unindex_account(bucket=bucket, name=name)
+        self.parsed_configuration[bucket][name] = item
+        if isinstance(item, InfrastructureAccount):
+            self._index_account(bucket=bucket, name=name, account=item)
+
+    def set_account_environments(self, account: InfrastructureAccount, environments: list):
+        """Change the environments of a stored account, keeping the environment index up to date"""
+        account.environments = environments
+        for bucket, stored_account in list(self.accounts_by_name.get(account.account_name, dict()).items()):
+            if stored_account is account:
+                self._index_account(bucket=bucket, name=account.account_name, account=account)
+
     def add_configuration(self, item: object):
-        if item.__class__.__name__ == 'Authentication':
-            self.parsed_configuration['Authentication'][item.name] = item
-        elif item.__class__.__name__ == 'UnixHostAuthentication':
-            self.parsed_configuration['UnixHostAuthentication'][item.name] = item
-        elif item.__class__.__name__ == 'SshHostBasedAuthenticationConfig':
-            self.parsed_configuration['SshHostBasedAuthenticationConfig'][item.as_dict()['metadata']['name']] = item
-        elif item.__class__.__name__ == 'SshCredentialsBasedAuthenticationConfig':
-            self.parsed_configuration['SshCredentialsBasedAuthenticationConfig'][item.as_dict()['metadata']['name']] = item
-        elif item.__class__.__name__ == 'SshPrivateKeyBasedAuthenticationConfig':
-            self.parsed_configuration['SshPrivateKeyBasedAuthenticationConfig'][item.as_dict()['metadata']['name']] = item
-        elif item.__class__.__name__ == 'AwsAuthentication':
-            self.parsed_configuration['AwsAuthentication'][item.name] = item
-        elif item.__class__.__name__ == 'AwsKeyBasedAuthentication':
-            self.parsed_configuration['AwsKeyBasedAuthentication'][item.name] = item
-        elif item.__class__.__name__ == 'AwsProfileBasedAuthentication':
-            self.parsed_configuration['AwsProfileBasedAuthentication'][item.name] = item
-        elif item.__class__.__name__ == 'InfrastructureAccount':
-            self.parsed_configuration['InfrastructureAccount'][item.account_name] = item
-        elif item.__class__.__name__ == 'UnixInfrastructureAccount':
-            self.parsed_configuration['UnixInfrastructureAccount'][item.account_name] = item
-        elif item.__class__.__name__ == 'AwsInfrastructureAccount':
-            self.parsed_configuration['AwsInfrastructureAccount'][item.account_name] = item
-        else:
+        definition = self.kind_registry.get_for_item(item=item)
+        if definition is None or definition.bucket is None:
             raise Exception('Item type "{}" not recognized'.format(item.__class__.__name__))
+        self.kind_registry.store(collection=self, definition=definition, item=item)
 
     def get_all_environments(self)->tuple:
-        environments = list()
-        for object_class_type, objects in self.parsed_configuration.items():
-            if object_class_type in ('InfrastructureAccount', 'UnixInfrastructureAccount', 'AwsInfrastructureAccount',):
-                for object_name, object_def in objects.items():
-                    for environment in object_def.environments:
-                        if environment not in environments:
-                            environments.append(environment)
+        """The environments of all infrastructure accounts, in the order they were first used"""
+        environments = list(self.accounts_by_environment.keys())
+        for environment in self.deferred_accounts_by_environment:
+            if environment not in self.accounts_by_environment:
+                environments.append(environment)
         return tuple(environments)
 
     def update_local_deployment_host_with_all_environments(self):
@@ -728,48 +875,114 @@ class SystemConfigurations:
             raise Exception('At least one environment name must be set')
         if len(environments) == 0:
             raise Exception('At least one environment name must be set')
-        self.parsed_configuration['UnixInfrastructureAccount'][self.find_local_deployment_host_account_name()].environments = environments
+        self.set_account_environments(
+            account=self.parsed_configuration['UnixInfrastructureAccount'][self.find_local_deployment_host_account_name()],
+            environments=environments
+        )
 
     def get_infrastructure_Accounts_for_named_environment(self, environment_name: str, search_scope: tuple=('InfrastructureAccount', 'UnixInfrastructureAccount', 'AwsInfrastructureAccount',))->list:
         """Get all Infrastructure Accounts scoped for a certain environment, for example sandbox
         """
         infrastructure_accounts = list()
-        for object_class_type, objects in self.parsed_configuration.items():
-            if object_class_type in search_scope:
-                for object_name, object_def in objects.items():
-                    if environment_name in object_def.environments:
+        self._materialize_environment(environment_name=environment_name)
+        if environment_name in self.accounts_by_environment:
+            accounts = self.accounts_by_environment[environment_name]
+            for object_class_type in self.parsed_configuration:
+                if object_class_type in search_scope and object_class_type in accounts:
+                    for object_name, object_def in accounts[object_class_type].items():
                         infrastructure_accounts.append({'ObjectClassType': object_class_type, 'ObjectInstance': object_def})
         return infrastructure_accounts
 
-    def __str__(self)->str:
-        config_as_str = ''
+    def _iter_objects(self, environments: list=None):
+        if environments is None:
+            self.materialize_all()
+            for object_class_type, objects in self.parsed_configuration.items():
+                for object_name, object_def in objects.items():
+                    yield object_class_type, object_name, object_def
+            return
+        environments = set(environments)
+        used_authentications = set()
+        for object_class_type, objects in self.parsed_configuration.items():
+            for object_def in objects.values():
+                if isinstance(object_def, InfrastructureAccount) and len(environments.intersection(object_def.environments)) > 0:
+                    used_authentications.add(id(object_def.authentication_config))
         for object_class_type, objects in self.parsed_configuration.items():
             for object_name, object_def in objects.items():
-                config_as_str = '{}\n---\n{}'.format(config_as_str, str(object_def))
-        return config_as_str
+                if isinstance(object_def, InfrastructureAccount):
+                    if len(environments.intersection(object_def.environments)) == 0:
+                        continue
+                elif isinstance(object_def, Authentication):
+                    if id(object_def) not in used_authentications:
+                        continue
+                yield object_class_type, object_name, object_def
+
+    def iter_documents(self, environments: list=None):
+        """Yield the `as_dict()` value of every object, once per object
+
+        Args:
+            environments: If set, only the infrastructure accounts of these environments and the authentication objects
+                they use are yielded, with all other kinds of objects, and no kept document is turned into an object.
+                If None, the objects of all kept documents are created first.
+        """
+        for object_class_type, object_name, object_def in self._iter_objects(environments=environments):
+            yield object_def.as_dict()
+
+    def as_dict(self, environments: list=None)->dict:
+        """A snapshot of all objects: the bucket name as key, with a dictionary of the `as_dict()` values by object name as value
 
+        Args:
+            environments: If set, only the objects of these environments are included (see :meth:`iter_documents`)
+        """
+        objects = list(self._iter_objects(environments=environments))
+        root = dict()
+        for object_class_type in self.parsed_configuration:
+            root[object_class_type] = dict()
+        for object_class_type, object_name, object_def in objects:
+            root[object_class_type][object_name] = object_def.as_dict()
+        return root
 
-def get_system_configuration_from_files(files: list, system_configurations = SystemConfigurations())->SystemConfigurations:
+    def __str__(self)->str:
+        stream = io.StringIO()
+        dump_documents(documents=self.iter_documents(), stream=stream)
+        return stream.getvalue()
+
+
+system_kind_registry = KindRegistry()
+system_kind_registry.register(kind='Authentication', factory=SystemConfigurations._create_Authentication_instance_from_data, bucket='Authentication', name_accessor=get_item_name, item_class=Authentication)
+system_kind_registry.register(kind='UnixHostAuthentication', factory=SystemConfigurations._create_UnixHostAuthentication_instance_from_data, bucket='UnixHostAuthentication', name_accessor=get_item_name, item_class=UnixHostAuthentication)
+system_kind_registry.register(kind='SshHostBasedAuthenticationConfig', factory=SystemConfigurations._create_SshHostBasedAuthenticationConfig_instance_from_data, bucket='SshHostBasedAuthenticationConfig', name_accessor=get_item_name, item_class=SshHostBasedAuthenticationConfig)
+system_kind_registry.register(kind='SshCredentialsBasedAuthenticationConfig', factory=SystemConfigurations._create_SshCredentialsBasedAuthenticationConfig_instance_from_data, bucket='SshCredentialsBasedAuthenticationConfig', name_accessor=get_item_name, item_class=SshCredentialsBasedAuthenticationConfig)
+system_kind_registry.register(kind='SshPrivateKeyBasedAuthenticationConfig', factory=SystemConfigurations._create_SshPrivateKeyBasedAuthenticationConfig_instance_from_data, bucket='SshPrivateKeyBasedAuthenticationConfig', name_accessor=get_item_name, item_class=SshPrivateKeyBasedAuthenticationConfig)
+system_kind_registry.register(kind='AwsAuthentication', factory=SystemConfigurations._create_AwsAuthentication_instance_from_data, bucket='AwsAuthentication', name_accessor=get_item_name, item_class=AwsAuthentication)
+system_kind_registry.register(kind='AwsKeyBasedAuthentication', factory=SystemConfigurations._create_AwsKeyBasedAuthentication_instance_from_data, bucket='AwsKeyBasedAuthentication', name_accessor=get_item_name, item_class=AwsKeyBasedAuthentication)
+system_kind_registry.register(kind='AwsProfileBasedAuthentication', factory=SystemConfigurations._create_AwsProfileBasedAuthentication_instance_from_data, bucket='AwsProfileBasedAuthentication', name_accessor=get_item_name, item_class=AwsProfileBasedAuthentication)
+system_kind_registry.register(kind='InfrastructureAccount', factory=SystemConfigurations._create_InfrastructureAccount_instance_from_data, bucket='InfrastructureAccount', name_accessor=get_item_account_name, item_class=InfrastructureAccount)
+system_kind_registry.register(kind='UnixInfrastructureAccount', factory=SystemConfigurations._create_UnixInfrastructureAccount_instance_from_data, bucket='UnixInfrastructureAccount', name_accessor=get_item_account_name, item_class=UnixInfrastructureAccount)
+system_kind_registry.register(kind='AwsInfrastructureAccount', factory=SystemConfigurations._create_AwsInfrastructureAccount_instance_from_data, bucket='AwsInfrastructureAccount', name_accessor=get_item_account_name, item_class=AwsInfrastructureAccount)
+
+
+def get_system_configuration_from_files(files: list, system_configurations = SystemConfigurations(), parse_cache: ParsedDocumentCache=None, parallel_parsing_threshold: int=DEFAULT_PARALLEL_PARSING_THRESHOLD)->SystemConfigurations:
     try:
-        for file in files:
-            system_configurations.parse_yaml(raw_data=parse_yaml_file(file_path=file))
+        for file, documents in iter_parsed_files(files=files, parse_cache=parse_cache, parallel_parsing_threshold=parallel_parsing_threshold):
+            system_configurations.parse_documents(documents=documents)
     except:
         traceback.print_exc()
     return system_configurations
 
 
-def get_system_configuration_from_url(urls: list, set_no_verify_ssl: bool=False, system_configurations = SystemConfigurations())->SystemConfigurations:
+def get_system_configuration_from_url(urls: list, set_no_verify_ssl: bool=False, system_configurations = SystemConfigurations(), build_context: BuildContext=None)->SystemConfigurations:
     """Parse the file specified in the URL to return a SystemConfigurations instance
 
     Args:
         urls: A list of strings containing the URLs to the YAML files to download and parse
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
 
     Returns:
         `SystemConfigurations` instance with the parsed configuration
     """
     tmp_dir = create_tmp_dir(sub_dir=random_word(length=32))
-    files = download_files(urls=urls, target_dir=tmp_dir, set_no_verify_ssl=set_no_verify_ssl)
+    files = download_files(urls=urls, target_dir=tmp_dir, set_no_verify_ssl=set_no_verify_ssl, build_context=build_context)
     system_configurations = get_system_configuration_from_files(files=files, system_configurations=system_configurations)
     remove_tmp_dir_recursively(dir=tmp_dir)
     return system_configurations
@@ -782,7 +995,8 @@ def get_system_configuration_from_git(
     include_files_regex: str='.*\.yaml$|.*\.yml$',
     ssh_private_key_path: str=None,
     set_no_verify_ssl: bool=False,
-    system_configurations = SystemConfigurations()
+    system_configurations = SystemConfigurations(),
+    build_context: BuildContext=None
 )->SystemConfigurations:
     """Parse files from a Git repository matching a file pattern withing a branch and directory to return a SystemConfigurations instance
 
@@ -793,6 +1007,7 @@ def get_system_configuration_from_git(
         include_files_regex: A regular expression string for files to match. Default is matching YAML files.
         ssh_private_key_path: A string containing the SSH private key to use. Optional, and if value is `None`, the default transport (HTTPS) will be used.
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
 
     Returns:
         `SystemConfigurations` instance with the parsed configuration
@@ -805,7 +1020,8 @@ def get_system_configuration_from_git(
         include_files_regex=include_files_regex,
         target_dir=tmp_dir,
         ssh_private_key_path=ssh_private_key_path,
-        set_no_verify_ssl=set_no_verify_ssl
+        set_no_verify_ssl=set_no_verify_ssl,
+        build_context=build_context
     )
     system_configurations = get_system_configuration_from_files(files=files, system_configurations=system_configurations)
     remove_tmp_dir_recursively(dir=tmp_dir)
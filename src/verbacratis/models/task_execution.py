@@ -0,0 +1,301 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from verbacratis.models import GenericLogger
+from verbacratis.utils.build_context import BuildContext
+
+
+# Placeholder used in the example configurations to indicate that a deployment profile has no dependencies
+NO_PROFILE_DEPENDENCY = 'None'
+
+
+class TaskState:
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    SKIPPED = 'SKIPPED'
+
+
+class FailurePolicy:
+    FAIL_FAST = 1               # Stop scheduling any new tasks as soon as one task fails
+    CONTINUE_INDEPENDENT = 2    # Skip only the tasks that (indirectly) depend on a failed task
+    policies = range(1,3)
+
+
+def get_task_graph_reference_errors(configuration: dict)->list:
+    """Check that every `taskDependsOn` and `dependsOnProfile` entry refers to a defined task or deployment
+
+    Args:
+      configuration: The parsed configuration with `tasks` and `deployments`
+
+    Returns:
+        A list of error messages. An empty list means all references could be resolved.
+    """
+    errors = list()
+    task_names = list()
+    deployment_names = list()
+    for task in configuration.get('tasks', list()):
+        task_names.append(task['name'])
+    for deployment in configuration.get('deployments', list()):
+        deployment_names.append(deployment['name'])
+    for task in configuration.get('tasks', list()):
+        for dependency_task_name in task.get('taskDependsOn', list()):
+            if dependency_task_name not in task_names:
+                errors.append('Task "{}" depends on task "{}" which was not found in task definition'.format(task['name'], dependency_task_name))
+    for deployment in configuration.get('deployments', list()):
+        for profile_name in deployment.get('dependsOnProfile', list()):
+            if profile_name == NO_PROFILE_DEPENDENCY or profile_name is None:
+                continue
+            if profile_name not in deployment_names:
+                errors.append('Deployment "{}" depends on profile "{}" which was not found in deployment definition'.format(deployment['name'], profile_name))
+    return errors
+
+
+class TaskGraph:
+    """The directed acyclic graph of tasks that must run for a named deployment
+
+    The graph contains the tasks of the named deployment, the tasks of every deployment profile it (indirectly) depends
+    on through `dependsOnProfile` and every task (indirectly) listed in `taskDependsOn`. A task depends on:
+
+    * Every task listed in its `taskDependsOn`
+    * Every task of every profile its own deployment lists in `dependsOnProfile`
+
+    Attributes:
+        task_names: The task names in a stable topological order (dependencies first)
+        tasks: Dictionary of the task configuration, keyed by task name
+        dependencies: Dictionary of the set of task names a task depends on, keyed by task name
+        dependants: Dictionary of the list of task names depending on a task, keyed by task name
+    """
+
+    def __init__(self, configuration: dict, deployment_name: str, logger: GenericLogger=GenericLogger()):
+        self.logger = logger
+        self.task_names = list()
+        self.tasks = dict()
+        self.dependencies = dict()
+        self.dependants = dict()
+        errors = get_task_graph_reference_errors(configuration=configuration)
+        if len(errors) > 0:
+            raise Exception('Task graph references could not be resolved: {}'.format('; '.join(errors)))
+        all_tasks = dict()
+        for task in configuration.get('tasks', list()):
+            all_tasks[task['name']] = task
+        all_deployments = dict()
+        for deployment in configuration.get('deployments', list()):
+            all_deployments[deployment['name']] = deployment
+        if deployment_name not in all_deployments:
+            raise Exception('Deployment named "{}" not found'.format(deployment_name))
+        deployment_names = self._get_deployment_names_dependencies_first(all_deployments=all_deployments, deployment_name=deployment_name)
+
+        # Each task in a profile waits for all the tasks of the profiles the deployment depends on
+        profile_task_names = dict()
+        for profile_name in deployment_names:
+            deployment = all_deployments[profile_name]
+            profile_task_names[profile_name] = self._get_task_names_closure(all_tasks=all_tasks, start_task_names=deployment['tasks'])
+            for task_name in profile_task_names[profile_name]:
+                if task_name not in self.tasks:
+                    self.tasks[task_name] = all_tasks[task_name]
+                    self.dependencies[task_name] = set(all_tasks[task_name].get('taskDependsOn', list()))
+                    self.dependants[task_name] = list()
+            for dependency_profile_name in self._get_profile_dependency_names(deployment=deployment):
+                for task_name in profile_task_names[profile_name]:
+                    for dependency_task_name in profile_task_names[dependency_profile_name]:
+                        if dependency_task_name not in profile_task_names[profile_name]:
+                            self.dependencies[task_name].add(dependency_task_name)
+        for task_name in self.tasks:
+            for dependency_task_name in sorted(self.dependencies[task_name]):
+                self.dependants[dependency_task_name].append(task_name)
+        self.task_names = self._get_task_names_dependencies_first()
+
+    def _get_profile_dependency_names(self, deployment: dict)->list:
+        profile_names = list()
+        for profile_name in deployment.get('dependsOnProfile', list()):
+            if profile_name != NO_PROFILE_DEPENDENCY and profile_name is not None:
+                profile_names.append(profile_name)
+        return profile_names
+
+    def _get_deployment_names_dependencies_first(self, all_deployments: dict, deployment_name: str)->list:
+        ordered_names = list()
+        visiting = list()
+        def visit(name: str):
+            if name in ordered_names:
+                return
+            if name in visiting:
+                raise Exception('Circular dependsOnProfile reference detected: {}'.format(' -> '.join(visiting[visiting.index(name):] + [name])))
+            visiting.append(name)
+            for profile_name in self._get_profile_dependency_names(deployment=all_deployments[name]):
+                visit(name=profile_name)
+            visiting.pop()
+            ordered_names.append(name)
+        visit(name=deployment_name)
+        return ordered_names
+
+    def _get_task_names_closure(self, all_tasks: dict, start_task_names: list)->list:
+        task_names = list()
+        pending = list(start_task_names)
+        while len(pending) > 0:
+            task_name = pending.pop(0)
+            if task_name in task_names:
+                continue
+            if task_name not in all_tasks:
+                raise Exception('Task name "{}" was not found in task definition'.format(task_name))
+            task_names.append(task_name)
+            pending.extend(all_tasks[task_name].get('taskDependsOn', list()))
+        return task_names
+
+    def _get_task_names_dependencies_first(self)->list:
+        remaining_dependency_qty = dict()
+        ready = list()
+        for task_name in self.tasks:
+            remaining_dependency_qty[task_name] = len(self.dependencies[task_name])
+            if remaining_dependency_qty[task_name] == 0:
+                ready.append(task_name)
+        ordered_names = list()
+        while len(ready) > 0:
+            task_name = ready.pop(0)
+            ordered_names.append(task_name)
+            for dependant_task_name in self.dependants[task_name]:
+                remaining_dependency_qty[dependant_task_name] -= 1
+                if remaining_dependency_qty[dependant_task_name] == 0:
+                    ready.append(dependant_task_name)
+        if len(ordered_names) < len(self.tasks):
+            circular_task_names = list()
+            for task_name in self.tasks:
+                if task_name not in ordered_names:
+                    circular_task_names.append(task_name)
+            raise Exception('Circular taskDependsOn reference detected between tasks: {}'.format(', '.join(circular_task_names)))
+        return ordered_names
+
+    def get_all_dependant_task_names(self, task_name: str)->list:
+        """Get every task that directly or indirectly depends on the named task
+
+        Args:
+          task_name: The task name
+
+        Returns:
+            A list of task names, in the graph's topological order
+        """
+        found = set()
+        pending = list(self.dependants[task_name])
+        while len(pending) > 0:
+            current_task_name = pending.pop()
+            if current_task_name not in found:
+                found.add(current_task_name)
+                pending.extend(self.dependants[current_task_name])
+        return [name for name in self.task_names if name in found]
+
+
+class TaskExecutor:
+    """Runs the tasks of a TaskGraph, starting every task as soon as all its dependencies succeeded
+
+    The `task_runner` is any callable accepting the keyword arguments `task_name` and `task_configuration`. A task
+    fails if the runner raises an exception or returns `False`.
+
+    Attributes:
+        task_graph: The TaskGraph to execute
+        task_runner: The callable that runs a single task
+        max_parallel_tasks: The maximum number of tasks running at the same time
+        failure_policy: One of the FailurePolicy values
+        build_context: Optional BuildContext. No new tasks are started once the build is cancelled or the deadline passed
+        task_states: Dictionary of TaskState values, keyed by task name
+        task_errors: Dictionary of error messages of failed tasks, keyed by task name
+    """
+
+    def __init__(
+        self,
+        task_graph: TaskGraph,
+        task_runner: object,
+        max_parallel_tasks: int=4,
+        failure_policy: int=FailurePolicy.FAIL_FAST,
+        logger: GenericLogger=GenericLogger(),
+        build_context: BuildContext=None
+    ):
+        if max_parallel_tasks < 1:
+            raise Exception('max_parallel_tasks must be at least 1')
+        if failure_policy not in FailurePolicy.policies:
+            raise Exception('Unsupported failure policy')
+        self.task_graph = task_graph
+        self.task_runner = task_runner
+        self.max_parallel_tasks = max_parallel_tasks
+        self.failure_policy = failure_policy
+        self.logger = logger
+        self.build_context = build_context
+        self.task_states = dict()
+        self.task_errors = dict()
+
+    def _run_task(self, task_name: str)->bool:
+        try:
+            result = self.task_runner(task_name=task_name, task_configuration=self.task_graph.tasks[task_name])
+            if result is False:
+                self.task_errors[task_name] = 'Task runner returned False'
+                return False
+        except Exception as e:
+            self.logger.error('Task "{}" failed: {}'.format(task_name, traceback.format_exc()))
+            self.task_errors[task_name] = str(e)
+            return False
+        return True
+
+    def _is_ready(self, task_name: str)->bool:
+        for dependency_task_name in self.task_graph.dependencies[task_name]:
+            if self.task_states[dependency_task_name] != TaskState.SUCCEEDED:
+                return False
+        return True
+
+    def run(self)->bool:
+        """Execute all tasks
+
+        Returns:
+            True if every task succeeded, otherwise False. Inspect `task_states` for the outcome of each task.
+        """
+        self.task_states = dict()
+        self.task_errors = dict()
+        for task_name in self.task_graph.task_names:
+            self.task_states[task_name] = TaskState.PENDING
+        stop_scheduling = False
+        running = dict()
+        with ThreadPoolExecutor(max_workers=self.max_parallel_tasks) as pool:
+            while True:
+                if self.build_context is not None and self.build_context.is_cancelled():
+                    stop_scheduling = True
+                if stop_scheduling is False:
+                    for task_name in self.task_graph.task_names:
+                        if len(running) >= self.max_parallel_tasks:
+                            break
+                        if self.task_states[task_name] == TaskState.PENDING and self._is_ready(task_name=task_name):
+                            self.logger.info('Starting task "{}"'.format(task_name))
+                            self.task_states[task_name] = TaskState.RUNNING
+                            running[pool.submit(self._run_task, task_name)] = task_name
+                if len(running) == 0:
+                    break
+                wait_timeout = None
+                if self.build_context is not None:
+                    wait_timeout = self.build_context.get_wait_interval()
+                done, not_done = wait(list(running.keys()), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_name = running.pop(future)
+                    if future.result() is True:
+                        self.task_states[task_name] = TaskState.SUCCEEDED
+                        self.logger.info('Task "{}" succeeded'.format(task_name))
+                        continue
+                    self.task_states[task_name] = TaskState.FAILED
+                    if self.failure_policy == FailurePolicy.FAIL_FAST:
+                        stop_scheduling = True
+                    for dependant_task_name in self.task_graph.get_all_dependant_task_names(task_name=task_name):
+                        if self.task_states[dependant_task_name] == TaskState.PENDING:
+                            self.task_states[dependant_task_name] = TaskState.SKIPPED
+        for task_name in self.task_graph.task_names:
+            if self.task_states[task_name] == TaskState.PENDING:
+                self.task_states[task_name] = TaskState.SKIPPED
+        all_succeeded = True
+        for task_name, state in self.task_states.items():
+            if state != TaskState.SUCCEEDED:
+                self.logger.warn('Task "{}" finished with state {}'.format(task_name, state))
+                all_succeeded = False
+        return all_succeeded
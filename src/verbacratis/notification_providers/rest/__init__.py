@@ -10,12 +10,17 @@ import traceback
 from urllib import request
 from urllib.parse import urlencode
 from verbacratis.notification_providers import NotificationProviderBaseClass
+from verbacratis.utils.build_context import BuildContext
+
+
+DEFAULT_TIMEOUT = 30.0
 
 
 class SendRestMessage(NotificationProviderBaseClass):
 
-    def __init__(self, logger=None)->None:
+    def __init__(self, logger=None, build_context: BuildContext=None)->None:
         super().__init__(logger)
+        self.build_context = build_context
 
     def _send_message_implementation(self, message: str, parameter_overrides: dict)->bool:
         """
@@ -24,6 +29,7 @@ class SendRestMessage(NotificationProviderBaseClass):
                 URL             -> REQUIRED
                 method          -> OPTIONAL: Default=POST
                 ContentType     -> OPTIONAL: Default="text/plain"
+                Timeout         -> OPTIONAL: Default=30 (seconds), but never beyond the build deadline
 
             References:
 
@@ -41,9 +47,15 @@ class SendRestMessage(NotificationProviderBaseClass):
         if 'method' in parameter_overrides:
             method = parameter_overrides['method']
         try:
+            timeout = DEFAULT_TIMEOUT
+            if 'Timeout' in parameter_overrides:
+                timeout = float(parameter_overrides['Timeout'])
+            if self.build_context is not None:
+                self.build_context.check()
+                timeout = min(timeout, self.build_context.get_remaining_time(default=timeout))
             binary_data = message if type(message) == bytes else message.encode('utf-8')
             req = request.Request(url=url, data=binary_data, headers=headers, method=method)
-            resp = request.urlopen(req)
+            resp = request.urlopen(req, timeout=timeout)
             self.logger.info('{}'.format(resp.getheaders()))
             self.logger.info('{}'.format(resp.read()))
         except:
@@ -0,0 +1,135 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import time
+import threading
+from verbacratis.models import GenericLogger
+
+
+# How often (in seconds) blocking operations wake up to check if the build was cancelled or the deadline passed
+DEFAULT_POLL_INTERVAL = 0.2
+
+
+class BuildContext:
+    """Carries the deadline and cancellation state of a build to every blocking operation
+
+    A single instance is created per build (see the `--timeout` command line option) and passed to the functions that
+    may block, for example shell commands, Git clones and HTTP requests. Those functions check the context before and
+    while they wait, and stop their work once the build is cancelled or the deadline passed.
+
+    Functions accept the context as an optional `build_context` parameter. When it is None, they run without a deadline
+    and cannot be cancelled.
+
+    Sub-processes started on behalf of the build can be registered with :meth:`register_cleanup` so that they are
+    terminated as soon as :meth:`cancel` is called.
+
+    Attributes:
+        deadline: The `time.monotonic()` value after which the build is considered timed out, or None for no deadline
+        cancel_reason: The reason supplied to :meth:`cancel`, if the build was cancelled
+        remote_refs: The references of each remote Git repository listed during the build (see
+            :func:`verbacratis.utils.git_integration.get_git_remote_refs`)
+    """
+
+    def __init__(self, timeout: float=None, logger: GenericLogger=GenericLogger()):
+        """Create a context with an optional timeout (in seconds) from now"""
+        self.logger = logger
+        self.deadline = None
+        if timeout is not None:
+            if timeout <= 0:
+                raise Exception('Build timeout must be a positive number of seconds')
+            self.deadline = time.monotonic() + timeout
+        self.cancel_reason = None
+        self._cancel_event = threading.Event()
+        self._cleanup_functions = dict()
+        self._cleanup_lock = threading.Lock()
+        self.remote_refs = dict()
+        self.remote_refs_lock = threading.Lock()
+
+    def cancel(self, reason: str='Build cancelled'):
+        """Cancel the build and run all registered cleanup functions"""
+        if self._cancel_event.is_set() is False:
+            self.cancel_reason = reason
+            self._cancel_event.set()
+            self.logger.warn('Build cancelled: {}'.format(reason))
+        with self._cleanup_lock:
+            cleanup_functions = list(self._cleanup_functions.values())
+            self._cleanup_functions = dict()
+        for cleanup_function in cleanup_functions:
+            try:
+                cleanup_function()
+            except Exception as e:  # pragma: no cover
+                self.logger.error('Cleanup after cancellation failed: {}'.format(e))
+
+    def clear_remote_refs(self):
+        """Forget the remote Git references listed so far, so that they are listed again when next required"""
+        with self.remote_refs_lock:
+            self.remote_refs = dict()
+
+    def is_deadline_exceeded(self)->bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def is_cancelled(self)->bool:
+        """Returns True if the build was cancelled or if the deadline passed"""
+        if self._cancel_event.is_set():
+            return True
+        if self.is_deadline_exceeded():
+            self.cancel(reason='Build deadline exceeded')
+            return True
+        return False
+
+    def check(self):
+        """Raise an exception if the build was cancelled or the deadline passed
+
+        Raises:
+            Exception: If the build should not continue
+        """
+        if self.is_cancelled():
+            raise Exception('Build stopped: {}'.format(self.cancel_reason))
+
+    def get_remaining_time(self, default: float=None)->float:
+        """Get the seconds left before the deadline
+
+        Args:
+          default: The value to return when there is no deadline
+
+        Returns:
+            The number of seconds left, which is 0 if the deadline passed
+        """
+        if self.deadline is None:
+            return default
+        return max(0.0, self.deadline - time.monotonic())
+
+    def get_wait_interval(self, poll_interval: float=DEFAULT_POLL_INTERVAL)->float:
+        """Get the time to wait for before checking the context again, never waiting past the deadline"""
+        remaining = self.get_remaining_time(default=poll_interval)
+        return min(poll_interval, remaining)
+
+    def wait(self, seconds: float)->bool:
+        """Sleep for up to `seconds`, waking up early when the build is cancelled
+
+        Returns:
+            True if the build was cancelled (or the deadline passed) while waiting
+        """
+        self._cancel_event.wait(timeout=min(seconds, self.get_remaining_time(default=seconds)))
+        return self.is_cancelled()
+
+    def register_cleanup(self, key: object, cleanup_function: object):
+        """Register a function that will be called when the build is cancelled
+
+        If the build is already cancelled, the cleanup function is called immediately.
+        """
+        with self._cleanup_lock:
+            if self._cancel_event.is_set() is False:
+                self._cleanup_functions[key] = cleanup_function
+                return
+        cleanup_function()
+
+    def unregister_cleanup(self, key: object):
+        with self._cleanup_lock:
+            if key in self._cleanup_functions:
+                self._cleanup_functions.pop(key)
@@ -62,7 +62,59 @@ def _get_arg_parser(
         metavar='ENVIRONMENT_NAME',
         type=str, 
         default=default_environment,
-        help='The environment name to target'
+        help='The environment name to target. Supply more than one name to plan for several environments at once'
+    )
+    parser.add_argument(
+        '--timeout',
+        action='store',
+        dest='timeout',
+        metavar='SECONDS',
+        type=float,
+        default=None,
+        help='Stop the build, including any running commands, clones and downloads, after this many seconds'
+    )
+    parser.add_argument(
+        '--read-git-objects',
+        action='store_true',
+        dest='read_git_objects',
+        default=False,
+        help='Read manifest files of Git locations directly from the Git objects, instead of checking out a working tree'
+    )
+    parser.add_argument(
+        '--compile',
+        action='store',
+        dest='compile_bundle_file',
+        metavar='BUNDLE_FILE',
+        type=str,
+        default=None,
+        help='Compile the system and project manifests into a bundle file, and exit'
+    )
+    parser.add_argument(
+        '--bundle',
+        action='store',
+        dest='bundle_file',
+        metavar='BUNDLE_FILE',
+        type=str,
+        default=None,
+        help='Load the system and project manifests from a bundle file created with --compile. The locations are only loaded when the bundle was compiled from other locations'
+    )
+    parser.add_argument(
+        '--export',
+        action='store',
+        dest='export_file',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='Write the effective system configurations of the targeted environments, and the projects, to this file after they were loaded, for example for an audit trail'
+    )
+    parser.add_argument(
+        '--export-format',
+        action='store',
+        dest='export_format',
+        type=str,
+        choices=['yaml', 'json'],
+        default='yaml',
+        help='The format of the --export file'
     )
     logger.info('Returning CLI Argument Parser')
     return parser
@@ -146,9 +198,38 @@ def parse_command_line_arguments(
         sys.exit(2)
     state.project_manifest_locations = args['project_manifest_locations']
 
-    # Add environment target to state
+    # Add environment targets to state - the first environment remains the primary target
     if parsed_args.environment is not None:
-        state.environment =  parsed_args.environment[0]
+        environments = parsed_args.environment
+        if isinstance(environments, list) is False:
+            environments = [environments,]
+        if len(environments) > 0:
+            state.environments = list()
+            for environment in environments:
+                if environment not in state.environments:
+                    state.environments.append(environment)
+            state.environment = state.environments[0]
+
+    # Bound the run time of the build
+    if parsed_args.timeout is not None:
+        if parsed_args.timeout <= 0:
+            state.logger.error('CRITICAL: The timeout must be a positive number of seconds')
+            parser.print_usage()
+            sys.exit(2)
+        state.set_build_timeout(timeout=parsed_args.timeout)
+
+    state.read_git_objects = parsed_args.read_git_objects
+
+    # Manifest bundles
+    if parsed_args.compile_bundle_file is not None:
+        state.compile_bundle_file = expand_to_full_path(original_path=parsed_args.compile_bundle_file)
+    if parsed_args.bundle_file is not None:
+        state.bundle_file = expand_to_full_path(original_path=parsed_args.bundle_file)
+
+    # Export of the effective configuration
+    if parsed_args.export_file is not None:
+        state.export_file = expand_to_full_path(original_path=parsed_args.export_file)
+    state.export_format = parsed_args.export_format
 
     for k,v in overrides.items():
         args[k] = v
@@ -10,19 +10,42 @@ import traceback
 import os
 import shutil
 import tempfile
+import fcntl
+import time
 from pathlib import Path
 import re
 from verbacratis.models import DEFAULT_CONFIG_DIR
 import hashlib
 
 
+CHECKSUM_CHUNK_SIZE_BYTES = 1024 * 1024
+LOCK_POLL_INTERVAL = 0.1
+
+
 class PathTypes:
     DIRECTORY = 1
     FILE = 2
     UNKNOWN = None
 
 
+class SnapshotMethod:
+    REFLINK = 'reflink'
+    HARDLINK = 'hardlink'
+    COPY = 'copy'
+
+
 def get_file_contents(file: str)->str:
+    """Read a text file
+
+    The file is decoded with the encoding `open()` uses by default (the preferred encoding of the locale), whatever the
+    size of the file.
+
+    Args:
+        file: The path to the file
+
+    Returns:
+        The file content as a string, with universal newlines
+    """
     content = ""
     with open(file, 'r') as f:
         content = f.read()
@@ -108,6 +131,53 @@ def copy_file(source_file: str, file_name: str, tmp_dir: str=None)->str:
     return target_file
 
 
+def _reflink_file(source_file: str, target_file: str):
+    FICLONE = 0x40049409    # Linux ioctl to share the data blocks of a file on copy-on-write file systems (Btrfs, XFS)
+    with open(source_file, 'rb') as fr:
+        with open(target_file, 'wb') as fw:
+            try:
+                fcntl.ioctl(fw.fileno(), FICLONE, fr.fileno())
+            except:
+                fw.close()
+                os.remove(target_file)
+                raise
+
+
+def snapshot_file(source_file: str, target_file: str)->str:
+    """Create a snapshot of a file without copying its data where the file system allows it
+
+    The cheapest available method is used, in this order:
+
+    * A reflink (copy-on-write clone), which is a true snapshot that costs no data I/O
+    * A hard link, which costs no data I/O, but shares the file with the source. Tools that replace files (editors, Git)
+      break the link, so the snapshot keeps the old content, but a file modified in place changes in both places
+    * A normal copy, for example when the target is on another file system
+
+    An existing target file is replaced.
+
+    Args:
+        source_file: The file to snapshot
+        target_file: The path of the snapshot
+
+    Returns:
+        The :class:`SnapshotMethod` that was used
+    """
+    if os.path.lexists(target_file):
+        os.remove(target_file)
+    try:
+        _reflink_file(source_file=source_file, target_file=target_file)
+        return SnapshotMethod.REFLINK
+    except:
+        pass
+    try:
+        os.link(source_file, target_file)
+        return SnapshotMethod.HARDLINK
+    except:
+        pass
+    shutil.copyfile(source_file, target_file)
+    return SnapshotMethod.COPY
+
+
 def get_directory_from_path(input_path: str)->str:
     """Returns the directory portion of a path
     
@@ -197,8 +267,66 @@ def init_application_dir(dir: str=DEFAULT_CONFIG_DIR)->str:
     os.makedirs(dir, exist_ok=True)
 
 
-def file_checksum(path: str)->str:
-    checksum = None
-    with open(path, 'r') as f:
-        checksum = hashlib.sha256(open(path,'rb').read()).hexdigest()
-    return checksum
+def file_checksum(path: str, chunk_size: int=CHECKSUM_CHUNK_SIZE_BYTES)->str:
+    """Calculate the SHA256 checksum of a file
+
+    The file is hashed in chunks, so memory use does not grow with the file size.
+
+    Args:
+        path: The path to the file
+        chunk_size: The number of bytes read at a time
+
+    Returns:
+        The hex digest of the SHA256 checksum
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        chunk = f.read(chunk_size)
+        while len(chunk) > 0:
+            h.update(chunk)
+            chunk = f.read(chunk_size)
+    return h.hexdigest()
+
+
+def acquire_file_lock(lock_file_path: str, build_context: object=None):
+    """Take an exclusive `flock()` on a lock file, waiting until it is released by other processes and threads
+
+    The wait is bounded by the deadline and cancellation of the build context, if one is given (see
+    :class:`verbacratis.utils.build_context.BuildContext`).
+
+    Args:
+        lock_file_path: The path of the lock file, which is created if required
+        build_context: Optional deadline/cancel context
+
+    Returns:
+        The open lock file, to pass to :func:`release_file_lock`
+
+    Raises:
+        Exception: If the build is stopped while waiting for the lock
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(lock_file_path)), exist_ok=True)
+    lock_file = open(lock_file_path, 'w')
+    while True:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            pass
+        except:
+            lock_file.close()
+            raise
+        if build_context is not None:
+            try:
+                build_context.check()
+            except:
+                lock_file.close()
+                raise
+            build_context.wait(seconds=LOCK_POLL_INTERVAL)
+        else:
+            time.sleep(LOCK_POLL_INTERVAL)
+
+
+def release_file_lock(lock_file):
+    """Release a lock taken with :func:`acquire_file_lock`"""
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    lock_file.close()
@@ -9,7 +9,9 @@
 
 import traceback
 import ast
+import threading
 from verbacratis.utils import get_logger
+from verbacratis.utils.build_context import BuildContext
 
 
 def _get_function_parameters(
@@ -50,11 +52,32 @@ def _extract_function_parameters(value: str, logger=get_logger())->dict:
         return parameters
 
 
+def _run_function_in_thread(function: object, parameters: dict, build_context: BuildContext, logger=get_logger()):
+    # A running Python function cannot be stopped from the outside, therefore it runs in a daemon thread that is
+    # abandoned (and will not keep the process alive) when the build is cancelled.
+    outcome = dict()
+    def runner():
+        try:
+            outcome['result'] = function(**parameters)
+        except:
+            logger.error('EXCEPTION: {}'.format(traceback.format_exc()))
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    while thread.is_alive():
+        thread.join(timeout=build_context.get_wait_interval())
+        if thread.is_alive() and build_context.is_cancelled():
+            raise Exception('Function stopped: {}'.format(build_context.cancel_reason))
+    if 'result' in outcome:
+        return outcome['result']
+    return ''
+
+
 def execute_function(
     function_template: str,                     # Comes from Variable.value
     function_fixed_parameters: dict=dict(),
     logger=get_logger(),
-    registered_functions: dict=dict()
+    registered_functions: dict=dict(),
+    build_context: BuildContext=None
 ):
     function_exec_result = ''
     if '(' in function_template:
@@ -71,11 +94,16 @@ def execute_function(
             registered_functions=registered_functions
         )
         logger.debug('parameters={}'.format(parameters))
-        try:
-            function_exec_result = registered_functions[function_name]['f'](**parameters)
+        if build_context is not None:
+            build_context.check()
+            function_exec_result = _run_function_in_thread(function=registered_functions[function_name]['f'], parameters=parameters, build_context=build_context, logger=logger)
             logger.debug('EXEC RESULT :: function_exec_result={}'.format(function_exec_result))
-        except:
-            logger.error('EXCEPTION: {}'.format(traceback.format_exc()))
+        else:
+            try:
+                function_exec_result = registered_functions[function_name]['f'](**parameters)
+                logger.debug('EXEC RESULT :: function_exec_result={}'.format(function_exec_result))
+            except:
+                logger.error('EXCEPTION: {}'.format(traceback.format_exc()))
     else:
         raise Exception('Value does not appear to contain a function call')
     logger.debug('function_exec_result={}'.format(function_exec_result))
@@ -7,15 +7,22 @@
 """
 
 import os
+import re
+import subprocess
 import traceback
-from git import Repo
 from git import cmd as git_cmd
+from git.exc import GitCommandError
 import random, string
 from urllib.parse import urlparse
 import urllib
 from verbacratis.utils.file_io import create_tmp_dir, find_matching_files
+from verbacratis.utils.os_integration import run_process
+from verbacratis.utils.build_context import BuildContext
 
 
+DEFAULT_CLONE_DEPTH = 1
+DEFAULT_PARTIAL_CLONE_FILTER = 'blob:none'
+
 
 def random_word(length: int=16):
     letters = '{}{}{}'.format(
@@ -56,27 +63,113 @@ def extract_parameters_from_url(
     )
 
 
+def get_git_environment(ssh_private_key_path: str=None, set_no_verify_ssl: bool=False)->dict:
+    env = dict(os.environ)
+    if ssh_private_key_path is not None:
+        env['GIT_SSH_COMMAND'] = 'ssh -i {}'.format(ssh_private_key_path)
+    elif set_no_verify_ssl is True:
+        env['GIT_SSL_NO_VERIFY'] = '1'
+    return env
+
+
+def git_fetch_and_reset(
+    repository_dir: str,
+    branch: str='main',
+    ssh_private_key_path: str=None,
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    depth: int=DEFAULT_CLONE_DEPTH
+)->bool:
+    """Update an existing clone to the latest commit of a branch on the remote named `origin`
+
+    Only changed files in the working tree are rewritten, so the file modification times of unchanged files are kept.
+
+    Args:
+        repository_dir: The directory of an existing clone
+        branch: String containing the branch name. Default is `main`
+        ssh_private_key_path: A string containing the SSH private key to use. Optional, and if value is `None`, the default transport (HTTPS) will be used.
+        set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`)
+        build_context: Optional deadline/cancel context
+        depth: Only fetch this many commits of history. Use `None` to fetch the full history
+
+    Returns:
+        True if the checked out commit changed, otherwise False
+
+    Raises:
+        Exception: In the event of an error
+    """
+    env = get_git_environment(ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl)
+    previous_head = get_git_head_commit(repository_dir=repository_dir)
+    fetch_args = ['git', '-C', repository_dir, 'fetch', '--quiet']
+    if depth is not None:
+        fetch_args += ['--depth', '{}'.format(depth)]
+    for args in (
+        fetch_args + ['origin', branch],
+        ['git', '-C', repository_dir, 'reset', '--quiet', '--hard', 'FETCH_HEAD'],
+        ['git', '-C', repository_dir, 'clean', '--quiet', '-fdx'],
+    ):
+        return_code, stdout_data, stderr_data = run_process(args=args, build_context=build_context, env=env)
+        if return_code != 0:
+            raise Exception('Git command "{}" failed in "{}": {}'.format(args[3], repository_dir, stderr_data.decode('utf-8').strip()))
+    return get_git_head_commit(repository_dir=repository_dir) != previous_head
+
+
+def get_git_head_commit(repository_dir: str, revision: str='HEAD')->str:
+    return_code, stdout_data, stderr_data = run_process(args=['git', '-C', repository_dir, 'rev-parse', '{}^{{commit}}'.format(revision)])
+    if return_code != 0:
+        return None
+    return stdout_data.decode('utf-8').strip()
+
+
+def get_sparse_checkout_directory(relative_start_directory: str)->str:
+    """Convert a relative start directory to a sparse checkout directory, or None if the whole tree is required"""
+    if relative_start_directory is None:
+        return None
+    directory = relative_start_directory.strip(os.sep)
+    if len(directory) == 0:
+        return None
+    return directory
+
+
 def git_clone_to_local(
     git_clone_url: str,
     branch: str='main',
     target_dir: str=None,
     ssh_private_key_path: str=None,
-    set_no_verify_ssl: bool=False
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    depth: int=DEFAULT_CLONE_DEPTH,
+    partial_clone_filter: str=DEFAULT_PARTIAL_CLONE_FILTER,
+    sparse_checkout_directory: str=None,
+    shared: bool=False
 )->str:
     """Clone a Git repository, and check out a branch
 
+    By default only the tip of the branch is cloned (`depth`), and file contents are only downloaded for files that are
+    checked out (`partial_clone_filter`). When `sparse_checkout_directory` is set, only that directory (and the files in
+    the root of the repository) is checked out.
+
+    Servers that do not support partial clones ignore the filter, and local paths (not `file://` URLs) ignore the depth
+    and filter, since Git then copies or links the object files directly.
+
     Args:
         git_clone_url: A string containing the Git repository clone URL, for example `git@github.com:nicc777/verba-cratis-test-infrastructure.git`
         branch: String containing the branch name to check out. Default is `main`
         target_dir: A string containing the target directory. Default is `None` in which case a random temporary directory will be created and returned
         ssh_private_key_path: A string containing the SSH private key to use. Optional, and if value is `None`, the default transport (HTTPS) will be used.
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
+        depth: Only clone this many commits of history. Use `None` for the full history
+        partial_clone_filter: A `git clone --filter` specification. Use `None` to download all objects
+        sparse_checkout_directory: A directory, relative to the root of the repository, to limit the checkout to. Use `None` to check out the whole tree
+        shared: For a local repository, borrow its objects (`git clone --shared`) instead of copying them
 
     Returns:
         A string to the location of the cloned repository.
 
     Raises:
-        Exception: In the event of an error
+        GitCommandError: When the clone or the sparse checkout fails. The `stderr` of the exception contains the Git output
+        Exception: In the event of any other error
     """
 
     if '%00' in git_clone_url:
@@ -85,13 +178,26 @@ def git_clone_to_local(
     if target_dir is None:
         target_dir = create_tmp_dir(sub_dir=random_word())
 
-    if ssh_private_key_path is not None:
-        git_ssh_cmd = 'ssh -i {}'.format(ssh_private_key_path)
-        Repo.clone_from(url=git_clone_url, to_path=target_dir, env=dict(GIT_SSH_COMMAND=git_ssh_cmd), branch=branch)
-    elif set_no_verify_ssl is True:
-        Repo.clone_from(url=git_clone_url, to_path=target_dir, env=dict(GIT_SSL_NO_VERIFY='1'), branch=branch)
-    else:
-        Repo.clone_from(git_clone_url, target_dir, branch=branch)
+    env = get_git_environment(ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl)
+    args = ['git', 'clone', '--quiet', '--single-branch', '--branch', branch]
+    if depth is not None:
+        args += ['--depth', '{}'.format(depth)]
+    if partial_clone_filter is not None:
+        args += ['--filter', partial_clone_filter]
+    if sparse_checkout_directory is not None:
+        args.append('--sparse')
+    if shared is True:
+        args.append('--shared')
+    args += ['--', git_clone_url, target_dir]
+    return_code, stdout_data, stderr_data = run_process(args=args, build_context=build_context, env=env)
+    if return_code != 0:
+        raise GitCommandError(args, return_code, stderr_data.decode('utf-8').strip())
+
+    if sparse_checkout_directory is not None:
+        args = ['git', '-C', target_dir, 'sparse-checkout', 'set', '--', sparse_checkout_directory]
+        return_code, stdout_data, stderr_data = run_process(args=args, build_context=build_context, env=env)
+        if return_code != 0:
+            raise GitCommandError(args, return_code, stderr_data.decode('utf-8').strip())
 
     return target_dir
 
@@ -103,7 +209,11 @@ def git_clone_checkout_and_return_list_of_files(
     include_files_regex: str='.*\.yaml$|.*\.yml$',
     target_dir: str='/tmp',
     ssh_private_key_path: str=None,
-    set_no_verify_ssl: bool=False
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    depth: int=DEFAULT_CLONE_DEPTH,
+    partial_clone_filter: str=DEFAULT_PARTIAL_CLONE_FILTER,
+    git_mirror_cache: object=None
 )->list:
     """Parse files from a Git repository matching a file pattern withing a branch and directory to return a SystemConfigurations instance
 
@@ -115,6 +225,12 @@ def git_clone_checkout_and_return_list_of_files(
         target_dir: A string containing the target directory for cloning the repository. Default is `None` in which case a random temporary directory will be created and returned
         ssh_private_key_path: A string containing the SSH private key to use. Optional, and if value is `None`, the default transport (HTTPS) will be used.
         set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
+        depth: Only clone this many commits of history. Use `None` for the full history
+        partial_clone_filter: A `git clone --filter` specification. Use `None` to download all objects
+        git_mirror_cache: Optional :class:`verbacratis.utils.git_mirror_cache.GitMirrorCache`. If set, the repository is checked out from a local mirror, and `depth` and `partial_clone_filter` are not used
+
+    Only `relative_start_directory` is checked out (see :func:`git_clone_to_local`).
 
     Returns:
         A list of matching files
@@ -122,13 +238,28 @@ def git_clone_checkout_and_return_list_of_files(
     Raises:
         Exception: In the event of an error
     """
-    target_directory = git_clone_to_local(
-        git_clone_url=git_clone_url,
-        branch=branch,
-        target_dir=target_dir,
-        ssh_private_key_path=ssh_private_key_path,
-        set_no_verify_ssl=set_no_verify_ssl
-    )
+    if git_mirror_cache is not None:
+        target_directory = git_mirror_cache.checkout(
+            url=git_clone_url,
+            branch=branch,
+            target_dir=target_dir,
+            ssh_private_key_path=ssh_private_key_path,
+            set_no_verify_ssl=set_no_verify_ssl,
+            build_context=build_context,
+            sparse_checkout_directory=get_sparse_checkout_directory(relative_start_directory=relative_start_directory)
+        )
+    else:
+        target_directory = git_clone_to_local(
+            git_clone_url=git_clone_url,
+            branch=branch,
+            target_dir=target_dir,
+            ssh_private_key_path=ssh_private_key_path,
+            set_no_verify_ssl=set_no_verify_ssl,
+            build_context=build_context,
+            depth=depth,
+            partial_clone_filter=partial_clone_filter,
+            sparse_checkout_directory=get_sparse_checkout_directory(relative_start_directory=relative_start_directory)
+        )
     start_dir = target_directory
     if len(relative_start_directory) > 0:
         if relative_start_directory.startswith(os.sep):
@@ -145,15 +276,206 @@ def git_clone_checkout_and_return_list_of_files(
     return find_matching_files(start_dir=start_dir, pattern=include_files_regex)
 
 
-def is_url_a_git_repo(url: str)->bool:
+def git_fetch_tree(
+    git_clone_url: str,
+    branch: str='main',
+    target_dir: str=None,
+    ssh_private_key_path: str=None,
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    git_mirror_cache: object=None
+)->tuple:
+    """Make the objects of the tip of a branch available locally, without checking out a working tree
+
+    With a :class:`verbacratis.utils.git_mirror_cache.GitMirrorCache`, the shared mirror is updated and used directly.
+    Otherwise, a shallow bare clone is created in `target_dir`.
+
+    Returns:
+        A tuple with the path of the (bare) repository and the revision of the branch tip in it
+
+    Raises:
+        GitCommandError: When the clone fails. The `stderr` of the exception contains the Git output
+        Exception: In the event of any other error
+    """
+    if '%00' in git_clone_url:
+        git_clone_url = git_clone_url[0:git_clone_url.find('%00')]
+    if git_mirror_cache is not None:
+        repository_dir = git_mirror_cache.update(
+            url=git_clone_url,
+            branch=branch,
+            ssh_private_key_path=ssh_private_key_path,
+            set_no_verify_ssl=set_no_verify_ssl,
+            build_context=build_context
+        )
+        return (repository_dir, 'refs/heads/{}'.format(branch))
+    if target_dir is None:
+        target_dir = create_tmp_dir(sub_dir=random_word())
+    args = ['git', 'clone', '--quiet', '--bare', '--depth', '1', '--single-branch', '--branch', branch, '--', git_clone_url, target_dir]
+    return_code, stdout_data, stderr_data = run_process(
+        args=args,
+        build_context=build_context,
+        env=get_git_environment(ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl)
+    )
+    if return_code != 0:
+        raise GitCommandError(args, return_code, stderr_data.decode('utf-8').strip())
+    return (target_dir, 'HEAD')
+
+
+def list_git_tree_files(
+    repository_dir: str,
+    revision: str='HEAD',
+    relative_start_directory: str='/',
+    include_files_regex: str='.*\.yaml$|.*\.yml$',
+    build_context: BuildContext=None
+)->list:
+    """List the files in the tree of a commit, in the same way :func:`verbacratis.utils.file_io.find_matching_files` lists files in a directory
+
+    Args:
+        repository_dir: A (bare) Git repository
+        revision: The commit, branch or tag to read the tree of
+        relative_start_directory: Only list files in this directory
+        include_files_regex: A regular expression the file name (without directories) must match
+        build_context: Optional deadline/cancel context
+
+    Returns:
+        A list of `(path, blob_sha)` tuples, sorted by path
+
+    Raises:
+        Exception: In the event of an error
+    """
+    args = ['git', '-C', repository_dir, 'ls-tree', '-r', '-z', revision]
+    start_directory = get_sparse_checkout_directory(relative_start_directory=relative_start_directory)
+    if start_directory is not None:
+        args += ['--', '{}/'.format(start_directory)]
+    return_code, stdout_data, stderr_data = run_process(args=args, build_context=build_context)
+    if return_code != 0:
+        raise Exception('Failed to read the tree of "{}" in "{}": {}'.format(revision, repository_dir, stderr_data.decode('utf-8').strip()))
+    regex = re.compile(include_files_regex)
+    files = list()
+    for entry in stdout_data.decode('utf-8').split('\x00'):
+        if len(entry) == 0:
+            continue
+        object_info, path = entry.split('\t', 1)
+        mode, object_type, object_sha = object_info.split(' ')
+        if object_type != 'blob':
+            continue
+        if regex.match(path.split('/')[-1]):
+            files.append((path, object_sha))
+    return sorted(files)
+
+
+def read_git_blobs(repository_dir: str, blob_shas, build_context: BuildContext=None):
+    """Read the contents of blobs from a single `git cat-file --batch` process, one blob at a time, without writing anything to disk
+
+    Each SHA is only requested once the previous blob was consumed, so `blob_shas` may be a generator and only one blob
+    is held in memory at a time. The process is started when the first SHA is requested.
+
+    Args:
+        repository_dir: A (bare) Git repository
+        blob_shas: An iterable of blob SHAs
+        build_context: Optional deadline/cancel context
+
+    Yields:
+        tuple: The blob SHA and the content (bytes) of the blob
+
+    Raises:
+        Exception: In the event of an error, or if a blob does not exist
+    """
+    process = None
+    try:
+        for blob_sha in blob_shas:
+            if build_context is not None:
+                build_context.check()
+            if process is None:
+                process = subprocess.Popen(
+                    ['git', '-C', repository_dir, 'cat-file', '--batch'],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    start_new_session=True
+                )
+                if build_context is not None:
+                    build_context.register_cleanup(key=process, cleanup_function=process.kill)
+            try:
+                process.stdin.write('{}\n'.format(blob_sha).encode('utf-8'))
+                process.stdin.flush()
+            except BrokenPipeError:
+                pass
+            header_line = process.stdout.readline()
+            if len(header_line) == 0:
+                if build_context is not None:
+                    build_context.check()
+                raise Exception('Failed to read objects from "{}": {}'.format(repository_dir, process.stderr.read().decode('utf-8').strip()))
+            header = header_line.decode('utf-8').strip().split(' ')
+            if len(header) != 3 or header[1] != 'blob':
+                raise Exception('Object "{}" is not a blob in "{}"'.format(blob_sha, repository_dir))
+            size = int(header[2])
+            content = process.stdout.read(size)
+            if len(content) != size or process.stdout.read(1) != b'\n':
+                raise Exception('Failed to read object "{}" from "{}"'.format(blob_sha, repository_dir))
+            yield blob_sha, content
+    finally:
+        if process is not None:
+            if build_context is not None:
+                build_context.unregister_cleanup(key=process)
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+
+def get_git_remote_refs(url: str, build_context: BuildContext=None, use_cache: bool=True)->dict:
+    """List the references of a remote repository with `git ls-remote`
+
+    With a build context, the result is kept in the context for the rest of the build, so that detecting a Git location
+    and resolving the commit of a branch costs a single round trip. A following build lists the references again (see
+    :meth:`verbacratis.utils.build_context.BuildContext.clear_remote_refs`).
+
+    Args:
+        url: The Git repository URL
+        build_context: Optional deadline/cancel context, which also keeps the result
+        use_cache: If False, always ask the remote repository, and update the kept result
+
+    Returns:
+        A dictionary with the commit SHA of each reference, for example `refs/heads/main`
+
+    Raises:
+        Exception: If the URL is not a reachable Git repository
+    """
+    if '%00' in url:
+        url = url[0:url.find('%00')]
+    if use_cache is True and build_context is not None:
+        with build_context.remote_refs_lock:
+            if url in build_context.remote_refs:
+                return build_context.remote_refs[url]
+    remote_refs = dict()
+    g = git_cmd.Git()
+    for ref in g.ls_remote(url).split('\n'):
+        hash_ref_list = ref.split('\t')
+        remote_refs[hash_ref_list[1]] = hash_ref_list[0]
+    if build_context is not None:
+        with build_context.remote_refs_lock:
+            build_context.remote_refs[url] = remote_refs
+    return remote_refs
+
+
+def get_git_remote_branch_commit(url: str, branch: str='main', build_context: BuildContext=None)->str:
+    """Get the commit SHA of a branch on a remote repository (see :func:`get_git_remote_refs`), or None if it could not be determined"""
+    try:
+        return get_git_remote_refs(url=url, build_context=build_context).get('refs/heads/{}'.format(branch))
+    except:
+        traceback.print_exc()
+    return None
+
+
+def is_url_a_git_repo(url: str, build_context: BuildContext=None)->bool:
     try:
-        if '%00' in url:
-            url = url[0:url.find('%00')]
-        remote_refs = {}
-        g = git_cmd.Git()
-        for ref in g.ls_remote(url).split('\n'):
-            hash_ref_list = ref.split('\t')
-            remote_refs[hash_ref_list[1]] = hash_ref_list[0]
+        remote_refs = get_git_remote_refs(url=url, build_context=build_context)
         if len(remote_refs) > 0:
             return True
     except:
@@ -0,0 +1,161 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import os
+import hashlib
+import shutil
+import threading
+from verbacratis.models import DEFAULT_CONFIG_DIR
+from verbacratis.utils import get_logger
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.os_integration import run_process
+from verbacratis.utils.file_io import acquire_file_lock, release_file_lock
+from verbacratis.utils.git_integration import get_git_environment, git_clone_to_local
+
+
+DEFAULT_GIT_MIRROR_CACHE_DIR = '{}{}cache{}git'.format(DEFAULT_CONFIG_DIR, os.sep, os.sep)
+
+
+class GitMirrorCache:
+    """A cache of bare Git mirrors, shared by all Git locations and builds on this machine
+
+    Each remote repository URL gets one bare repository in the cache directory. The first use clones it, and after that
+    only the requested branches are fetched. Working trees are then cloned from the local mirror with `--shared`, which
+    borrows the objects of the mirror instead of copying them, so a checkout costs no network traffic at all.
+
+    A mirror is only updated once per branch for each instance of this class, so the same repository used by both
+    system and project manifests is only fetched once per build. Call `clear_updated_branches()` before the next build.
+
+    Concurrent builds on the same machine are serialized per mirror with an exclusive `flock()` on a lock file next to
+    the mirror, which is also respected by other threads in this process.
+
+    Note:
+        Working trees cloned from a mirror depend on it, and break if the mirror is removed.
+
+    Attributes:
+        cache_dir: The directory holding the mirrors and lock files
+        updated_branches: The set of `(url, branch)` tuples already fetched by this instance
+    """
+
+    def __init__(self, cache_dir: str=DEFAULT_GIT_MIRROR_CACHE_DIR, logger=get_logger()):
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.updated_branches = set()
+        self._updated_branches_lock = threading.Lock()
+
+    def clear_updated_branches(self):
+        """Forget which branches were fetched, so that the next use of each branch fetches it again"""
+        with self._updated_branches_lock:
+            self.updated_branches = set()
+
+    def _strip_url(self, url: str)->str:
+        if '%00' in url:
+            url = url[0:url.find('%00')]
+        return url
+
+    def get_mirror_dir(self, url: str)->str:
+        return '{}{}{}.git'.format(self.cache_dir, os.sep, hashlib.sha256(self._strip_url(url=url).encode('utf-8')).hexdigest())
+
+    def _acquire_lock(self, url: str, build_context: BuildContext=None):
+        return acquire_file_lock(lock_file_path='{}.lock'.format(self.get_mirror_dir(url=url)), build_context=build_context)
+
+    def _release_lock(self, lock_file):
+        release_file_lock(lock_file=lock_file)
+
+    def _run_git(self, args: list, env: dict, build_context: BuildContext=None):
+        return_code, stdout_data, stderr_data = run_process(args=args, build_context=build_context, env=env)
+        if return_code != 0:
+            raise Exception('Git command "{}" failed: {}'.format(' '.join(args[3:5]), stderr_data.decode('utf-8').strip()))
+
+    def _update_mirror(self, url: str, branch: str, ssh_private_key_path: str=None, set_no_verify_ssl: bool=False, build_context: BuildContext=None):
+        url = self._strip_url(url=url)
+        with self._updated_branches_lock:
+            if (url, branch) in self.updated_branches:
+                return
+        mirror_dir = self.get_mirror_dir(url=url)
+        env = get_git_environment(ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl)
+        if os.path.isfile('{}{}HEAD'.format(mirror_dir, os.sep)) is False:
+            if os.path.exists(mirror_dir):
+                shutil.rmtree(mirror_dir)
+            self.logger.info('Creating Git mirror of "{}" in "{}"'.format(url, mirror_dir))
+            self._run_git(args=['git', 'init', '--quiet', '--bare', mirror_dir], env=env, build_context=build_context)
+            self._run_git(args=['git', '-C', mirror_dir, 'remote', 'add', 'origin', url], env=env, build_context=build_context)
+        self._run_git(
+            args=['git', '-C', mirror_dir, 'fetch', '--quiet', '--prune', 'origin', '+refs/heads/{}:refs/heads/{}'.format(branch, branch)],
+            env=env,
+            build_context=build_context
+        )
+        with self._updated_branches_lock:
+            self.updated_branches.add((url, branch))
+
+    def update(self, url: str, branch: str='main', ssh_private_key_path: str=None, set_no_verify_ssl: bool=False, build_context: BuildContext=None)->str:
+        """Bring the branch in the mirror of a repository up to date, creating the mirror if required
+
+        Args:
+            url: The Git repository clone URL
+            branch: The branch to fetch
+            ssh_private_key_path: A string containing the SSH private key to use
+            set_no_verify_ssl: A boolean that will not check SSL certificates if set to True
+            build_context: Optional deadline/cancel context
+
+        Returns:
+            The path of the bare mirror repository
+
+        Raises:
+            Exception: In the event of an error
+        """
+        lock_file = self._acquire_lock(url=url, build_context=build_context)
+        try:
+            self._update_mirror(url=url, branch=branch, ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl, build_context=build_context)
+        finally:
+            self._release_lock(lock_file=lock_file)
+        return self.get_mirror_dir(url=url)
+
+    def checkout(
+        self,
+        url: str,
+        branch: str='main',
+        target_dir: str=None,
+        ssh_private_key_path: str=None,
+        set_no_verify_ssl: bool=False,
+        build_context: BuildContext=None,
+        sparse_checkout_directory: str=None
+    )->str:
+        """Update the mirror of a repository and clone a working tree of a branch from it
+
+        Args:
+            url: The Git repository clone URL
+            branch: The branch to check out
+            target_dir: The directory for the working tree. If None, a temporary directory is created
+            ssh_private_key_path: A string containing the SSH private key to use
+            set_no_verify_ssl: A boolean that will not check SSL certificates if set to True
+            build_context: Optional deadline/cancel context
+            sparse_checkout_directory: A directory, relative to the root of the repository, to limit the checkout to
+
+        Returns:
+            The path of the working tree
+
+        Raises:
+            Exception: In the event of an error
+        """
+        lock_file = self._acquire_lock(url=url, build_context=build_context)
+        try:
+            self._update_mirror(url=url, branch=branch, ssh_private_key_path=ssh_private_key_path, set_no_verify_ssl=set_no_verify_ssl, build_context=build_context)
+            # The mirror is local, so the full history costs nothing, and it is borrowed through --shared
+            return git_clone_to_local(
+                git_clone_url=self.get_mirror_dir(url=url),
+                branch=branch,
+                target_dir=target_dir,
+                build_context=build_context,
+                depth=None,
+                partial_clone_filter=None,
+                sparse_checkout_directory=sparse_checkout_directory,
+                shared=True
+            )
+        finally:
+            self._release_lock(lock_file=lock_file)
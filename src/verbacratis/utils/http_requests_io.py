@@ -1,18 +1,233 @@
 """
     Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
 
-    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file 
-    called LICENSE), or alternatively view the license text at 
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
     https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
 """
 
 import os
+import json
 import requests
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from verbacratis.models import DEFAULT_CONFIG_DIR
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.file_io import snapshot_file
 
 
-def download_files(urls: list, target_dir: str='/tmp', set_no_verify_ssl: bool=False)->list:
+DEFAULT_MAX_PARALLEL_DOWNLOADS = 4
+DEFAULT_DOWNLOAD_TIMEOUT = 30.0
+DOWNLOAD_CHUNK_SIZE_BYTES = 64 * 1024
+DEFAULT_DOWNLOAD_CACHE_DIR = '{}{}cache{}http'.format(DEFAULT_CONFIG_DIR, os.sep, os.sep)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session()->requests.Session:
+    """A process wide session, so that connections to the same host are kept alive and reused
+
+    The connection pool allows `DEFAULT_MAX_PARALLEL_DOWNLOADS` connections per host, so concurrent downloads do not
+    have to wait for each other's connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DEFAULT_MAX_PARALLEL_DOWNLOADS, pool_maxsize=DEFAULT_MAX_PARALLEL_DOWNLOADS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def get_request_timeout(build_context: BuildContext=None)->float:
+    if build_context is not None:
+        build_context.check()
+        return build_context.get_remaining_time(default=DEFAULT_DOWNLOAD_TIMEOUT)
+    return DEFAULT_DOWNLOAD_TIMEOUT
+
+
+def stream_response_to_file(response: requests.Response, target_file: str, chunk_size: int=DOWNLOAD_CHUNK_SIZE_BYTES)->str:
+    """Write the body of a streamed response to a file, hashing it on the way
+
+    The body is written to a temporary file next to `target_file` that replaces it when complete, so readers never see a
+    partial file.
+
+    Returns:
+        The SHA256 checksum of the body
+    """
+    h = hashlib.sha256()
+    tmp_file = '{}.{}.part'.format(target_file, threading.get_ident())
+    try:
+        with open(tmp_file, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                h.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_file, target_file)
+    except:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    finally:
+        response.close()
+    return h.hexdigest()
+
+
+class DownloadCache:
+    """A disk cache of downloaded files, used to make conditional requests
+
+    For every URL the cache keeps the last downloaded body, together with its `ETag` and `Last-Modified` headers and
+    checksum. A following download sends `If-None-Match` and `If-Modified-Since`, and on `304 Not Modified` the cached
+    body is used without transferring it again.
+
+    Attributes:
+        cache_dir: The directory holding the cached files
+    """
+
+    def __init__(self, cache_dir: str=DEFAULT_DOWNLOAD_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _get_base_path(self, url: str)->str:
+        return '{}{}{}'.format(self.cache_dir, os.sep, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def get_body_file(self, url: str)->str:
+        return '{}.body'.format(self._get_base_path(url=url))
+
+    def get_metadata(self, url: str)->dict:
+        """The cached metadata of a URL, or an empty dictionary if nothing usable is cached"""
+        metadata_file = '{}.json'.format(self._get_base_path(url=url))
+        if os.path.isfile(metadata_file) is False or os.path.isfile(self.get_body_file(url=url)) is False:
+            return dict()
+        try:
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+            if metadata.get('url') == url:
+                return metadata
+        except:
+            pass
+        return dict()
+
+    def get_conditional_headers(self, url: str)->dict:
+        headers = dict()
+        metadata = self.get_metadata(url=url)
+        if 'etag' in metadata:
+            headers['If-None-Match'] = metadata['etag']
+        if 'last_modified' in metadata:
+            headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def store(self, url: str, source_file: str, response_headers: dict, checksum: str):
+        """Keep a snapshot of a downloaded file and the validators of the response"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        snapshot_file(source_file=source_file, target_file=self.get_body_file(url=url))
+        metadata = {'url': url, 'checksum': checksum}
+        if 'ETag' in response_headers:
+            metadata['etag'] = response_headers['ETag']
+        if 'Last-Modified' in response_headers:
+            metadata['last_modified'] = response_headers['Last-Modified']
+        metadata_file = '{}.json'.format(self._get_base_path(url=url))
+        tmp_metadata_file = '{}.{}.tmp'.format(metadata_file, threading.get_ident())
+        with open(tmp_metadata_file, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_metadata_file, metadata_file)
+
+
+def get_url_validator(url: str, set_no_verify_ssl: bool=False, build_context: BuildContext=None)->str:
+    """Get the `ETag` (or else the `Last-Modified` header) of a URL with a `HEAD` request, without transferring the body
+
+    Returns:
+        A string that changes when the content of the URL changes, or None if the server returns neither header
+
+    Raises:
+        Exception: If the request failed or the server returned an error status
+    """
+    response = get_http_session().head(url, allow_redirects=True, verify=not set_no_verify_ssl, timeout=get_request_timeout(build_context=build_context))
+    if response.status_code >= 400:
+        raise Exception('Failed to request "{}": HTTP status {}'.format(url, response.status_code))
+    if 'ETag' in response.headers:
+        return 'etag:{}'.format(response.headers['ETag'])
+    if 'Last-Modified' in response.headers:
+        return 'last-modified:{}'.format(response.headers['Last-Modified'])
+    return None
+
+
+def download_file(
+    url: str,
+    target_file: str,
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    download_cache: DownloadCache=None,
+    session: requests.Session=None
+)->bool:
+    """Download a single URL to a file, streaming the body to disk
+
+    Args:
+        url: The URL to download
+        target_file: The file to write
+        set_no_verify_ssl: A boolean that will not check SSL certificates if set to True
+        build_context: Optional deadline/cancel context. The request timeout is the remaining build time
+        download_cache: Optional :class:`DownloadCache` for conditional requests
+        session: The session to use. Default is the shared session from :func:`get_http_session`
+
+    Returns:
+        True if the body was transferred, or False if the cached body was still valid (`304 Not Modified`)
+
+    Raises:
+        Exception: If the request failed or the server returned an error status
+    """
+    if session is None:
+        session = get_http_session()
+    headers = dict()
+    if download_cache is not None:
+        headers = download_cache.get_conditional_headers(url=url)
+    response = session.get(url, headers=headers, verify=not set_no_verify_ssl, timeout=get_request_timeout(build_context=build_context), stream=True)
+    if response.status_code == 304 and download_cache is not None and len(headers) > 0:
+        response.close()
+        snapshot_file(source_file=download_cache.get_body_file(url=url), target_file=target_file)
+        return False
+    if response.status_code >= 400:
+        response.close()
+        raise Exception('Failed to download "{}": HTTP status {}'.format(url, response.status_code))
+    checksum = stream_response_to_file(response=response, target_file=target_file)
+    if download_cache is not None:
+        download_cache.store(url=url, source_file=target_file, response_headers=response.headers, checksum=checksum)
+    return True
+
+
+def download_files(
+    urls: list,
+    target_dir: str='/tmp',
+    set_no_verify_ssl: bool=False,
+    build_context: BuildContext=None,
+    max_parallel_downloads: int=DEFAULT_MAX_PARALLEL_DOWNLOADS,
+    download_cache: DownloadCache=None
+)->list:
+    """Download files concurrently over a pooled session
+
+    Each URL is saved in `target_dir` with the SHA256 hash of the URL as the file name. Duplicate URLs are only
+    downloaded once.
+
+    Args:
+        urls: The URLs to download
+        target_dir: The directory to save the files in
+        set_no_verify_ssl: A boolean that will not check SSL certificates if set to True (default=`False`). Useful when using self-signed certificates, but use with caution!!
+        build_context: Optional deadline/cancel context
+        max_parallel_downloads: The maximum number of concurrent downloads
+        download_cache: Optional :class:`DownloadCache` for conditional requests
+
+    Returns:
+        A list of the downloaded files, in the order of `urls`
+
+    Raises:
+        Exception: If any of the downloads failed
+    """
+    if build_context is not None:
+        build_context.check()
     files = list()
+    unique_urls = list()
     for url in urls:
         outfile = '{}{}{}'.format(
             target_dir,
@@ -20,14 +235,21 @@ def download_files(urls: list, target_dir: str='/tmp', set_no_verify_ssl: bool=F
             hashlib.sha256(url.encode('utf-8')).hexdigest()
         )
         if outfile not in files:
-            r = None
-            if set_no_verify_ssl is False:
-                r = requests.get(url)
-            else:
-                r = requests.get(url, verify=False)
-            if r is not None:
-                with open(outfile, 'w') as f:
-                    f.write(r.text)
-                    files.append(outfile)
+            files.append(outfile)
+            unique_urls.append(url)
+    if len(unique_urls) == 0:
+        return files
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_downloads, len(unique_urls)))) as pool:
+        futures = list()
+        for url, outfile in zip(unique_urls, files):
+            futures.append(pool.submit(
+                download_file,
+                url=url,
+                target_file=outfile,
+                set_no_verify_ssl=set_no_verify_ssl,
+                build_context=build_context,
+                download_cache=download_cache
+            ))
+        for future in futures:
+            future.result()
     return files
-
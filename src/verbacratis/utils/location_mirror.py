@@ -0,0 +1,349 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from verbacratis.models import DEFAULT_CONFIG_DIR
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.file_io import file_checksum, find_matching_files, snapshot_file, acquire_file_lock, release_file_lock
+from verbacratis.utils.git_integration import git_clone_to_local, git_fetch_and_reset, get_git_head_commit, get_sparse_checkout_directory
+from verbacratis.utils.http_requests_io import get_http_session, get_request_timeout, stream_response_to_file
+
+
+DEFAULT_MIRROR_ROOT = '{}{}{}'.format(DEFAULT_CONFIG_DIR, os.sep, 'mirrors')
+MIRROR_INDEX_VERSION = 2
+DEFAULT_MAX_PARALLEL_HASHES = 4
+PARALLEL_HASHING_THRESHOLD = 16
+
+
+class LocationMirror:
+    """A persistent local copy of a manifest location that is synchronized incrementally
+
+    Each location reference gets its own directory under the mirror root, containing the mirrored files and an
+    `index.json` file. The index records the size, modification time (in nanoseconds), inode and SHA256 checksum of
+    every file, which means a checksum is only recalculated when a file actually changed, and an unchanged file only
+    costs a `stat()`:
+
+    * Local files and directories are normally read in place and only have their checksums indexed here. When isolation
+      is required, a snapshot (reflink, hard link or copy) is only taken when the size or modification time of the source
+      changed
+    * Git repositories are cloned once, and after that updated with `git fetch`
+    * URLs are requested with `If-None-Match` and `If-Modified-Since`, and a `304 Not Modified` keeps the mirrored file
+
+    The mirror root is shared by all builds on this machine. Callers hold the lock of the mirror (see `acquire_lock()`)
+    from before a sync until the index is saved, so concurrent builds never update the same mirror at the same time.
+
+    Attributes:
+        reference: The location reference (and Git branch and start directory, if applicable) the mirror is keyed by
+        mirror_dir: The directory holding the index and mirrored files
+        files_dir: The directory holding the mirrored files
+        index: The index data
+    """
+
+    def __init__(self, reference: str, mirror_root: str=DEFAULT_MIRROR_ROOT):
+        self.reference = reference
+        self.mirror_dir = '{}{}{}'.format(mirror_root, os.sep, hashlib.sha256(reference.encode('utf-8')).hexdigest())
+        self.files_dir = '{}{}files'.format(self.mirror_dir, os.sep)
+        self.index_file = '{}{}index.json'.format(self.mirror_dir, os.sep)
+        self.lock_file_path = '{}.lock'.format(self.mirror_dir)
+        self.index = self._load_index()
+        self._used_files = set()
+        self._lock_file = None
+
+    def _get_empty_index(self)->dict:
+        return {
+            'version': MIRROR_INDEX_VERSION,
+            'reference': self.reference,
+            'files': dict(),
+            'metadata': dict(),
+        }
+
+    def _load_index(self)->dict:
+        if os.path.isfile(self.index_file) is False:
+            return self._get_empty_index()
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == MIRROR_INDEX_VERSION and index.get('reference') == self.reference:
+                return index
+        except:
+            pass
+        # A damaged or outdated index is discarded, which results in a cold start
+        return self._get_empty_index()
+
+    def acquire_lock(self, build_context: BuildContext=None):
+        """Take the exclusive lock of the mirror, shared with other processes and threads, and reload the index
+
+        The index is reloaded because another build may have updated the mirror while waiting for the lock. The lock
+        file is kept next to the mirror directory, so that removing the mirror does not remove the lock.
+
+        Raises:
+            Exception: If the build is stopped while waiting for the lock
+        """
+        self._lock_file = acquire_file_lock(lock_file_path=self.lock_file_path, build_context=build_context)
+        self.index = self._load_index()
+
+    def release_lock(self):
+        """Release the lock taken with `acquire_lock()`"""
+        if self._lock_file is not None:
+            release_file_lock(lock_file=self._lock_file)
+            self._lock_file = None
+
+    def _prepare_dirs(self):
+        os.makedirs(self.files_dir, exist_ok=True)
+
+    def _get_cached_checksum(self, index_key: str, stat: os.stat_result)->str:
+        entry = self.index['files'].get(index_key)
+        if entry is None:
+            return None
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns or entry['inode'] != stat.st_ino:
+            return None
+        return entry['checksum']
+
+    def _set_checksum(self, index_key: str, stat: os.stat_result, checksum: str):
+        self.index['files'][index_key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'inode': stat.st_ino,
+            'checksum': checksum,
+        }
+
+    def get_checksum(self, path: str)->str:
+        """Get the SHA256 checksum of a file, only reading the file if it changed since it was last hashed
+
+        The file may be a mirrored file or a local file that is read in place.
+        """
+        return self.get_checksums(paths=[path,])[0]
+
+    def get_checksums(self, paths: list, max_parallel_hashes: int=DEFAULT_MAX_PARALLEL_HASHES)->list:
+        """Get the SHA256 checksums of several files, only reading the files that changed since they were last hashed
+
+        When at least `PARALLEL_HASHING_THRESHOLD` files changed, they are hashed by a pool of threads (hashing releases
+        the GIL, so this uses several CPU cores and overlaps the file reads).
+
+        Args:
+            paths: The file paths
+            max_parallel_hashes: The maximum number of files hashed at the same time
+
+        Returns:
+            A list of checksums, in the order of `paths`
+        """
+        checksums = [None] * len(paths)
+        changed = list()
+        for idx, path in enumerate(paths):
+            index_key = os.path.abspath(path)
+            self._used_files.add(index_key)
+            stat = os.stat(path)
+            checksums[idx] = self._get_cached_checksum(index_key=index_key, stat=stat)
+            if checksums[idx] is None:
+                changed.append((idx, index_key, stat))
+        if len(changed) >= PARALLEL_HASHING_THRESHOLD and max_parallel_hashes > 1:
+            with ThreadPoolExecutor(max_workers=max_parallel_hashes) as pool:
+                new_checksums = list(pool.map(file_checksum, [paths[idx] for idx, index_key, stat in changed]))
+        else:
+            new_checksums = [file_checksum(path=paths[idx]) for idx, index_key, stat in changed]
+        for (idx, index_key, stat), checksum in zip(changed, new_checksums):
+            self._set_checksum(index_key=index_key, stat=stat, checksum=checksum)
+            checksums[idx] = checksum
+        return checksums
+
+    def sync_local_files(self, source_files: list, target_file_names: list)->list:
+        """Snapshot local files into the mirror, only for those whose size or modification time changed
+
+        See :func:`verbacratis.utils.file_io.snapshot_file` for how a snapshot is taken.
+
+        Args:
+            source_files: The source file paths
+            target_file_names: The file name of each source file in the mirror
+
+        Returns:
+            A list of mirrored file paths, in the order of `source_files`
+        """
+        self._prepare_dirs()
+        sources = self.index['metadata'].setdefault('sources', dict())
+        files = list()
+        for source_file, target_file_name in zip(source_files, target_file_names):
+            target_file = '{}{}{}'.format(self.files_dir, os.sep, target_file_name)
+            stat = os.stat(source_file)
+            source_state = [source_file, stat.st_size, stat.st_mtime_ns]
+            if sources.get(target_file_name) != source_state or os.path.isfile(target_file) is False:
+                snapshot_file(source_file=source_file, target_file=target_file)
+                sources[target_file_name] = source_state
+            files.append(target_file)
+        for target_file_name in list(sources.keys()):
+            if target_file_name not in target_file_names:
+                sources.pop(target_file_name)
+        return files
+
+    def sync_url(self, url: str, set_no_verify_ssl: bool=False, build_context: BuildContext=None)->list:
+        """Mirror a file from a URL using a conditional request
+
+        Returns:
+            A list with the mirrored file path
+        """
+        self._prepare_dirs()
+        target_file = '{}{}{}'.format(self.files_dir, os.sep, hashlib.sha256(url.encode('utf-8')).hexdigest())
+        headers = dict()
+        metadata = self.index['metadata']
+        if os.path.isfile(target_file) is True:
+            if 'etag' in metadata:
+                headers['If-None-Match'] = metadata['etag']
+            if 'last_modified' in metadata:
+                headers['If-Modified-Since'] = metadata['last_modified']
+        r = get_http_session().get(url, headers=headers, verify=not set_no_verify_ssl, timeout=get_request_timeout(build_context=build_context), stream=True)
+        if r.status_code == 304:
+            r.close()
+            return [target_file,]
+        if r.status_code >= 400:
+            r.close()
+            raise Exception('Failed to download "{}": HTTP status {}'.format(url, r.status_code))
+        stream_response_to_file(response=r, target_file=target_file)
+        metadata.pop('etag', None)
+        metadata.pop('last_modified', None)
+        if 'ETag' in r.headers:
+            metadata['etag'] = r.headers['ETag']
+        if 'Last-Modified' in r.headers:
+            metadata['last_modified'] = r.headers['Last-Modified']
+        return [target_file,]
+
+    def sync_git(
+        self,
+        git_clone_url: str,
+        branch: str='main',
+        relative_start_directory: str='/',
+        include_files_regex: str='.*\.yaml$|.*\.yml$',
+        ssh_private_key_path: str=None,
+        set_no_verify_ssl: bool=False,
+        build_context: BuildContext=None,
+        git_mirror_cache: object=None
+    )->list:
+        """Mirror a Git repository: clone it on the first sync, and fetch the branch on every following sync
+
+        The clone is shallow and partial, and only `relative_start_directory` is checked out (see
+        :func:`verbacratis.utils.git_integration.git_clone_to_local`).
+
+        With a :class:`verbacratis.utils.git_mirror_cache.GitMirrorCache`, the repository is rather cloned from, and
+        fetched from, the shared local mirror of the repository, after updating the mirror.
+
+        Returns:
+            A sorted list of the matching files in the mirrored working tree
+        """
+        repository_dir = '{}{}repository'.format(self.files_dir, os.sep)
+        sparse_checkout_directory = get_sparse_checkout_directory(relative_start_directory=relative_start_directory)
+        clone_source = git_clone_url
+        if git_mirror_cache is not None:
+            clone_source = git_mirror_cache.get_mirror_dir(url=git_clone_url)
+        if self.index['metadata'].get('sparse_checkout_directory') != sparse_checkout_directory or self.index['metadata'].get('clone_source', git_clone_url) != clone_source:
+            # The clone holds another start directory, or was cloned from another source
+            self.index['metadata'].pop('git_head', None)
+            if os.path.exists(repository_dir):
+                shutil.rmtree(repository_dir)
+        if os.path.isdir('{}{}.git'.format(repository_dir, os.sep)) is False:
+            if os.path.exists(repository_dir):
+                shutil.rmtree(repository_dir)
+            self._prepare_dirs()
+            if git_mirror_cache is not None:
+                git_mirror_cache.checkout(
+                    url=git_clone_url,
+                    branch=branch,
+                    target_dir=repository_dir,
+                    ssh_private_key_path=ssh_private_key_path,
+                    set_no_verify_ssl=set_no_verify_ssl,
+                    build_context=build_context,
+                    sparse_checkout_directory=sparse_checkout_directory
+                )
+            else:
+                git_clone_to_local(
+                    git_clone_url=git_clone_url,
+                    branch=branch,
+                    target_dir=repository_dir,
+                    ssh_private_key_path=ssh_private_key_path,
+                    set_no_verify_ssl=set_no_verify_ssl,
+                    build_context=build_context,
+                    sparse_checkout_directory=sparse_checkout_directory
+                )
+            self.index['metadata']['sparse_checkout_directory'] = sparse_checkout_directory
+            self.index['metadata']['clone_source'] = clone_source
+        elif git_mirror_cache is not None:
+            git_mirror_cache.update(
+                url=git_clone_url,
+                branch=branch,
+                ssh_private_key_path=ssh_private_key_path,
+                set_no_verify_ssl=set_no_verify_ssl,
+                build_context=build_context
+            )
+            git_fetch_and_reset(repository_dir=repository_dir, branch=branch, build_context=build_context, depth=None)
+        else:
+            git_fetch_and_reset(
+                repository_dir=repository_dir,
+                branch=branch,
+                ssh_private_key_path=ssh_private_key_path,
+                set_no_verify_ssl=set_no_verify_ssl,
+                build_context=build_context
+            )
+        self.index['metadata']['git_head'] = get_git_head_commit(repository_dir=repository_dir)
+        start_dir = repository_dir
+        if len(relative_start_directory.strip(os.sep)) > 0:
+            start_dir = '{}{}{}'.format(repository_dir, os.sep, relative_start_directory.strip(os.sep))
+        return sorted(find_matching_files(start_dir=start_dir, pattern=include_files_regex))
+
+    def save_index(self):
+        """Persist the index, dropping entries of files that were not used since the mirror was loaded
+
+        The index is written to a temporary file that then replaces the index, so a reader never sees a partial index.
+        """
+        for index_key in list(self.index['files'].keys()):
+            if index_key not in self._used_files:
+                self.index['files'].pop(index_key)
+        self._prepare_dirs()
+        tmp_index_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        with open(tmp_index_file, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_index_file, self.index_file)
+        self._used_files = set()
+
+    def remove_stale_files(self, files: list):
+        """Remove mirrored files (outside a Git working tree) that are not in `files`"""
+        keep = set([os.path.abspath(file) for file in files])
+        if os.path.isdir(self.files_dir) is False:
+            return
+        for file_name in os.listdir(self.files_dir):
+            path = '{}{}{}'.format(self.files_dir, os.sep, file_name)
+            if os.path.isfile(path) and os.path.abspath(path) not in keep:
+                os.remove(path)
+
+    def remove(self):
+        """Remove the mirror and its index from disk"""
+        if os.path.exists(self.mirror_dir):
+            shutil.rmtree(self.mirror_dir)
+        self.index = self._get_empty_index()
+        self._used_files = set()
+
+
+def get_local_files_fingerprint(reference: str, files: list, mirror_root: str=DEFAULT_MIRROR_ROOT)->str:
+    """A checksum of the paths and content of local files, for example to detect that a compiled bundle is stale
+
+    The checksums are kept in the index of a mirror of their own, keyed by `reference`, so after the first call a file
+    is only read again when its size, modification time or inode changed.
+
+    Raises:
+        Exception: If a file does not exist
+    """
+    mirror = LocationMirror(reference='fingerprint:{}'.format(reference), mirror_root=mirror_root)
+    h = hashlib.sha256()
+    mirror.acquire_lock()
+    try:
+        for path, checksum in zip(files, mirror.get_checksums(paths=files)):
+            h.update('{}:{}\n'.format(os.path.abspath(path), checksum).encode('utf-8'))
+        mirror.save_index()
+    finally:
+        mirror.release_lock()
+    return h.hexdigest()
@@ -0,0 +1,294 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from verbacratis.utils import get_logger
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
+from verbacratis.utils.git_integration import is_url_a_git_repo, extract_parameters_from_url, git_clone_checkout_and_return_list_of_files, git_fetch_tree, get_git_remote_branch_commit, get_git_head_commit, random_word
+from verbacratis.utils.http_requests_io import download_files, get_url_validator, DownloadCache
+from verbacratis.utils.location_mirror import get_local_files_fingerprint, DEFAULT_MIRROR_ROOT
+from verbacratis.utils.parser2 import iter_parsed_files, iter_parsed_git_tree_files, ParsedDocumentCache, ParsePool, DEFAULT_PARALLEL_PARSING_THRESHOLD
+
+
+DEFAULT_MAX_PARALLEL_FETCHES = 4
+
+
+class FetchedLocation:
+    """The local files of a manifest location given on the command line
+
+    Attributes:
+        location: The location as supplied (a local path, a file URL or a Git URL with optional parameters)
+        files: The local files to parse, in a stable (sorted) order
+        work_dir: The temporary directory holding downloaded or cloned files, or None for local files
+        git_tree: For a Git location read without a checkout, a dictionary with the `repository_dir`, `revision` and `relative_start_directory` to read the files from. Otherwise None
+        commit_cache_key: For a Git location, the parse cache key of all the parsed documents at the fetched commit. Otherwise None
+        from_cache: True for a Git location of which the commit was parsed before, so that the documents are read from the parse cache entry `commit_cache_key`
+    """
+
+    def __init__(self, location: str, files: list=list(), work_dir: str=None, git_tree: dict=None, commit_cache_key: str=None, from_cache: bool=False):
+        self.location = location
+        self.files = files
+        self.work_dir = work_dir
+        self.git_tree = git_tree
+        self.commit_cache_key = commit_cache_key
+        self.from_cache = from_cache
+
+    def _iter_parsed_documents(self, parse_cache: ParsedDocumentCache=None, build_context: BuildContext=None, logger=get_logger(), failed_files: list=None, parse_pool: ParsePool=None):
+        if self.git_tree is not None:
+            parsed_files = iter_parsed_git_tree_files(parse_cache=parse_cache, build_context=build_context, logger=logger, **self.git_tree)
+        else:
+            parsed_files = iter_parsed_files(files=self.files, parse_cache=parse_cache, logger=logger, parse_pool=parse_pool)
+        for file, documents in parsed_files:
+            try:
+                for data in documents:
+                    yield data
+            except Exception:
+                logger.error('Failed to parse "{}" from location "{}": {}'.format(file, self.location, traceback.format_exc()))
+                if failed_files is not None:
+                    failed_files.append(file)
+
+    def iter_documents(self, parse_cache: ParsedDocumentCache=None, build_context: BuildContext=None, logger=get_logger(), parse_pool: ParsePool=None):
+        """Yield the parsed YAML documents of the location one at a time, in file order
+
+        Local and downloaded files are read from disk, and the files of a Git location read without a checkout are
+        streamed from the Git objects, one blob at a time. Files that cannot be parsed are logged and skipped (documents
+        of such a file that were yielded before the error are not withdrawn). For a Git location, the documents of the
+        fetched commit are stored in the parse cache while they are yielded, and kept if all files could be parsed, so
+        that the next build can skip fetching and parsing when the branch did not move.
+
+        With a `parse_pool` (see :func:`get_parse_pool`), local and downloaded files are parsed in worker processes.
+        """
+        if self.from_cache is True:
+            for data in parse_cache.iter_documents(key=self.commit_cache_key):
+                yield data
+            return
+        failed_files = list()
+        documents = self._iter_parsed_documents(parse_cache=parse_cache, build_context=build_context, logger=logger, failed_files=failed_files, parse_pool=parse_pool)
+        if parse_cache is not None and self.commit_cache_key is not None:
+            documents = parse_cache.store_documents(key=self.commit_cache_key, documents=documents, is_complete=lambda: len(failed_files) == 0)
+        for data in documents:
+            yield data
+
+    def cleanup(self):
+        if self.work_dir is not None:
+            remove_tmp_dir_recursively(dir=self.work_dir)
+            self.work_dir = None
+
+
+def get_commit_cache_key(parse_cache: ParsedDocumentCache, git_clone_url: str, branch: str, relative_start_directory: str, commit: str)->str:
+    """The parse cache key of all the parsed configurations of a Git location at a commit"""
+    return parse_cache.get_key(content='git-commit:{}#{}:{}:{}'.format(git_clone_url, branch, relative_start_directory, commit))
+
+
+def get_location_fingerprint(location: str, mirror_root: str=DEFAULT_MIRROR_ROOT, build_context: BuildContext=None)->str:
+    """A value that changes when the content of a location changes, determined without fetching the location
+
+    Local files are only read when their size, modification time or inode changed, Git locations use the commit of the
+    branch on the remote (see `extract_parameters_from_url()`), and file URLs the `ETag` or `Last-Modified` header.
+
+    Returns:
+        The fingerprint, or None if it could not be determined
+    """
+    try:
+        if location.startswith('http') is False:
+            return get_local_files_fingerprint(reference=location, files=[location,], mirror_root=mirror_root)
+        if is_url_a_git_repo(url=location, build_context=build_context) is False:
+            return get_url_validator(url=location, build_context=build_context)
+        final_location, branch, relative_start_directory, ssh_private_key_path, set_no_verify_ssl = extract_parameters_from_url(location=location)
+        commit = get_git_remote_branch_commit(url=final_location, branch=branch, build_context=build_context)
+        if commit is not None:
+            return 'git:{}'.format(commit)
+    except:
+        traceback.print_exc()
+    return None
+
+
+def fetch_location(
+    location: str,
+    build_context: BuildContext=None,
+    git_mirror_cache: object=None,
+    read_git_objects: bool=False,
+    parse_cache: ParsedDocumentCache=None,
+    download_cache: DownloadCache=None
+)->FetchedLocation:
+    """Fetch a single manifest location to the local file system
+
+    For a Git location with a `parse_cache`, the commit of the branch is taken from the `git ls-remote` that identified
+    the location as a Git repository. If that commit was parsed before, the cached documents are used and nothing
+    is cloned.
+
+    Args:
+        location: A local file path, a URL to a file or a Git repository URL (see `extract_parameters_from_url()`)
+        build_context: Optional deadline/cancel context
+        git_mirror_cache: Optional :class:`verbacratis.utils.git_mirror_cache.GitMirrorCache` to check Git repositories out from
+        read_git_objects: If True, Git locations are not checked out, and the files are later read from the Git objects (see :attr:`FetchedLocation.git_tree`)
+        parse_cache: Optional :class:`verbacratis.utils.parser2.ParsedDocumentCache`
+        download_cache: Optional :class:`verbacratis.utils.http_requests_io.DownloadCache` for conditional downloads of file URLs
+
+    Returns:
+        A :class:`FetchedLocation`
+
+    Raises:
+        Exception: In the event of an error
+    """
+    if location.startswith('http') is False:
+        return FetchedLocation(location=location, files=[location,])
+    if is_url_a_git_repo(url=location, build_context=build_context) is False:
+        work_dir = create_tmp_dir(sub_dir=random_word(length=32))
+        try:
+            files = download_files(urls=[location,], target_dir=work_dir, build_context=build_context, download_cache=download_cache)
+        except:
+            remove_tmp_dir_recursively(dir=work_dir)
+            raise
+        return FetchedLocation(location=location, files=sorted(files), work_dir=work_dir)
+
+    final_location, branch, relative_start_directory, ssh_private_key_path, set_no_verify_ssl = extract_parameters_from_url(location=location)
+    if parse_cache is not None:
+        remote_commit = get_git_remote_branch_commit(url=final_location, branch=branch, build_context=build_context)
+        if remote_commit is not None:
+            commit_cache_key = get_commit_cache_key(parse_cache=parse_cache, git_clone_url=final_location, branch=branch, relative_start_directory=relative_start_directory, commit=remote_commit)
+            if parse_cache.has_entry(key=commit_cache_key) is True:
+                return FetchedLocation(location=location, files=list(), commit_cache_key=commit_cache_key, from_cache=True)
+    work_dir = create_tmp_dir(sub_dir=random_word(length=32))
+    try:
+        if read_git_objects is True:
+            repository_dir, revision = git_fetch_tree(
+                git_clone_url=final_location,
+                branch=branch,
+                target_dir=work_dir,
+                ssh_private_key_path=ssh_private_key_path,
+                set_no_verify_ssl=set_no_verify_ssl,
+                build_context=build_context,
+                git_mirror_cache=git_mirror_cache
+            )
+            git_tree = {
+                'repository_dir': repository_dir,
+                'revision': revision,
+                'relative_start_directory': relative_start_directory,
+            }
+            files = list()
+        else:
+            files = git_clone_checkout_and_return_list_of_files(
+                git_clone_url=final_location,
+                branch=branch,
+                relative_start_directory=relative_start_directory,
+                target_dir=work_dir,
+                ssh_private_key_path=ssh_private_key_path,
+                set_no_verify_ssl=set_no_verify_ssl,
+                build_context=build_context,
+                git_mirror_cache=git_mirror_cache
+            )
+            repository_dir, revision, git_tree = work_dir, 'HEAD', None
+    except:
+        remove_tmp_dir_recursively(dir=work_dir)
+        raise
+    commit_cache_key = None
+    if parse_cache is not None:
+        # The branch may have moved since it was listed, so the key uses the commit that was actually fetched
+        commit = get_git_head_commit(repository_dir=repository_dir, revision=revision)
+        if commit is not None:
+            commit_cache_key = get_commit_cache_key(parse_cache=parse_cache, git_clone_url=final_location, branch=branch, relative_start_directory=relative_start_directory, commit=commit)
+    return FetchedLocation(location=location, files=sorted(files), work_dir=work_dir, git_tree=git_tree, commit_cache_key=commit_cache_key)
+
+
+def fetch_locations(
+    locations: list,
+    max_parallel_fetches: int=DEFAULT_MAX_PARALLEL_FETCHES,
+    build_context: BuildContext=None,
+    logger=get_logger(),
+    fetch_location_function: object=fetch_location,
+    git_mirror_cache: object=None,
+    read_git_objects: bool=False,
+    parse_cache: ParsedDocumentCache=None,
+    download_cache: DownloadCache=None
+)->list:
+    """Fetch several manifest locations concurrently
+
+    At most `max_parallel_fetches` locations are fetched at the same time. The result is always in the same order as
+    `locations`, regardless of the order in which the fetches complete, so that parsing the results is deterministic.
+
+    If any location fails, the remaining fetches are still allowed to complete (or are stopped through the build
+    context), all temporary directories are removed and the first error is raised.
+
+    Args:
+        locations: A list of location strings
+        max_parallel_fetches: The maximum number of concurrent fetches
+        build_context: Optional deadline/cancel context
+        logger: The logger
+        fetch_location_function: The function fetching a single location. Default is :func:`fetch_location`
+        git_mirror_cache: Optional :class:`verbacratis.utils.git_mirror_cache.GitMirrorCache`, passed to `fetch_location_function`
+        read_git_objects: Passed to `fetch_location_function`
+        parse_cache: Optional :class:`verbacratis.utils.parser2.ParsedDocumentCache`, passed to `fetch_location_function`
+        download_cache: Optional :class:`verbacratis.utils.http_requests_io.DownloadCache`, passed to `fetch_location_function`
+
+    Returns:
+        A list of :class:`FetchedLocation`, in the order of `locations`
+
+    Raises:
+        Exception: If a location could not be fetched
+    """
+    if max_parallel_fetches < 1:
+        raise Exception('max_parallel_fetches must be at least 1')
+    fetched_locations = [None] * len(locations)
+    errors = list()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_fetches, len(locations)))) as pool:
+        futures = list()
+        for location in locations:
+            futures.append(pool.submit(fetch_location_function, location=location, build_context=build_context, git_mirror_cache=git_mirror_cache, read_git_objects=read_git_objects, parse_cache=parse_cache, download_cache=download_cache))
+        for idx, future in enumerate(futures):
+            try:
+                fetched_locations[idx] = future.result()
+                if fetched_locations[idx].from_cache is True:
+                    logger.info('Location "{}" did not change since it was last parsed'.format(locations[idx]))
+                elif fetched_locations[idx].git_tree is not None:
+                    logger.info('Fetched location "{}" to read from Git objects'.format(locations[idx]))
+                else:
+                    logger.info('Fetched location "{}" with {} file(s)'.format(locations[idx], len(fetched_locations[idx].files)))
+            except Exception as e:
+                logger.error('Failed to fetch location "{}": {}'.format(locations[idx], traceback.format_exc()))
+                errors.append('{}: {}'.format(locations[idx], e))
+    if len(errors) > 0:
+        cleanup_fetched_locations(fetched_locations=fetched_locations)
+        raise Exception('Failed to fetch manifest location(s): {}'.format('; '.join(errors)))
+    return fetched_locations
+
+
+def cleanup_fetched_locations(fetched_locations: list):
+    for fetched_location in fetched_locations:
+        if fetched_location is not None:
+            fetched_location.cleanup()
+
+
+def get_parse_pool(
+    fetched_locations: list,
+    parse_cache: ParsedDocumentCache=None,
+    parallel_parsing_threshold: int=DEFAULT_PARALLEL_PARSING_THRESHOLD,
+    max_parse_processes: int=None,
+    logger=get_logger()
+)->ParsePool:
+    """Start parsing the files of all fetched locations in worker processes, when there are enough files together
+
+    The threshold applies to the files of all locations together, so many small locations are parsed in parallel as
+    well. Git locations read from the Git objects or from the parse cache are not counted.
+
+    Returns:
+        A :class:`verbacratis.utils.parser2.ParsePool` with all the files submitted, or None below the threshold. The caller must call `shutdown()`
+    """
+    files = list()
+    for fetched_location in fetched_locations:
+        if fetched_location.git_tree is None and fetched_location.from_cache is False:
+            files += fetched_location.files
+    if len(files) < parallel_parsing_threshold:
+        return None
+    parse_pool = ParsePool(max_parse_processes=max_parse_processes, parse_cache=parse_cache, logger=logger)
+    if parse_pool.max_parse_processes < 2:
+        return None
+    parse_pool.submit(files=files)
+    return parse_pool
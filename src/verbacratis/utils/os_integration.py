@@ -12,18 +12,82 @@ import hashlib
 import tempfile
 import os
 import os.path
+import signal
 import traceback
 from verbacratis.utils import get_logger
+from verbacratis.utils.build_context import BuildContext
 
 
-def exec_shell_cmd(cmd: str, logger=get_logger()):
+def _terminate_process_group(process: subprocess.Popen, grace_period: float=5.0):
+    if process.poll() is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace_period)
+    except subprocess.TimeoutExpired:   # pragma: no cover
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:          # pragma: no cover
+        pass
+
+
+def run_process(args: list, build_context: BuildContext=None, env: dict=None, cwd: str=None, capture_stderr: bool=True, input_data: bytes=None)->tuple:
+    """Run a command, stopping it when the build is cancelled or the build deadline passed
+
+    The command runs in its own process group, so that any child processes it starts are terminated with it.
+
+    Args:
+        args: The command and its arguments
+        build_context: The :class:`verbacratis.utils.build_context.BuildContext` of the build. If None, the command runs until it completes
+        env: The environment for the command. Default is the environment of the current process
+        cwd: The working directory for the command
+        capture_stderr: If True, STDERR is captured and returned, otherwise it is passed through
+        input_data: Optional bytes to write to STDIN of the command
+
+    Returns:
+        A tuple with the return code, STDOUT bytes and STDERR bytes (None if not captured)
+
+    Raises:
+        Exception: If the build was cancelled or the deadline passed before the command completed
+    """
+    if build_context is not None:
+        build_context.check()
+    stderr = None
+    if capture_stderr is True:
+        stderr = subprocess.PIPE
+    stdin = None
+    if input_data is not None:
+        stdin = subprocess.PIPE
+    process = subprocess.Popen(args, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr, env=env, cwd=cwd, start_new_session=True)
+    if build_context is None:
+        stdout_data, stderr_data = process.communicate(input=input_data)
+        return (process.returncode, stdout_data, stderr_data)
+    build_context.register_cleanup(key=process, cleanup_function=lambda: _terminate_process_group(process=process))
+    try:
+        while True:
+            try:
+                # The input is only written on the first call
+                stdout_data, stderr_data = process.communicate(input=input_data, timeout=build_context.get_wait_interval())
+                if process.returncode < 0 and build_context.is_cancelled():
+                    raise Exception('Command "{}" stopped: {}'.format(args[0], build_context.cancel_reason))
+                return (process.returncode, stdout_data, stderr_data)
+            except subprocess.TimeoutExpired:
+                if build_context.is_cancelled():
+                    _terminate_process_group(process=process)
+                    process.communicate()
+                    raise Exception('Command "{}" stopped: {}'.format(args[0], build_context.cancel_reason))
+    finally:
+        build_context.unregister_cleanup(key=process)
+
+
+def exec_shell_cmd(cmd: str, logger=get_logger(), build_context: BuildContext=None):
     td = tempfile.gettempdir()
     value_checksum = hashlib.sha256(str(cmd).encode(('utf-8'))).hexdigest()
     fn = '{}{}{}'.format(td, os.sep, value_checksum)
     logger.debug('Created temp file {}'.format(fn))
     with open(fn, 'w') as f:
         f.write(cmd)
-    result = subprocess.run(['/bin/sh', fn], stdout=subprocess.PIPE).stdout.decode('utf-8')
+    return_code, stdout_data, stderr_data = run_process(args=['/bin/sh', fn], build_context=build_context, capture_stderr=False)
+    result = stdout_data.decode('utf-8')
     logger.info('[{}] Command: {}'.format(value_checksum, cmd))
     logger.info('[{}] Command Result: {}'.format(value_checksum, result))
     return result
@@ -13,6 +13,7 @@ MODULE DEPRECATED
 """
 
 import traceback
+import threading
 from verbacratis.utils.file_io import get_file_contents
 import yaml
 try:    # pragma: no cover
@@ -21,8 +22,13 @@ except ImportError: # pragma: no cover
     from yaml import Loader, Dumper
 from cerberus import Validator
 import json
+from verbacratis.models.task_execution import get_task_graph_reference_errors
+from verbacratis.utils.parser2 import iter_content_documents
 
 
+_validators = dict()                    # The id() of the schema as key, with a (schema, Validator, Lock) tuple as value
+_validators_lock = threading.Lock()
+
 CONFIGURATION_SCHEMA = {
     'deployments': {
         'required': True,
@@ -257,7 +263,8 @@ def variable_snippet_extract(line: str)->list:
 def parse_configuration_file(file_path: str, get_file_contents_function: object=get_file_contents)->dict:
     """Parse a configuration file
 
-    Reads the file content from ``file_path`` and attempts to parse it with the YAML parser
+    Reads the file content from ``file_path`` and attempts to parse it with the parser backends of
+    :func:`verbacratis.utils.parser2.iter_content_documents`, so JSON content is parsed with the JSON parser
 
     Args:
         file_path (str): The full path to the configuration file
@@ -270,7 +277,11 @@ def parse_configuration_file(file_path: str, get_file_contents_function: object=
     configuration = dict()
     try:
         file_content = get_file_contents_function(file=file_path)
-        configuration = yaml.load(file_content, Loader=Loader)
+        configuration = None
+        for idx, data in enumerate(iter_content_documents(content=file_content, file_path=file_path)):
+            if idx > 0:
+                raise Exception('Expected a single document in "{}"'.format(file_path))
+            configuration = data
     except:
         traceback.print_exc()
         raise Exception('Failed to parse configuration')
@@ -287,6 +298,105 @@ def from_configuration_get_all_task_names_as_list(configuration: dict)->list:
     return task_names
 
 
+def _get_cached_validator(schema: dict)->tuple:
+    # Looking up by identity keeps the cost per document constant, whatever the size of the schema
+    entry = _validators.get(id(schema))
+    if entry is None:
+        with _validators_lock:
+            entry = _validators.get(id(schema))
+            if entry is None:
+                entry = (schema, Validator(schema), threading.Lock())
+                _validators[id(schema)] = entry
+    return entry[1], entry[2]
+
+
+def get_validator(schema: dict)->Validator:
+    """Get the validator for a schema
+
+    The schema is compiled once when the validator is created, and the validator is cached for the life of the process,
+    keyed by the identity of the schema. The cache keeps a reference to the schema, which must therefore not be changed
+    after its first use.
+
+    Note:
+        A validator keeps the state of the last validation, so use :func:`get_document_validation_errors` to validate
+        from several threads.
+    """
+    return _get_cached_validator(schema=schema)[0]
+
+
+def get_document_validation_errors(document: object, schema: dict)->dict:
+    """Validate a document against a schema with the cached validator
+
+    Returns:
+        dict: The Cerberus errors, which is empty when the document is valid
+    """
+    validator, validator_lock = _get_cached_validator(schema=schema)
+    with validator_lock:
+        if validator.validate(document) is True:
+            return dict()
+        return validator.errors
+
+
+def get_configuration_validation_errors(
+    configuration: dict,
+    validation_configuration: dict={
+        'CONFIGURATION_SCHEMA': CONFIGURATION_SCHEMA,
+        'DEPLOYMENT_SCHEMA': DEPLOYMENT_SCHEMA,
+        'FUNCTION_DEFINITION_SCHEMA': FUNCTION_DEFINITION_SCHEMA,
+        'FUNCTION_PARAMETERS_SCHEMA': FUNCTION_PARAMETERS_SCHEMA,
+        'LOGGING_SCHEMA': LOGGING_SCHEMA,
+        'LOGGING_HANDLER_SCHEMA': LOGGING_HANDLER_SCHEMA,
+        'TASKS_SCHEMA': TASKS_SCHEMA,
+    }
+)->list:
+    """Validate all the sections of a configuration in one pass, collecting every error
+
+    The deployments, function parameters, logging handlers and tasks are collected as one batch of independent
+    documents, and each is validated with the cached validator of its schema. Task references are only checked when
+    all documents are valid, since they depend on the structure.
+
+    Returns:
+        list: Error messages, which is empty when the configuration is valid
+    """
+    errors = list()
+    if isinstance(configuration, dict) is False:
+        return ['Configuration Validation Errors: the configuration must be a dictionary',]
+    batch = [('Configuration Validation Errors', configuration, 'CONFIGURATION_SCHEMA'),]
+    if isinstance(configuration.get('deployments'), list):
+        for deployment in configuration['deployments']:
+            batch.append(('Deployment Configuration Validation Errors', deployment, 'DEPLOYMENT_SCHEMA'))
+    if isinstance(configuration.get('functionParameterValues'), list):
+        for function_parameter in configuration['functionParameterValues']:
+            batch.append(('Deployment Configuration Validation Errors', function_parameter, 'FUNCTION_DEFINITION_SCHEMA'))
+            if isinstance(function_parameter, dict) and isinstance(function_parameter.get('parameters'), list):
+                for param in function_parameter['parameters']:
+                    batch.append(('Deployment Configuration Validation Errors', param, 'FUNCTION_PARAMETERS_SCHEMA'))
+    if 'logging' in configuration:
+        batch.append(('Configuration Validation Errors', configuration['logging'], 'LOGGING_SCHEMA'))
+        if isinstance(configuration['logging'], dict) and isinstance(configuration['logging'].get('handlers'), list):
+            for handler in configuration['logging']['handlers']:
+                batch.append(('Configuration Validation Errors', handler, 'LOGGING_HANDLER_SCHEMA'))
+    if isinstance(configuration.get('tasks'), list):
+        for task in configuration['tasks']:
+            batch.append(('Configuration Validation Errors', task, 'TASKS_SCHEMA'))
+
+    for label, document, schema_name in batch:
+        document_errors = get_document_validation_errors(document=document, schema=validation_configuration[schema_name])
+        if len(document_errors) > 0:
+            errors.append('{}: {}'.format(label, json.dumps(document_errors, default=str)))
+    if len(errors) > 0:
+        return errors
+
+    task_names = from_configuration_get_all_task_names_as_list(configuration=configuration)
+    for deployment in configuration['deployments']:
+        for deployment_task_name in deployment['tasks']:
+            if deployment_task_name not in task_names:
+                errors.append('ERROR: Task name "{}" in deployment "{}" was not found in task definition'.format(deployment_task_name, deployment['name']))
+    for reference_error in get_task_graph_reference_errors(configuration=configuration):
+        errors.append('ERROR: {}'.format(reference_error))
+    return errors
+
+
 def validate_configuration(
     configuration: dict, 
     validation_configuration: dict={
@@ -299,48 +409,13 @@ def validate_configuration(
         'TASKS_SCHEMA': TASKS_SCHEMA,
     }
 )->bool:
+    """Validate a configuration, printing all the errors found (see :func:`get_configuration_validation_errors`)"""
     try:
-        v = Validator()
-        validation_result = v.validate(configuration, validation_configuration['CONFIGURATION_SCHEMA'])
-        if validation_result is False:
-            print('Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
+        errors = get_configuration_validation_errors(configuration=configuration, validation_configuration=validation_configuration)
+        if len(errors) > 0:
+            for error in errors:
+                print(error)
             return False
-        task_names = from_configuration_get_all_task_names_as_list(configuration=configuration)
-        for deployment in configuration['deployments']:
-            validation_result = v.validate(deployment, validation_configuration['DEPLOYMENT_SCHEMA'])
-            if validation_result is False:
-                print('Deployment Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                return False
-            for deployment_task_name in deployment['tasks']:
-                if deployment_task_name not in task_names:
-                    print('ERROR: Task name "{}" in deployment "{}" was not found in task definition'.format(deployment_task_name, deployment['name']))
-                    return False
-        if 'functionParameterValues' in configuration:
-            for function_parameter in configuration['functionParameterValues']:
-                validation_result = v.validate(function_parameter, validation_configuration['FUNCTION_DEFINITION_SCHEMA'])
-                if validation_result is False:
-                    print('Deployment Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                    return False
-                for param in function_parameter['parameters']:
-                    sub_validation_result = v.validate(param, validation_configuration['FUNCTION_PARAMETERS_SCHEMA'])
-                    if sub_validation_result is False:
-                        print('Deployment Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                        return False
-        if 'logging' in configuration:
-            validation_result = v.validate(configuration['logging'], validation_configuration['LOGGING_SCHEMA'])
-            if validation_result is False:
-                print('Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                return False
-            for handler in configuration['logging']['handlers']:
-                sub_validation_result = v.validate(handler, validation_configuration['LOGGING_HANDLER_SCHEMA'])
-                if sub_validation_result is False:
-                    print('Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                    return False
-        for task in configuration['tasks']:
-            validation_result = v.validate(task, validation_configuration['TASKS_SCHEMA'])
-            if validation_result is False:
-                print('Configuration Validation Errors: {}'.format(json.dumps(v.errors, default=str)))
-                return False
     except:
         traceback.print_exc()
         return False
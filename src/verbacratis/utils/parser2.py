@@ -7,25 +7,538 @@
 """
 
 import traceback
+import os
+import re
+import hashlib
+import pickle
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from verbacratis.models import DEFAULT_CONFIG_DIR
 from verbacratis.utils.file_io import get_file_contents
+from verbacratis.utils.git_integration import list_git_tree_files, read_git_blobs
+from verbacratis.utils.build_context import BuildContext
 import yaml
 try:    # pragma: no cover
     from yaml import CLoader as Loader, CDumper as Dumper
+    YAML_C_LOADER_AVAILABLE = True
 except ImportError: # pragma: no cover
     from yaml import Loader, Dumper
+    YAML_C_LOADER_AVAILABLE = False
 from cerberus import Validator
 import json
 from verbacratis.utils import get_logger
 
 
-def parse_yaml_file(file_path: str, get_file_contents_function: object=get_file_contents, logger=get_logger())->dict:
+# Increment when the structure returned by parse_yaml_file() or the layout of the cache entries changes, so that cached results are no longer used
+PARSER_VERSION = 4
+DEFAULT_PARSE_CACHE_DIR = '{}{}cache{}parsed'.format(DEFAULT_CONFIG_DIR, os.sep, os.sep)
+# Parse files in worker processes when there are at least this many files
+DEFAULT_PARALLEL_PARSING_THRESHOLD = 64
+JSON_FILE_EXTENSIONS = ('.json',)
+
+_JSON_CONTENT_REGEX = re.compile(r'\s*(---[ \t]*\r?\n\s*)?[\[{]')
+_parser_metrics = dict()                # The backend name as key, with the number of parsed files as value
+_parser_metrics_lock = threading.Lock()
+_pure_python_loader_warned = False
+
+
+class ParserBackend:
+    """Turns the content of a manifest file into documents
+
+    Sub-classes implement :meth:`accepts` and :meth:`iter_documents`, and are added with :func:`register_parser_backend`.
+
+    Attributes:
+        name: The name of the backend, used in the parser metrics (see :func:`get_parser_metrics`)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def accepts(self, content: str, file_path: str=None)->bool:
+        """Check if the backend should try to parse the content of a file. `file_path` may be None."""
+        raise Exception('Implement in ParserBackend sub-classes')
+
+    def iter_documents(self, content: str):
+        """Yield the documents in the content. Raises an Exception if the content cannot be parsed."""
+        raise Exception('Implement in ParserBackend sub-classes')
+
+
+class JsonParserBackend(ParserBackend):
+    """Parses JSON with the standard library
+
+    Used for files ending in one of `JSON_FILE_EXTENSIONS`, and for content that holds a single JSON object or array,
+    optionally after a `---` line, as written by many manifest generators. Content that is not valid JSON is left to
+    the next backend.
+    """
+
+    def __init__(self):
+        super().__init__(name='json')
+
+    def accepts(self, content: str, file_path: str=None)->bool:
+        if file_path is not None and file_path.lower().endswith(JSON_FILE_EXTENSIONS):
+            return True
+        return _JSON_CONTENT_REGEX.match(content) is not None
+
+    def iter_documents(self, content: str):
+        match = _JSON_CONTENT_REGEX.match(content)
+        if match is not None and match.group(1) is not None:
+            content = content[match.end() - 1:]
+        yield json.loads(content)
+
+
+class YamlParserBackend(ParserBackend):
+    """Parses YAML with PyYAML, using the LibYAML based loader when it is available
+
+    Accepts any content. Without LibYAML the backend is named `yaml-pure-python`, and a warning is logged the first time
+    it is used.
+    """
+
+    def __init__(self):
+        if YAML_C_LOADER_AVAILABLE is True:
+            super().__init__(name='yaml')
+        else:   # pragma: no cover
+            super().__init__(name='yaml-pure-python')
+
+    def accepts(self, content: str, file_path: str=None)->bool:
+        return True
+
+    def iter_documents(self, content: str):
+        global _pure_python_loader_warned
+        if YAML_C_LOADER_AVAILABLE is False and _pure_python_loader_warned is False:    # pragma: no cover
+            _pure_python_loader_warned = True
+            get_logger().warn('PyYAML was installed without LibYAML - manifests are parsed with the much slower pure Python loader')
+        for data in yaml.load_all(content, Loader=Loader):
+            yield data
+
+
+_parser_backends = [JsonParserBackend(), YamlParserBackend()]
+
+
+def register_parser_backend(backend: ParserBackend, position: int=0):
+    """Add a parser backend. Backends are tried in order, and the YAML backend remains the last one by default."""
+    _parser_backends.insert(position, backend)
+
+
+def get_parser_backends()->list:
+    return list(_parser_backends)
+
+
+def _count_parsed_content(backend_name: str):
+    with _parser_metrics_lock:
+        _parser_metrics[backend_name] = _parser_metrics.get(backend_name, 0) + 1
+
+
+def get_parser_metrics()->dict:
+    """The number of files (or contents) parsed by each backend in this process, by backend name. A name ending in `-fallback` counts the contents a backend accepted but could not parse."""
+    with _parser_metrics_lock:
+        return dict(_parser_metrics)
+
+
+def reset_parser_metrics():
+    with _parser_metrics_lock:
+        _parser_metrics.clear()
+
+
+def iter_content_documents(content: str, file_path: str=None, logger=get_logger()):
+    """Yield the documents in `content` one at a time, parsed by the first parser backend that accepts the content
+
+    When a backend fails before it produced a document, the next backend that accepts the content is tried.
+
+    Args:
+        content: The file content
+        file_path: Optional file path, used by backends that select by file extension
+
+    Raises:
+        Exception: The error of the last backend if no backend could parse the content
+    """
+    backends = get_parser_backends()
+    for idx, backend in enumerate(backends):
+        if backend.accepts(content=content, file_path=file_path) is False:
+            continue
+        yielded = False
+        try:
+            for data in backend.iter_documents(content=content):
+                yielded = True
+                yield data
+        except Exception:
+            if yielded is True or idx == len(backends) - 1:
+                raise
+            logger.debug('Parser backend "{}" could not parse "{}" - trying the next backend'.format(backend.name, file_path))
+            _count_parsed_content(backend_name='{}-fallback'.format(backend.name))
+            continue
+        _count_parsed_content(backend_name=backend.name)
+        return
+    raise Exception('No parser backend accepts the content of "{}"'.format(file_path))
+
+
+class ParsedDocumentCache:
+    """A disk cache of parsed YAML files
+
+    Each entry holds the parsed documents of one file, serialized with pickle. Entries are keyed by the SHA256 hash of
+    the file content combined with the parser version (`PARSER_VERSION`, the PyYAML version and the loader used), so a
+    changed file or an upgraded parser simply results in a cache miss. A damaged entry is removed and treated as a miss.
+
+    Entries written with :meth:`store_documents` hold one pickle per document, so they can be written and read back one
+    document at a time with :meth:`iter_documents`, without holding all the documents of a file in memory.
+
+    Only point the cache to a directory that is writable by the current user alone, since pickle data is trusted when
+    loaded.
+
+    Attributes:
+        cache_dir: The directory holding the cache entries
+    """
+
+    def __init__(self, cache_dir: str=DEFAULT_PARSE_CACHE_DIR, logger=get_logger()):
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.parser_version = '{}:{}:{}'.format(PARSER_VERSION, yaml.__version__, Loader.__name__)
+
+    def get_key(self, content: str)->str:
+        h = hashlib.sha256(self.parser_version.encode('utf-8'))
+        h.update(b'\n')
+        h.update(content.encode('utf-8'))
+        return h.hexdigest()
+
+    def get_key_for_git_blob(self, blob_sha: str)->str:
+        """Git blob SHAs already identify content, so a blob can be looked up without reading it"""
+        return self.get_key(content='git-blob:{}'.format(blob_sha))
+
+    def _get_entry_file(self, key: str)->str:
+        return '{}{}{}{}{}.pickle'.format(self.cache_dir, os.sep, key[:2], os.sep, key)
+
+    def load(self, key: str)->dict:
+        """Get the cached parsed documents for `key`, or None if there is no valid entry"""
+        entry_file = self._get_entry_file(key=key)
+        if os.path.isfile(entry_file) is False:
+            return None
+        try:
+            with open(entry_file, 'rb') as f:
+                return pickle.load(f)
+        except:
+            self.logger.warn('Removing damaged parse cache entry "{}"'.format(entry_file))
+            try:
+                os.remove(entry_file)
+            except:
+                pass
+        return None
+
+    def store(self, key: str, configuration: dict):
+        """Store parsed documents. Failing to write the cache is logged, but never fails parsing."""
+        entry_file = self._get_entry_file(key=key)
+        tmp_entry_file = '{}.{}.tmp'.format(entry_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+            with open(tmp_entry_file, 'wb') as f:
+                pickle.dump(configuration, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_entry_file, entry_file)
+        except:
+            self.logger.warn('Could not write parse cache entry "{}": {}'.format(entry_file, traceback.format_exc()))
+            if os.path.exists(tmp_entry_file):
+                os.remove(tmp_entry_file)
+
+    def has_entry(self, key: str)->bool:
+        return os.path.isfile(self._get_entry_file(key=key))
+
+    def iter_documents(self, key: str):
+        """Yield the documents of an entry written with :meth:`store_documents`, one at a time
+
+        Raises:
+            Exception: If the entry is damaged. The entry is removed, but documents read before the damage was found were already yielded
+        """
+        entry_file = self._get_entry_file(key=key)
+        with open(entry_file, 'rb') as f:
+            while True:
+                try:
+                    document = pickle.load(f)
+                except EOFError:
+                    return
+                except:
+                    self.logger.warn('Removing damaged parse cache entry "{}"'.format(entry_file))
+                    try:
+                        os.remove(entry_file)
+                    except:
+                        pass
+                    raise Exception('Damaged parse cache entry "{}"'.format(entry_file))
+                yield document
+
+    def store_documents(self, key: str, documents, is_complete: object=None):
+        """Pass documents through while writing each of them to the cache
+
+        The entry is only written when all the documents were consumed, and when `is_complete` (an optional function
+        returning a bool) agrees. Failing to write the cache is logged, but never fails parsing.
+
+        Args:
+            key: The cache key
+            documents: An iterable of documents
+            is_complete: Optional function, called after the last document, that returns False when the entry must not be stored
+        """
+        entry_file = self._get_entry_file(key=key)
+        tmp_entry_file = '{}.{}.{}.tmp'.format(entry_file, os.getpid(), threading.get_ident())
+        f = None
+        try:
+            os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+            f = open(tmp_entry_file, 'wb')
+        except:
+            self.logger.warn('Could not write parse cache entry "{}": {}'.format(entry_file, traceback.format_exc()))
+        try:
+            for document in documents:
+                if f is not None:
+                    try:
+                        pickle.dump(document, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    except:
+                        self.logger.warn('Could not write parse cache entry "{}": {}'.format(entry_file, traceback.format_exc()))
+                        f.close()
+                        f = None
+                        os.remove(tmp_entry_file)
+                yield document
+            if f is not None:
+                f.close()
+                f = None
+                if is_complete is None or is_complete() is True:
+                    os.replace(tmp_entry_file, entry_file)
+        finally:
+            if f is not None:
+                f.close()
+            if os.path.exists(tmp_entry_file):
+                os.remove(tmp_entry_file)
+
+
+def iter_yaml_documents(content: str, file_path: str=None):
+    """Yield the YAML documents in `content` one at a time, as the parser produces them (see :func:`iter_content_documents`)"""
+    for data in iter_content_documents(content=content, file_path=file_path):
+        yield data
+
+
+def parse_yaml_documents(content: str, file_path: str=None)->dict:
+    """Parse all the YAML documents in `content`
+
+    Returns:
+        dict: Each document with the key `part_N`, where N is the position of the document, starting at 1
+    """
+    configuration = dict()
+    current_part = 0
+    # configuration = yaml.load(file_content, Loader=Loader)
+    for data in iter_yaml_documents(content=content, file_path=file_path):
+        current_part += 1
+        configuration['part_{}'.format(current_part)] = data
+    return configuration
+
+
+def dump_documents(documents, stream, output_format: str='yaml'):
+    """Write documents to a file-like object, one document at a time
+
+    The documents are written as they are produced, so `documents` may be a generator, and the output is never built up
+    as one string. YAML is written as a multi-document stream with the LibYAML based dumper when it is available. JSON is
+    written as an array with one document per line.
+
+    Args:
+        documents: An iterable of documents, for example the `iter_documents()` value of a configuration collection
+        stream: A writable text file-like object
+        output_format: Either `yaml` or `json`
+
+    Raises:
+        Exception: If the output format is not supported
+    """
+    if output_format == 'yaml':
+        yaml.dump_all(documents, stream, Dumper=Dumper, explicit_start=True, default_flow_style=False)
+    elif output_format == 'json':
+        stream.write('[')
+        separator = '\n'
+        for data in documents:
+            stream.write(separator)
+            stream.write(json.dumps(data, sort_keys=True, default=str))
+            separator = ',\n'
+        stream.write('\n]\n')
+    else:
+        raise Exception('Output format "{}" is not supported'.format(output_format))
+
+
+def iter_yaml_file_documents(file_path: str, get_file_contents_function: object=get_file_contents, logger=get_logger(), parse_cache: ParsedDocumentCache=None):
+    """Yield the YAML documents of a configuration file one at a time
+
+    Only the current document is held in memory (besides the file content), so that very large multi-document files
+    can be processed as they are parsed.
+
+    Args:
+        file_path (str): The full path to the configuration file
+        get_file_contents_function (object): A function used mainly for unit testing to mock the File IO functions
+        parse_cache (ParsedDocumentCache): Optional cache. When the content of the file was parsed before, the cached documents are yielded without parsing the file again
+
+    Raises:
+        Exception: If the file could not be read or parsed
+    """
+    try:
+        file_content = get_file_contents_function(file=file_path)
+    except:
+        traceback.print_exc()
+        raise Exception('Failed to parse configuration')
+    skip_qty = 0
+    cache_key = None
+    if parse_cache is not None:
+        cache_key = parse_cache.get_key(content=file_content)
+        if parse_cache.has_entry(key=cache_key) is True:
+            logger.debug('Using cached parse result for file "{}"'.format(file_path))
+            try:
+                for document in parse_cache.iter_documents(key=cache_key):
+                    skip_qty += 1
+                    yield document
+                return
+            except Exception:
+                # Parse the file after all, continuing after the documents that were already yielded
+                pass
+    documents = iter_yaml_documents(content=file_content, file_path=file_path)
+    if parse_cache is not None:
+        documents = parse_cache.store_documents(key=cache_key, documents=documents)
+    try:
+        for document in documents:
+            if skip_qty > 0:
+                skip_qty -= 1
+                continue
+            yield document
+    except Exception:
+        traceback.print_exc()
+        raise Exception('Failed to parse configuration')
+
+
+class ParsedFileResult:
+    """The documents of a file parsed in a worker process, or the error if the file could not be parsed
+
+    Iterating the result yields the documents, or raises an Exception for a file that could not be parsed, so a result
+    can be used in the same way as :func:`iter_yaml_file_documents`.
+
+    Attributes:
+        file_path: The parsed file
+        documents: The list of documents, or None if the file could not be parsed
+        error: The error message, or None
+    """
+
+    def __init__(self, file_path: str, documents: list=None, error: str=None):
+        self.file_path = file_path
+        self.documents = documents
+        self.error = error
+
+    def __iter__(self):
+        if self.error is not None:
+            raise Exception('Failed to parse configuration "{}": {}'.format(self.file_path, self.error))
+        return iter(self.documents)
+
+
+def _parse_file_in_worker(file_path: str, parse_cache_dir: str=None)->ParsedFileResult:
+    """Parse a file in a worker process"""
+    try:
+        parse_cache = None
+        if parse_cache_dir is not None:
+            parse_cache = ParsedDocumentCache(cache_dir=parse_cache_dir)
+        return ParsedFileResult(file_path=file_path, documents=list(iter_yaml_file_documents(file_path=file_path, parse_cache=parse_cache)))
+    except Exception:
+        return ParsedFileResult(file_path=file_path, error=traceback.format_exc())
+
+
+class ParsePool:
+    """A pool of worker processes parsing files ahead of their use
+
+    Files are submitted as soon as they are known, for example the files of all the manifest locations of a build, so
+    that the workers parse them while the documents of earlier files are processed. The documents of each file are sent
+    back as plain data.
+
+    Attributes:
+        max_parse_processes: The maximum number of worker processes
+        parse_cache_dir: The directory of the parse cache used by the workers, or None
+    """
+
+    def __init__(self, max_parse_processes: int=None, parse_cache: ParsedDocumentCache=None, logger=get_logger()):
+        if max_parse_processes is None:
+            max_parse_processes = os.cpu_count() or 1
+        self.max_parse_processes = max_parse_processes
+        self.parse_cache_dir = None
+        if parse_cache is not None:
+            self.parse_cache_dir = parse_cache.cache_dir
+        self.logger = logger
+        self._executor = None
+        self._futures = dict()
+
+    def submit(self, files: list):
+        """Start parsing files that were not submitted before"""
+        files = [file for file in files if file not in self._futures]
+        if len(files) == 0:
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_parse_processes)
+        self.logger.debug('Parsing {} files in up to {} processes'.format(len(files), self.max_parse_processes))
+        for file in files:
+            self._futures[file] = self._executor.submit(_parse_file_in_worker, file, self.parse_cache_dir)
+
+    def get_result(self, file: str)->ParsedFileResult:
+        """Wait for the result of a file, submitting it first if needed. The result is released once it was returned."""
+        self.submit(files=[file,])
+        return self._futures.pop(file).result()
+
+    def shutdown(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = dict()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def iter_parsed_files(
+    files: list,
+    parse_cache: ParsedDocumentCache=None,
+    logger=get_logger(),
+    parallel_parsing_threshold: int=DEFAULT_PARALLEL_PARSING_THRESHOLD,
+    max_parse_processes: int=None,
+    parse_pool: ParsePool=None
+):
+    """Yield the documents of several configuration files, in file order
+
+    With a `parse_pool`, the results of the pool are used, so the caller decides when to parse in worker processes, for
+    example from the number of files of all manifest locations together. Otherwise, below `parallel_parsing_threshold`
+    files, the documents of each file are parsed on demand (see :func:`iter_yaml_file_documents`), and from the
+    threshold the files are parsed in a :class:`ParsePool` for this call only. The results are yielded in file order,
+    so the outcome is the same in all modes.
+
+    Args:
+        files: The configuration files
+        parse_cache: Optional :class:`ParsedDocumentCache`. Worker processes use a cache in the same directory
+        logger: The logger
+        parallel_parsing_threshold: The minimum number of files in this call to parse in worker processes
+        max_parse_processes: The maximum number of worker processes. Default is the number of CPU cores
+        parse_pool: Optional :class:`ParsePool` to take the results from. The threshold is then not used
+
+    Yields:
+        tuple: The file path, and an iterable of its documents. Iterating the documents of a file that could not be parsed raises an Exception
+    """
+    if parse_pool is not None:
+        parse_pool.submit(files=files)
+        for file in files:
+            yield file, parse_pool.get_result(file=file)
+        return
+    if max_parse_processes is None:
+        max_parse_processes = os.cpu_count() or 1
+    if len(files) < parallel_parsing_threshold or max_parse_processes < 2:
+        for file in files:
+            yield file, iter_yaml_file_documents(file_path=file, logger=logger, parse_cache=parse_cache)
+        return
+    parse_pool = ParsePool(max_parse_processes=min(max_parse_processes, len(files)), parse_cache=parse_cache, logger=logger)
+    try:
+        for file, documents in iter_parsed_files(files=files, parse_pool=parse_pool):
+            yield file, documents
+    finally:
+        parse_pool.shutdown()
+
+
+def parse_yaml_file(file_path: str, get_file_contents_function: object=get_file_contents, logger=get_logger(), parse_cache: ParsedDocumentCache=None)->dict:
     """Parse a configuration file
 
-    Reads the file content from ``file_path`` and attempts to parse it with the YAML parser
+    Reads the file content from ``file_path`` and attempts to parse it with the YAML parser. See
+    :func:`iter_yaml_file_documents` to process the documents one at a time instead.
 
     Args:
         file_path (str): The full path to the configuration file
         get_file_contents_function (object): A function used mainly for unit testing to mock the File IO functions
+        parse_cache (ParsedDocumentCache): Optional cache. When the content of the file was parsed before, the cached result is returned without parsing the file again
 
     Returns:
         dict: The parsed configuration, not validated (any valid YAML will be parsed and returned as a dict)
@@ -33,16 +546,122 @@ def parse_yaml_file(file_path: str, get_file_contents_function: object=get_file_
     """
     configuration = dict()
     current_part = 0
+    for data in iter_yaml_file_documents(file_path=file_path, get_file_contents_function=get_file_contents_function, logger=logger, parse_cache=parse_cache):
+        current_part += 1
+        configuration['part_{}'.format(current_part)] = data
+    logger.debug('configuration={}'.format(configuration))
+    return configuration
+
+
+def _iter_queued_items(queue: deque):
+    while len(queue) > 0:
+        yield queue.popleft()
+
+
+def _iter_git_blob_documents(path: str, blob_sha: str, blob_sha_queue: deque, blobs, parse_cache: ParsedDocumentCache=None):
+    skip_qty = 0
+    cache_key = None
+    if parse_cache is not None:
+        cache_key = parse_cache.get_key_for_git_blob(blob_sha=blob_sha)
+        if parse_cache.has_entry(key=cache_key) is True:
+            try:
+                for document in parse_cache.iter_documents(key=cache_key):
+                    skip_qty += 1
+                    yield document
+                return
+            except Exception:
+                # Parse the file after all, continuing after the documents that were already yielded
+                pass
+    # The SHA is only queued when the file is reached, so the blobs are read one at a time
+    blob_sha_queue.append(blob_sha)
     try:
-        file_content = get_file_contents_function(file=file_path)
-        # configuration = yaml.load(file_content, Loader=Loader)
-        for data in yaml.load_all(file_content, Loader=Loader):
-            current_part += 1
-            configuration['part_{}'.format(current_part)] = data
-        logger.debug('configuration={}'.format(configuration))
-    except:
+        read_blob_sha, content = next(blobs)
+    except StopIteration:
+        raise Exception('Failed to read "{}" from the Git objects'.format(path))
+    documents = iter_yaml_documents(content=content.decode('utf-8'), file_path=path)
+    if parse_cache is not None:
+        documents = parse_cache.store_documents(key=cache_key, documents=documents)
+    try:
+        for document in documents:
+            if skip_qty > 0:
+                skip_qty -= 1
+                continue
+            yield document
+    except Exception:
         traceback.print_exc()
-        raise Exception('Failed to parse configuration')
-    return configuration
+        raise Exception('Failed to parse configuration in "{}"'.format(path))
+
+
+def iter_parsed_git_tree_files(
+    repository_dir: str,
+    revision: str='HEAD',
+    relative_start_directory: str='/',
+    include_files_regex: str='.*\.yaml$|.*\.yml$',
+    parse_cache: ParsedDocumentCache=None,
+    build_context: BuildContext=None,
+    logger=get_logger()
+):
+    """Parse the matching files in the tree of a Git commit, reading the blobs directly from the Git object store
 
+    Nothing is checked out or written to disk. The blobs are streamed from a single `git cat-file --batch` process, and
+    a blob is only read when the documents of its file are iterated, so only the current file is held in memory. With a
+    `parse_cache`, a file is looked up by its blob SHA, so files that were parsed before are not even read from the
+    repository.
 
+    Args:
+        repository_dir: A (bare) Git repository, for example from :func:`verbacratis.utils.git_integration.git_fetch_tree`
+        revision: The commit, branch or tag to read
+        relative_start_directory: Only parse files in this directory of the tree
+        include_files_regex: A regular expression the file name must match
+        parse_cache: Optional :class:`ParsedDocumentCache`
+        build_context: Optional deadline/cancel context
+        logger: The logger
+
+    Yields:
+        tuple: The file path, and an iterable of its documents, sorted by path. Iterating the documents of a file that could not be read or parsed raises an Exception
+
+    Raises:
+        Exception: If the tree could not be read
+    """
+    tree_files = list_git_tree_files(
+        repository_dir=repository_dir,
+        revision=revision,
+        relative_start_directory=relative_start_directory,
+        include_files_regex=include_files_regex,
+        build_context=build_context
+    )
+    logger.debug('Reading {} file(s) from Git revision "{}"'.format(len(tree_files), revision))
+    blob_sha_queue = deque()
+    blobs = read_git_blobs(repository_dir=repository_dir, blob_shas=_iter_queued_items(queue=blob_sha_queue), build_context=build_context)
+    try:
+        for path, blob_sha in tree_files:
+            yield path, _iter_git_blob_documents(path=path, blob_sha=blob_sha, blob_sha_queue=blob_sha_queue, blobs=blobs, parse_cache=parse_cache)
+    finally:
+        blobs.close()
+
+
+def parse_yaml_git_tree(
+    repository_dir: str,
+    revision: str='HEAD',
+    relative_start_directory: str='/',
+    include_files_regex: str='.*\.yaml$|.*\.yml$',
+    parse_cache: ParsedDocumentCache=None,
+    build_context: BuildContext=None,
+    logger=get_logger()
+):
+    """Yield the documents of the matching files in the tree of a Git commit one at a time (see :func:`iter_parsed_git_tree_files`)
+
+    Raises:
+        Exception: If the tree could not be read or a file could not be parsed
+    """
+    for path, documents in iter_parsed_git_tree_files(
+        repository_dir=repository_dir,
+        revision=revision,
+        relative_start_directory=relative_start_directory,
+        include_files_regex=include_files_regex,
+        parse_cache=parse_cache,
+        build_context=build_context,
+        logger=logger
+    ):
+        for document in documents:
+            yield document
@@ -21,9 +21,16 @@ def main(cli_args: list=sys.argv[1:], logger=get_logger())->dict:
     ### Start the build
     ###
     state: ApplicationState = parse_command_line_arguments(state=ApplicationState(logger=logger), cli_args=cli_args)
-    state.load_system_manifests()
-    state.load_project_manifests()
+    if state.compile_bundle_file is not None:
+        bundle = state.compile_bundle(bundle_file=state.compile_bundle_file)
+        result['bundle'] = {'file': state.compile_bundle_file, 'sourceChecksum': bundle.source_checksum}
+        logger.info('RESULT: {}'.format(json.dumps(result, indent=4, sort_keys=True, default=str)))
+        return result
+    state.load_manifests()
     state.logger.info('Started with build ID {}'.format(state.build_id))
+    if state.export_file is not None:
+        state.export_configuration_file(export_file=state.export_file, output_format=state.export_format)
+        result['export'] = {'file': state.export_file, 'format': state.export_format}
     
     ###
     ### Log and return final result
@@ -0,0 +1,121 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.models.configuration_diff import *
+from verbacratis.models.systems_configuration import SystemConfigurations, UnixInfrastructureAccount, AwsInfrastructureAccount
+from verbacratis.models.deployments_configuration import Projects, Project, LocalFileManifestLocation
+from verbacratis.utils.file_io import create_tmp_dir, create_tmp_file, remove_tmp_dir_recursively
+
+
+def get_system_configurations(account_qty: int)->SystemConfigurations:    # pragma: no cover
+    system_configurations = SystemConfigurations()
+    for i in range(account_qty):
+        system_configurations.add_configuration(item=UnixInfrastructureAccount(account_name='host-{}'.format(i), environments=['sandbox',]))
+    return system_configurations
+
+
+class CountingHashTree(ConfigurationHashTree):    # pragma: no cover
+    """Records the buckets that were compared"""
+
+    def __init__(self):
+        super().__init__()
+        self.compared_buckets = list()
+
+    def get_object_hashes(self, kind: str, bucket: str)->dict:
+        self.compared_buckets.append((kind, bucket))
+        return super().get_object_hashes(kind=kind, bucket=bucket)
+
+
+class TestConfigurationDiff(unittest.TestCase):    # pragma: no cover
+
+    def test_same_configuration_has_no_differences(self):
+        diff = diff_configurations(previous=get_system_configurations(account_qty=10), current=get_system_configurations(account_qty=10))
+        self.assertTrue(diff.is_empty())
+
+    def test_added_removed_and_changed_objects(self):
+        previous = get_system_configurations(account_qty=10)
+        current = get_system_configurations(account_qty=10)
+        current.add_configuration(item=UnixInfrastructureAccount(account_name='host-10', environments=['sandbox',]))
+        current.add_configuration(item=UnixInfrastructureAccount(account_name='host-3', environments=['prod',]))
+        current.add_configuration(item=AwsInfrastructureAccount(account_name='cloud', environments=['prod',]))
+        previous.add_configuration(item=UnixInfrastructureAccount(account_name='old-host', environments=['sandbox',]))
+        diff = diff_configurations(previous=previous, current=current)
+        self.assertEqual(diff.added, [('AwsInfrastructureAccount', 'cloud'), ('UnixInfrastructureAccount', 'host-10')])
+        self.assertEqual(diff.removed, [('UnixInfrastructureAccount', 'old-host'),])
+        self.assertEqual(diff.changed, [('UnixInfrastructureAccount', 'host-3'),])
+        self.assertEqual(sorted(diff.get_names(kind='UnixInfrastructureAccount')), ['host-10', 'host-3', 'old-host'])
+        self.assertEqual(diff.as_dict()['removed'], [{'kind': 'UnixInfrastructureAccount', 'name': 'old-host'},])
+
+    def test_only_changed_buckets_are_compared(self):
+        previous = CountingHashTree()
+        current = CountingHashTree()
+        for i in range(2000):
+            previous.add(kind='Item', name='item-{}'.format(i), object_hash='a')
+            current.add(kind='Item', name='item-{}'.format(i), object_hash='a')
+            previous.add(kind='Other', name='other-{}'.format(i), object_hash='a')
+            current.add(kind='Other', name='other-{}'.format(i), object_hash='a')
+        current.add(kind='Item', name='item-1234', object_hash='b')
+        diff = diff_hash_trees(previous=previous, current=current)
+        self.assertEqual(diff.changed, [('Item', 'item-1234'),])
+        self.assertEqual(len(current.compared_buckets), 1)
+        self.assertEqual(previous.get_object_qty(), 4000)
+
+    def test_saved_tree_can_be_compared(self):
+        previous = get_system_configurations(account_qty=5)
+        saved_tree = json.loads(json.dumps(get_configuration_hash_tree(configuration=previous).as_dict()))
+        current = get_system_configurations(account_qty=4)
+        diff = diff_configurations(previous=ConfigurationHashTree.from_dict(data=saved_tree), current=current)
+        self.assertEqual(diff.removed, [('UnixInfrastructureAccount', 'host-4'),])
+        with self.assertRaises(Exception):
+            ConfigurationHashTree.from_dict(data={'version': 0, 'objects': dict()})
+
+    def test_projects(self):
+        previous = Projects()
+        current = Projects()
+        for projects, app_environments in ((previous, ['sandbox',]), (current, ['sandbox', 'prod'])):
+            for name, environments in (('base', ['sandbox',]), ('app', app_environments)):
+                project = Project(name=name, use_default_scope=False)
+                for environment in environments:
+                    project.add_environment(environment_name=environment)
+                projects.add_project(project=project)
+        diff = diff_configurations(previous=previous, current=current)
+        self.assertEqual(diff.changed, [('Project', 'app'),])
+        self.assertEqual(diff.added + diff.removed, list())
+        with self.assertRaises(Exception):
+            diff_configurations(previous=previous, current=object())
+
+    def test_changed_location(self):
+        test_dir = create_tmp_dir(sub_dir='TestConfigurationDiff')
+        file = create_tmp_file(tmp_dir=test_dir, file_name='app.yaml', data='---\nname: app')
+        location = LocalFileManifestLocation(reference=file, manifest_name='app_location')
+        try:
+            projects = Projects()
+            project = Project(name='app', use_default_scope=False)
+            project.add_manifest_location(location=location)
+            projects.add_project(project=project)
+            previous = get_configuration_hash_tree(configuration=projects)
+            self.assertEqual(previous.get_object_qty(), 2)
+            location.checksum = 'changed'
+            diff = diff_configurations(previous=previous, current=projects)
+            self.assertEqual(diff.changed, [('LocalFileManifestLocation', 'app_location'),])
+        finally:
+            location.cleanup_work_dir()
+            remove_tmp_dir_recursively(dir=test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
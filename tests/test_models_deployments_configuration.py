@@ -256,6 +256,107 @@ class TestProjects(unittest.TestCase):    # pragma: no cover
             self.assertIsInstance(project, Project)
 
 
+class TestProjectsAffectedProjectNames(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.dir_for_test_files = create_tmp_dir(sub_dir='test_affected_projects')
+        self.locations = dict()
+        self.projects = Projects()
+        for name in ('base', 'app', 'web',):
+            file = create_tmp_file(tmp_dir=self.dir_for_test_files, file_name='{}.yaml'.format(name), data='---\nname: {}'.format(name))
+            self.locations[name] = LocalFileManifestLocation(reference=file, manifest_name='{}_location'.format(name))
+            project = Project(name=name, use_default_scope=False)
+            project.add_environment(environment_name='sandbox')
+            project.add_manifest_location(location=self.locations[name])
+            self.projects.add_project(project=project)
+        self.projects.add_link_to_parent_item(parent_item_name='base', sibling_item_name='app')
+        self.projects.add_link_to_parent_item(parent_item_name='app', sibling_item_name='web')
+
+    def tearDown(self):
+        for name, loc in self.locations.items():
+            loc.cleanup_work_dir()
+        remove_tmp_dir_recursively(dir=self.dir_for_test_files)
+
+    def test_get_location_checksums(self):
+        checksums = self.projects.get_location_checksums()
+        self.assertIsInstance(checksums, dict)
+        self.assertEqual(len(checksums), 3)
+        self.assertEqual(checksums['app_location'], self.locations['app'].checksum)
+
+    def test_nothing_changed(self):
+        checksums = self.projects.get_location_checksums()
+        self.assertEqual(self.projects.get_changed_project_names(previous_location_checksums=checksums), [])
+        self.assertEqual(self.projects.get_affected_project_names(environment_name='sandbox', previous_location_checksums=checksums), [])
+
+    def test_no_previous_build_deploys_everything(self):
+        result = self.projects.get_affected_project_names(environment_name='sandbox', previous_location_checksums=dict())
+        self.assertEqual(result, ['base', 'app', 'web'])
+
+    def test_changed_project_and_descendants(self):
+        checksums = self.projects.get_location_checksums()
+        checksums['app_location'] = 'previous-checksum'
+        self.assertEqual(self.projects.get_changed_project_names(previous_location_checksums=checksums), ['app',])
+        result = self.projects.get_affected_project_names(environment_name='sandbox', previous_location_checksums=checksums)
+        self.assertEqual(result, ['app', 'web'])
+
+    def test_changed_project_and_ancestors(self):
+        checksums = self.projects.get_location_checksums()
+        checksums['app_location'] = 'previous-checksum'
+        result = self.projects.get_affected_project_names(environment_name='sandbox', previous_location_checksums=checksums, direction=TraversalDirection.ANCESTORS)
+        self.assertEqual(result, ['base', 'app'])
+
+    def test_shared_location_is_streamed_once(self):
+        self.projects.get_project_by_name(project_name='web').add_manifest_location(location=self.locations['base'])
+        self.assertEqual([location.manifest_name for location in self.projects.iter_locations()], ['base_location', 'app_location', 'web_location'])
+        kinds = [data['kind'] for data in self.projects.iter_documents()]
+        self.assertEqual(kinds.count('LocalFileManifestLocation'), 3)
+        self.assertEqual(kinds.count('Project'), 3)
+        self.assertEqual(str(self.projects).count('name: base_location'), 1)
+        snapshot = self.projects.as_dict()
+        self.assertEqual(list(snapshot['Project'].keys()), ['base', 'app', 'web'])
+        self.assertEqual(sorted(snapshot['LocalFileManifestLocation'].keys()), ['app_location', 'base_location', 'web_location'])
+
+    def test_get_deployment_plans(self):
+        self.projects.get_project_by_name(project_name='web').add_environment(environment_name='prod')
+        self.projects.add_project(project=Project(name='extra', use_default_scope=False))
+        plans = self.projects.get_deployment_plans(environment_names=['sandbox',])
+        self.assertEqual(plans['sandbox']['waves'], [['base'], ['app'], ['web']])
+        with self.assertRaises(Exception):
+            self.projects.get_deployment_plans(environment_names=['sandbox', 'not-an-environment'])
+
+
+class TestProjectsParseDocuments(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.dir_for_test_files = create_tmp_dir(sub_dir='test_projects_parse_documents')
+        self.file = create_tmp_file(tmp_dir=self.dir_for_test_files, file_name='app.yaml', data='---\nname: app')
+        self.documents_consumed = 0
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.dir_for_test_files)
+
+    def _documents(self):
+        # The project comes before its location, which is only linked after the last document
+        for data in (
+            {'kind': 'Project', 'metadata': {'name': 'app', 'environments': ['sandbox',]}, 'spec': {'locations': ['app_location',]}},
+            'not a manifest',
+            {'kind': 'LocalFileManifestLocation', 'metadata': {'name': 'app_location'}, 'spec': {'location': self.file}},
+        ):
+            self.documents_consumed += 1
+            yield data
+
+    def test_documents_are_consumed_from_a_generator(self):
+        projects = Projects()
+        projects.parse_documents(documents=self._documents())
+        self.assertEqual(self.documents_consumed, 3)
+        project = projects.get_project_by_name(project_name='app')
+        self.assertEqual(len(project.locations), 1)
+        self.assertEqual(project.locations[0].manifest_name, 'app_location')
+        self.assertEqual(projects.get_project_names_for_named_environment(environment_name='sandbox'), ['app',])
+        self.assertEqual(len(projects.pending_projects), 0)
+        self.assertEqual(len(projects.location_manifests), 0)
+
+
 class TestLocationClasses(unittest.TestCase):    # pragma: no cover
 
     def setUp(self):
@@ -325,11 +426,12 @@ spec:
         self.assertTrue(len(data) > 0)
         # self.assertTrue(data.startswith('---'))
 
-    def _verify_cleanup(self, loc: ManifestLocation):
+    def _verify_cleanup(self, loc: ManifestLocation, files_are_read_in_place: bool=False):
         files = copy.deepcopy(loc.files)
         loc.cleanup_work_dir()
         for file in files:
-            self.assertFalse(does_file_exists(data_value=file))
+            # Local files that are read in place must never be removed
+            self.assertEqual(does_file_exists(data_value=file), files_are_read_in_place)
         self.assertEqual(len(loc.files), 0)
 
     def _verify_as_dict(self, data: dict, expected_keys:tuple):
@@ -362,8 +464,20 @@ spec:
         for work_file in loc.files:
             print('work file: {}'.format(work_file))
             self._verify_file_exists_and_has_content(work_file=work_file)
+        self.assertEqual(loc.files, [self.file1,])
         self._verify_as_dict(data=loc.as_dict(), expected_keys=('location',))
+        self._verify_cleanup(loc=loc, files_are_read_in_place=True)
+
+    def test_class_LocalFileManifestLocation_isolated(self):
+        loc = LocalFileManifestLocation(reference=self.file1, manifest_name='local_file_test_1', isolate=True)
+        self._verify_init(loc=loc)
+        self.assertEqual(len(loc.files),1)
+        self.assertNotEqual(loc.files[0], self.file1)
+        self._verify_file_exists_and_has_content(work_file=loc.files[0])
+        self.assertEqual(LocalFileManifestLocation(reference=self.file1, manifest_name='local_file_test_1').checksum, loc.checksum)
+        self._verify_as_dict(data=loc.as_dict(), expected_keys=('location', 'isolate',))
         self._verify_cleanup(loc=loc)
+        self.assertTrue(does_file_exists(data_value=self.file1))
 
     def test_class_LocalDirectoryManifestLocation_basic(self):
         loc = LocalDirectoryManifestLocation(reference=self.dir_for_test_files, manifest_name='local_dir_test_1')
@@ -389,7 +503,19 @@ spec:
         for work_file in loc.files:
             print('work file: {}'.format(work_file))
             self._verify_file_exists_and_has_content(work_file=work_file)
+        for work_file in loc.files:
+            self.assertTrue(work_file.startswith(self.dir_for_test_files))
         self._verify_as_dict(data=loc.as_dict(), expected_keys=('location', 'include_file_regex',))
+        self._verify_cleanup(loc=loc, files_are_read_in_place=True)
+
+    def test_class_LocalDirectoryManifestLocation_isolated(self):
+        loc = LocalDirectoryManifestLocation(reference=self.dir_for_test_files, manifest_name='local_dir_test_1', isolate=True)
+        self._verify_init(loc=loc)
+        self.assertEqual(len(loc.files),2)
+        for work_file in loc.files:
+            self.assertFalse(work_file.startswith(self.dir_for_test_files))
+            self._verify_file_exists_and_has_content(work_file=work_file)
+        self._verify_as_dict(data=loc.as_dict(), expected_keys=('location', 'include_file_regex', 'isolate',))
         self._verify_cleanup(loc=loc)
 
     def test_class_FileUrlManifestLocation_basic(self):
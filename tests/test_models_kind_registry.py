@@ -0,0 +1,104 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.models.kind_registry import *
+from verbacratis.models.systems_configuration import SystemConfigurations, UnixInfrastructureAccount, system_kind_registry
+
+
+class PluginSecret:    # pragma: no cover
+
+    def __init__(self, name: str, value: str):
+        self.name = name
+        self.value = value
+
+
+def create_plugin_secret(collection: object, data: dict)->PluginSecret:   # pragma: no cover
+    return PluginSecret(name=data['metadata']['name'], value=data['spec']['value'])
+
+
+class Bucketed:    # pragma: no cover
+
+    def __init__(self):
+        self.buckets = dict()
+
+    def store_kind_item(self, bucket: str, name: str, item: object):
+        if bucket not in self.buckets:
+            self.buckets[bucket] = dict()
+        self.buckets[bucket][name] = item
+
+
+class TestKindRegistry(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.registry = KindRegistry()
+        self.registry.register(kind='PluginSecret', factory=create_plugin_secret, bucket='PluginSecret', name_accessor=get_item_name, item_class=PluginSecret)
+
+    def test_kinds_are_matched_without_regard_to_case(self):
+        self.assertIsNotNone(self.registry.get(kind='pluginsecret'))
+        self.assertIs(self.registry.get(kind='PLUGINSECRET'), self.registry.get(kind='PluginSecret'))
+        self.assertIsNone(self.registry.get(kind='Other'))
+        self.assertIsNone(self.registry.get(kind=None))
+
+    def test_create_keeps_the_object_in_its_bucket(self):
+        collection = Bucketed()
+        item = self.registry.create(collection=collection, data={'kind': 'pluginSecret', 'metadata': {'name': 'token'}, 'spec': {'value': 'abc'}})
+        self.assertIsInstance(item, PluginSecret)
+        self.assertIs(collection.buckets['PluginSecret']['token'], item)
+        self.assertEqual(self.registry.get_for_item(item=item).bucket, 'PluginSecret')
+
+    def test_unknown_kind_creates_nothing(self):
+        collection = Bucketed()
+        self.assertIsNone(self.registry.create(collection=collection, data={'kind': 'Other'}))
+        self.assertIsNone(self.registry.create(collection=collection, data={'no-kind': True}))
+        self.assertEqual(collection.buckets, dict())
+
+    def test_get_buckets_in_registration_order(self):
+        self.registry.register(kind='Other', factory=create_plugin_secret, bucket='Other')
+        self.registry.register(kind='Another', factory=create_plugin_secret)
+        self.assertEqual(self.registry.get_buckets(), ['PluginSecret', 'Other'])
+
+
+class TestSystemConfigurationsWithPluginKind(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.registry = KindRegistry()
+        for definition in system_kind_registry.definitions.values():
+            self.registry.register(kind=definition.kind, factory=definition.factory, bucket=definition.bucket, name_accessor=definition.name_accessor, item_class=definition.item_class)
+        self.registry.register(kind='PluginSecret', factory=create_plugin_secret, bucket='PluginSecret', name_accessor=get_item_name, item_class=PluginSecret)
+
+    def test_plugin_kind_is_parsed(self):
+        system_configurations = SystemConfigurations(kind_registry=self.registry)
+        system_configurations.parse_documents(documents=[{'Kind': 'PluginSecret', 'metadata': {'name': 'token'}, 'spec': {'value': 'abc'}},])
+        self.assertEqual(system_configurations.parsed_configuration['PluginSecret']['token'].value, 'abc')
+        self.assertTrue('deployment-host' in system_configurations.parsed_configuration['UnixInfrastructureAccount'])
+
+    def test_add_configuration_uses_the_class_of_the_item(self):
+        system_configurations = SystemConfigurations(kind_registry=self.registry)
+        system_configurations.add_configuration(item=PluginSecret(name='other', value='def'))
+        system_configurations.add_configuration(item=UnixInfrastructureAccount(account_name='test-host'))
+        self.assertTrue('other' in system_configurations.parsed_configuration['PluginSecret'])
+        self.assertTrue('test-host' in system_configurations.parsed_configuration['UnixInfrastructureAccount'])
+        with self.assertRaises(Exception):
+            system_configurations.add_configuration(item=object())
+
+    def test_default_registry_does_not_know_plugin_kind(self):
+        system_configurations = SystemConfigurations()
+        system_configurations.parse_documents(documents=[{'kind': 'PluginSecret', 'metadata': {'name': 'token'}, 'spec': {'value': 'abc'}},])
+        self.assertFalse('PluginSecret' in system_configurations.parsed_configuration)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.models.manifest_bundle import *
+from verbacratis.models.runtime_configuration import ApplicationState
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
+
+
+SYSTEM_MANIFEST = """---
+apiVersion: v1-alpha
+kind: SshCredentialsBasedAuthenticationConfig
+metadata:
+  name: deploy@sandbox.example.tld
+spec:
+  authenticationType: password
+  password: secret
+---
+apiVersion: v1-alpha
+kind: UnixInfrastructureAccount
+metadata:
+  name: sandbox-host
+  environments:
+  - sandbox
+spec:
+  provider: RunOnRemoteHost
+  authentication:
+    type: SshCredentialsBasedAuthenticationConfig
+    authenticationReference: deploy@sandbox.example.tld
+"""
+
+
+class TestManifestBundle(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.test_dir = create_tmp_dir(sub_dir='TestManifestBundle')
+        self.bundle_file = '{}{}manifests.bundle'.format(self.test_dir, os.sep)
+        self.system_file = '{}{}system.yaml'.format(self.test_dir, os.sep)
+        with open(self.system_file, 'w') as f:
+            f.write(SYSTEM_MANIFEST)
+        self.project_file = '{}{}project.yaml'.format(self.test_dir, os.sep)
+        with open(self.project_file, 'w') as f:
+            f.write("""---
+apiVersion: v1-alpha
+kind: LocalFileManifestLocation
+metadata:
+  name: app-location
+spec:
+  location: {}
+---
+apiVersion: v1-alpha
+kind: Project
+metadata:
+  name: app
+  environments:
+  - sandbox
+spec:
+  locations:
+  - app-location
+""".format(self.project_file))
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.test_dir)
+
+    def _get_state(self)->ApplicationState:
+        state = ApplicationState()
+        state.environments = ['sandbox',]
+        state.system_manifest_locations = [self.system_file,]
+        state.project_manifest_locations = [self.project_file,]
+        return state
+
+    def test_compiled_bundle_loads_without_parsing_the_locations(self):
+        compiled_state = self._get_state()
+        bundle = compiled_state.compile_bundle(bundle_file=self.bundle_file)
+        self.assertEqual(read_bundle_header(bundle_file=self.bundle_file)['sourceChecksum'], bundle.source_checksum)
+        self.assertEqual(sorted(bundle.source_fingerprints.keys()), ['location:app-location', 'project:{}'.format(self.project_file), 'system:{}'.format(self.system_file)])
+
+        state = self._get_state()
+        state.bundle_file = self.bundle_file
+        state.load_manifests()
+        system_configurations = state.application_configuration.system_configurations
+        self.assertEqual(str(system_configurations), str(compiled_state.application_configuration.system_configurations))
+        account = system_configurations.get_configuration_instance(class_type_name='UnixInfrastructureAccount', instance_name='sandbox-host')
+        self.assertIs(account.authentication_config, system_configurations.get_configuration_instance(class_type_name='SshCredentialsBasedAuthenticationConfig', instance_name='deploy@sandbox.example.tld'))
+        projects = state.application_configuration.projects
+        self.assertEqual(list(projects.items.keys()), ['app',])
+        self.assertEqual(projects.get_location_checksums(), bundle.location_checksums)
+        self.assertEqual(projects.get_deployment_plans(environment_names=['sandbox',])['sandbox']['waves'], [['app'],])
+
+    def test_stale_bundle(self):
+        bundle = self._get_state().compile_bundle(bundle_file=self.bundle_file)
+        self.assertFalse(bundle.is_stale(system_manifest_locations=[self.system_file,], project_manifest_locations=[self.project_file,]))
+        self.assertTrue(bundle.is_stale(system_manifest_locations=[self.system_file,], project_manifest_locations=list()))
+        self.assertTrue(bundle.is_stale(system_manifest_locations=[self.system_file,], project_manifest_locations=[self.project_file,], location_checksums={'app-location': 'changed'}))
+
+        # A state with other locations loads the locations instead
+        state = self._get_state()
+        state.system_manifest_locations = list()
+        self.assertFalse(state.load_bundle(bundle_file=self.bundle_file))
+
+    def test_changed_source_content_makes_the_bundle_stale(self):
+        self._get_state().compile_bundle(bundle_file=self.bundle_file)
+        self.assertTrue(self._get_state().load_bundle(bundle_file=self.bundle_file))
+        with open(self.system_file, 'w') as f:
+            f.write(SYSTEM_MANIFEST.replace('password: secret', 'password: changed-secret'))
+        self.assertFalse(self._get_state().load_bundle(bundle_file=self.bundle_file))
+
+        # A removed source cannot be fingerprinted, so the bundle is not used either
+        self._get_state().compile_bundle(bundle_file=self.bundle_file)
+        os.remove(self.system_file)
+        self.assertFalse(self._get_state().load_bundle(bundle_file=self.bundle_file))
+
+    def test_changed_project_location_makes_the_bundle_stale(self):
+        bundle = self._get_state().compile_bundle(bundle_file=self.bundle_file)
+        with open(self.project_file, 'a') as f:
+            f.write('  - app-location\n')
+        fingerprints = get_source_fingerprints(system_manifest_locations=[self.system_file,], project_manifest_locations=[self.project_file,], projects=bundle.projects)
+        self.assertNotEqual(fingerprints['location:app-location'], bundle.source_fingerprints['location:app-location'])
+        self.assertTrue(bundle.is_stale(system_manifest_locations=[self.system_file,], project_manifest_locations=[self.project_file,], source_fingerprints=fingerprints))
+        self.assertFalse(self._get_state().load_bundle(bundle_file=self.bundle_file))
+
+    def test_damaged_bundle_is_not_loaded(self):
+        self._get_state().compile_bundle(bundle_file=self.bundle_file)
+        with open(self.bundle_file, 'rb') as f:
+            data = f.read()
+        with open(self.bundle_file, 'wb') as f:
+            f.write(data[:-10])
+        with self.assertRaises(Exception) as cm:
+            load_bundle(bundle_file=self.bundle_file)
+        self.assertTrue('damaged' in str(cm.exception))
+        self.assertFalse(self._get_state().load_bundle(bundle_file=self.bundle_file))
+
+        with open(self.bundle_file, 'wb') as f:
+            f.write(SYSTEM_MANIFEST.encode('utf-8'))
+        with self.assertRaises(Exception):
+            read_bundle_header(bundle_file=self.bundle_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
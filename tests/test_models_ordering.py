@@ -15,7 +15,7 @@ import unittest
 
 
 from verbacratis.models import GenericLogger
-from verbacratis.models.ordering import Item, Items, get_ordered_item_list_for_named_scope
+from verbacratis.models.ordering import Item, Items, CompactItemGraph, TraversalDirection, get_ordered_item_list_for_named_scope
 
 
 class Dummy:
@@ -260,5 +260,217 @@ class TestFunctionGetOrderedItemListForNamedScope(unittest.TestCase):    # pragm
         self.assertEqual(result[1], 'item1')
 
 
+    def test_missing_parent_raises_exception(self):
+        items = Items()
+        items.add_item(item=Item(name='item1'))
+        items.add_item_scope(item_name='item1', scope_name='scope1')
+        items.get_item_by_name(name='item1').add_parent_item_name(parent_item_name='not-an-item')
+        with self.assertRaises(Exception) as context:
+            get_ordered_item_list_for_named_scope(items=items, scope_name='scope1', start_item=items.get_item_by_name(name='item1'))
+        self.assertTrue('Item named "not-an-item" not found' in str(context.exception))
+
+    def test_default_ordered_item_names_are_not_shared(self):
+        items = Items()
+        items.add_item(item=Item(name='item1'))
+        items.add_item_scope(item_name='item1', scope_name='scope1')
+        result = get_ordered_item_list_for_named_scope(items=items, scope_name='scope1', start_item=items.get_item_by_name(name='item1'))
+        self.assertEqual(result, ['item1',])
+        self.assertEqual(get_ordered_item_list_for_named_scope(items=items, scope_name='scope1', start_item=items.get_item_by_name(name='item1')), ['item1',])
+
+
+class TestItemsMethodGetAffectedItemNames(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        # item4 is the root, item2 and item3 depends on item4 and item1 depends on item2 and item3. item5 is only in scope2
+        self.items = Items()
+        for name in ('item1', 'item2', 'item3', 'item4',):
+            self.items.add_item(item=Item(name=name))
+            self.items.add_item_scope(item_name=name, scope_name='scope1')
+        self.items.add_item(item=Item(name='item5'))
+        self.items.add_item_scope(item_name='item5', scope_name='scope2')
+        self.items.add_item_scope(item_name='item1', scope_name='scope2')
+        self.items.add_link_to_parent_item(sibling_item_name='item1', parent_item_name='item2')
+        self.items.add_link_to_parent_item(sibling_item_name='item1', parent_item_name='item3')
+        self.items.add_link_to_parent_item(sibling_item_name='item2', parent_item_name='item4')
+        self.items.add_link_to_parent_item(sibling_item_name='item3', parent_item_name='item4')
+
+    def test_get_child_item_names_map(self):
+        result = self.items.get_child_item_names_map()
+        self.assertIsInstance(result, dict)
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result['item4'], ['item2', 'item3'])
+        self.assertEqual(result['item2'], ['item1'])
+        self.assertEqual(result['item1'], [])
+
+    def test_descendants_of_root(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item4',])
+        self.assertEqual(result, ['item4', 'item2', 'item3', 'item1'])
+
+    def test_descendants_of_branch(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item3',])
+        self.assertEqual(result, ['item3', 'item1'])
+
+    def test_descendants_of_leaf(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item1',])
+        self.assertEqual(result, ['item1',])
+
+    def test_ancestors_of_leaf(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item1',], direction=TraversalDirection.ANCESTORS)
+        self.assertEqual(result, ['item4', 'item2', 'item3', 'item1'])
+
+    def test_ancestors_of_branch(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item2',], direction=TraversalDirection.ANCESTORS)
+        self.assertEqual(result, ['item4', 'item2'])
+
+    def test_multiple_changed_items(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item3', 'item2',])
+        self.assertEqual(result, ['item2', 'item3', 'item1'])
+
+    def test_items_out_of_scope_are_ignored(self):
+        result = self.items.get_affected_item_names(scope_name='scope2', changed_item_names=['item4', 'item5',])
+        self.assertEqual(result, ['item5',])
+        result = self.items.get_affected_item_names(scope_name='scope2', changed_item_names=['item1',], direction=TraversalDirection.ANCESTORS)
+        self.assertEqual(result, ['item1',])
+
+    def test_no_changes(self):
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=[])
+        self.assertEqual(result, [])
+
+    def test_circular_references_are_included(self):
+        self.items.add_link_to_parent_item(sibling_item_name='item4', parent_item_name='item1')
+        result = self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item3',])
+        self.assertEqual(len(result), 4)
+        for name in ('item1', 'item2', 'item3', 'item4',):
+            self.assertTrue(name in result)
+
+    def test_unknown_item_raises_exception(self):
+        with self.assertRaises(Exception) as context:
+            self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item9',])
+        self.assertTrue('Item named "item9" not found' in str(context.exception))
+
+    def test_invalid_direction_raises_exception(self):
+        with self.assertRaises(Exception) as context:
+            self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item1',], direction=99)
+        self.assertTrue('Traversal direction "99" not recognized' in str(context.exception))
+
+
+class TestItemsMethodGetPlansForScopes(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        # base <- app <- web, with base and web in sandbox and prod, app only in sandbox, and tool only in prod
+        self.items = Items()
+        for name, scopes in (('base', ['sandbox', 'prod']), ('app', ['sandbox']), ('web', ['sandbox', 'prod']), ('tool', ['prod'])):
+            self.items.add_item(item=Item(name=name, use_default_scope=False))
+            for scope_name in scopes:
+                self.items.add_item_scope(item_name=name, scope_name=scope_name)
+        self.items.add_link_to_parent_item(parent_item_name='base', sibling_item_name='app')
+        self.items.add_link_to_parent_item(parent_item_name='app', sibling_item_name='web')
+
+    def test_plans_for_multiple_scopes(self):
+        plans = self.items.get_plans_for_scopes(scope_names=['sandbox', 'prod'])
+        self.assertEqual(sorted(plans.keys()), ['prod', 'sandbox'])
+        self.assertEqual(plans['sandbox']['waves'], [['base'], ['app'], ['web']])
+        self.assertEqual(plans['sandbox']['order'], ['base', 'app', 'web'])
+        self.assertEqual(plans['prod']['waves'], [['base', 'web', 'tool']])
+        self.assertEqual(plans['prod']['circular'], [])
+
+    def test_plans_match_single_scope_ordering(self):
+        plans = self.items.get_plans_for_scopes(scope_names=['sandbox', 'prod'])
+        for scope_name in ('sandbox', 'prod'):
+            all_names = [name for name, item in self.items.items.items() if scope_name in item.scopes]
+            self.assertEqual(sorted(plans[scope_name]['order']), sorted(self.items.get_affected_item_names(scope_name=scope_name, changed_item_names=all_names)))
+
+    def test_unknown_scope_has_empty_plan(self):
+        plans = self.items.get_plans_for_scopes(scope_names=['does-not-exist'])
+        self.assertEqual(plans['does-not-exist'], {'order': [], 'waves': [], 'circular': []})
+
+    def test_circular_reference_only_affects_its_scope(self):
+        self.items.add_item(item=Item(name='loop', use_default_scope=False))
+        self.items.add_item_scope(item_name='loop', scope_name='sandbox')
+        self.items.add_link_to_parent_item(parent_item_name='web', sibling_item_name='loop')
+        self.items.add_link_to_parent_item(parent_item_name='loop', sibling_item_name='app')
+        plans = self.items.get_plans_for_scopes(scope_names=['sandbox', 'prod'])
+        self.assertEqual(plans['sandbox']['waves'], [['base']])
+        self.assertEqual(plans['sandbox']['circular'], ['app', 'web', 'loop'])
+        self.assertEqual(plans['sandbox']['order'], ['base', 'app', 'web', 'loop'])
+        self.assertEqual(plans['prod']['waves'], [['base', 'web', 'tool']])
+
+
+class TestCompactItemGraph(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.items = Items()
+        for name in ('item1', 'item2', 'item3', 'item4',):
+            self.items.add_item(item=Item(name=name))
+            self.items.add_item_scope(item_name=name, scope_name='scope1')
+        self.items.add_item_scope(item_name='item4', scope_name='scope2', replace_default_if_exists=False)
+        self.items.add_link_to_parent_item(sibling_item_name='item1', parent_item_name='item2')
+        self.items.add_link_to_parent_item(sibling_item_name='item1', parent_item_name='item3')
+        self.items.add_link_to_parent_item(sibling_item_name='item2', parent_item_name='item4')
+
+    def test_node_ids_follow_insertion_order(self):
+        graph = CompactItemGraph(items=self.items)
+        self.assertEqual(graph.names, ['item1', 'item2', 'item3', 'item4'])
+        self.assertEqual(graph.ids['item3'], 2)
+
+    def test_parent_and_child_links(self):
+        graph = CompactItemGraph(items=self.items)
+        self.assertEqual(list(graph.get_parent_ids(node_id=0)), [1, 2])
+        self.assertEqual(list(graph.get_parent_ids(node_id=3)), [])
+        self.assertEqual(list(graph.get_child_ids(node_id=3)), [1])
+        self.assertEqual(list(graph.get_child_ids(node_id=1)), [0])
+        self.assertEqual(len(graph.parent_offsets), 5)
+        self.assertEqual(len(graph.child_offsets), 5)
+
+    def test_scope_membership(self):
+        graph = CompactItemGraph(items=self.items)
+        self.assertTrue(graph.is_in_scope(node_id=3, scope_name='scope2'))
+        self.assertFalse(graph.is_in_scope(node_id=0, scope_name='scope2'))
+        self.assertFalse(graph.is_in_scope(node_id=0, scope_name='no-such-scope'))
+        self.assertEqual(graph.get_scope_node_ids(scope_name='scope1'), [0, 1, 2, 3])
+
+    def test_missing_parent_names_are_recorded(self):
+        self.items.items['item3'].add_parent_item_name(parent_item_name='not-an-item')
+        self.items.invalidate_compact_graph()
+        graph = self.items.get_compact_graph()
+        self.assertEqual(graph.missing_parent_names, {2: ['not-an-item',]})
+        with self.assertRaises(Exception) as context:
+            self.items.get_affected_item_names(scope_name='scope1', changed_item_names=['item1',], direction=TraversalDirection.ANCESTORS)
+        self.assertTrue('Item named "not-an-item" not found' in str(context.exception))
+
+    def test_graph_is_cached_and_invalidated_on_change(self):
+        graph1 = self.items.get_compact_graph()
+        self.assertIs(graph1, self.items.get_compact_graph())
+        self.items.add_item(item=Item(name='item5'))
+        graph2 = self.items.get_compact_graph()
+        self.assertIsNot(graph1, graph2)
+        self.assertEqual(len(graph2.names), 5)
+
+    def test_graph_is_invalidated_by_item_changes(self):
+        graph1 = self.items.get_compact_graph()
+        self.items.get_item_by_name(name='item3').add_parent_item_name(parent_item_name='item4')
+        graph2 = self.items.get_compact_graph()
+        self.assertIsNot(graph1, graph2)
+        self.assertEqual(list(graph2.get_parent_ids(node_id=2)), [3])
+        self.items.get_item_by_name(name='item1').add_scope(scope_name='scope2')
+        graph3 = self.items.get_compact_graph()
+        self.assertTrue(graph3.is_in_scope(node_id=0, scope_name='scope2'))
+        self.items.get_item_by_name(name='item1').add_scope(scope_name='scope2')
+        self.assertIs(graph3, self.items.get_compact_graph())
+
+    def test_get_ancestor_ids_parents_first(self):
+        graph = self.items.get_compact_graph()
+        self.assertEqual(graph.get_ancestor_ids_parents_first(start_id=0, scope_name='scope1'), [3, 1, 2, 0])
+        self.assertEqual(graph.get_ancestor_ids_parents_first(start_id=0, scope_name='scope1', visited_ids=[1,]), [2, 0])
+        self.assertEqual(graph.get_ancestor_ids_parents_first(start_id=0, scope_name='scope2'), [])
+
+    def test_order_ids_parents_first_with_circular_reference(self):
+        self.items.add_link_to_parent_item(sibling_item_name='item4', parent_item_name='item1')
+        graph = self.items.get_compact_graph()
+        ordered_ids, circular_ids = graph.order_ids_parents_first(node_ids=[0, 1, 2, 3])
+        self.assertEqual(ordered_ids, [2])
+        self.assertEqual(circular_ids, [0, 1, 3])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -8,6 +8,8 @@
 
 import sys
 import os
+import io
+import json
 import tempfile
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
 print('sys.path={}'.format(sys.path))
@@ -17,6 +19,7 @@ import unittest
 
 from verbacratis.models.runtime_configuration import *
 from verbacratis.utils.file_io import remove_tmp_dir_recursively, create_tmp_dir
+from verbacratis.utils.git_mirror_cache import GitMirrorCache
 
 
 class TestClassStateStore(unittest.TestCase):    # pragma: no cover
@@ -87,6 +90,97 @@ class TestApplicationState(unittest.TestCase):    # pragma: no cover
         self.assertTrue(len(result.application_configuration.raw_global_configuration ) > 10)
 
 
+class TestApplicationStateLoadManifests(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.test_dir = create_tmp_dir(sub_dir='TestApplicationStateLoadManifests')
+        self.project_files = list()
+        for name, parent in (('base', None), ('app', 'base')):
+            file_path = '{}{}{}.yaml'.format(self.test_dir, os.sep, name)
+            data = """---
+apiVersion: v1-alpha
+kind: LocalFileManifestLocation
+metadata:
+  name: {name}-location
+spec:
+  location: {file_path}
+---
+apiVersion: v1-alpha
+kind: Project
+metadata:
+  name: {name}
+  environments:
+  - sandbox
+spec:
+  locations:
+  - {name}-location
+""".format(name=name, file_path=file_path)
+            if parent is not None:
+                data = '{}  parentProjects:\n  - {}\n'.format(data, parent)
+            with open(file_path, 'w') as f:
+                f.write(data)
+            self.project_files.append(file_path)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.test_dir)
+
+    def test_load_project_manifests_from_multiple_locations(self):
+        state = ApplicationState()
+        state.project_manifest_locations = self.project_files
+        state.load_project_manifests()
+        projects = state.application_configuration.projects
+        self.assertEqual(list(projects.items.keys()), ['base', 'app'])
+        self.assertEqual(projects.get_project_by_name(project_name='app').parent_item_names, ['base',])
+        self.assertEqual(projects.get_deployment_plans(environment_names=['sandbox',])['sandbox']['waves'], [['base'], ['app']])
+
+    def test_load_project_manifests_stops_when_cancelled(self):
+        state = ApplicationState()
+        state.project_manifest_locations = self.project_files
+        state.build_context.cancel()
+        with self.assertRaises(Exception):
+            state.load_project_manifests()
+
+    def test_each_load_lists_the_remote_branches_again(self):
+        state = ApplicationState()
+        state.project_manifest_locations = self.project_files
+        state.git_mirror_cache = GitMirrorCache(cache_dir=self.test_dir)
+        state.build_context.remote_refs['https://git.example.invalid/manifests.git'] = {'refs/heads/main': 'a' * 40}
+        state.git_mirror_cache.updated_branches.add(('https://git.example.invalid/manifests.git', 'main'))
+        state.load_manifests()
+        self.assertEqual(state.build_context.remote_refs, dict())
+        self.assertEqual(state.git_mirror_cache.updated_branches, set())
+        self.assertEqual(list(state.application_configuration.projects.items.keys()), ['base', 'app'])
+
+    def test_export_configuration(self):
+        state = ApplicationState()
+        state.project_manifest_locations = self.project_files
+        state.load_project_manifests()
+        stream = io.StringIO()
+        state.export_configuration(stream=stream, output_format='json')
+        documents = json.loads(stream.getvalue())
+        self.assertEqual([data['metadata']['name'] for data in documents if data['kind'] == 'Project'], ['base', 'app'])
+        self.assertEqual(len([data for data in documents if data['kind'] == 'LocalFileManifestLocation']), 2)
+
+    def test_export_configuration_of_targeted_environments(self):
+        state = ApplicationState()
+        state.environments = ['sandbox',]
+        system_configurations = state.application_configuration.system_configurations
+        system_configurations.set_target_environments(environments=state.environments)
+        system_configurations.parse_documents(documents=[
+            {'apiVersion': 'v1-alpha', 'kind': 'UnixInfrastructureAccount', 'metadata': {'name': '{}-host'.format(environment), 'environments': [environment,]}, 'spec': {'provider': 'RunOnLocalhost'}}
+            for environment in ('sandbox', 'prod')
+        ])
+        stream = io.StringIO()
+        state.export_configuration(stream=stream, output_format='json')
+        names = [data['metadata']['name'] for data in json.loads(stream.getvalue()) if data['kind'] == 'UnixInfrastructureAccount']
+        self.assertEqual(names, ['deployment-host', 'sandbox-host'])
+        self.assertTrue('prod-host' in system_configurations.deferred_documents['UnixInfrastructureAccount'])
+
+        stream = io.StringIO()
+        state.export_configuration(stream=stream, output_format='json', all_environments=True)
+        names = [data['metadata']['name'] for data in json.loads(stream.getvalue()) if data['kind'] == 'UnixInfrastructureAccount']
+        self.assertEqual(names, ['deployment-host', 'sandbox-host', 'prod-host'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -656,5 +656,129 @@ class TestAllFunctions(unittest.TestCase):  # pragma: no cover
         self.assertFalse('sandbox2' in test_conf.environments)
 
 
+class TestSystemConfigurationsIndexes(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.system_configuration = SystemConfigurations()
+        self.system_configuration.add_configuration(item=AwsInfrastructureAccount(account_name='shared', environments=['sandbox', 'prod']))
+        self.system_configuration.add_configuration(item=UnixInfrastructureAccount(account_name='shared', environments=['sandbox',]))
+        self.system_configuration.add_configuration(item=UnixInfrastructureAccount(account_name='build', environments=['test', 'test']))
+
+    def test_accounts_by_name(self):
+        accounts = self.system_configuration.get_infrastructure_account_auth_config(infrastructure_account_name='shared')
+        self.assertEqual([account['ObjectClassType'] for account in accounts], ['UnixInfrastructureAccount', 'AwsInfrastructureAccount'])
+        accounts = self.system_configuration.get_infrastructure_account_auth_config(infrastructure_account_name='shared', search_scope=('AwsInfrastructureAccount',))
+        self.assertEqual(len(accounts), 1)
+        self.assertEqual(self.system_configuration.get_infrastructure_account_auth_config(infrastructure_account_name='unknown'), list())
+
+    def test_accounts_by_environment(self):
+        accounts = self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='sandbox')
+        self.assertEqual([account['ObjectClassType'] for account in accounts], ['UnixInfrastructureAccount', 'AwsInfrastructureAccount'])
+        self.assertEqual(len(self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='test')), 1)
+        self.assertEqual(self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='unknown'), list())
+        self.assertEqual(self.system_configuration.get_all_environments(), ('default', 'sandbox', 'prod', 'test'))
+
+    def test_replaced_account_is_reindexed(self):
+        self.system_configuration.add_configuration(item=AwsInfrastructureAccount(account_name='shared', environments=['sandbox',]))
+        self.assertEqual(self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='prod'), list())
+        self.assertFalse('prod' in self.system_configuration.get_all_environments())
+        self.assertEqual(len(self.system_configuration.get_infrastructure_account_auth_config(infrastructure_account_name='shared')), 2)
+
+    def test_set_account_environments(self):
+        account = self.system_configuration.get_configuration_instance(class_type_name='UnixInfrastructureAccount', instance_name='build')
+        self.system_configuration.set_account_environments(account=account, environments=['prod',])
+        self.assertEqual(account.environments, ['prod',])
+        self.assertFalse('test' in self.system_configuration.get_all_environments())
+        accounts = self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='prod')
+        self.assertEqual(len(accounts), 2)
+        self.assertTrue(account in [account_data['ObjectInstance'] for account_data in accounts])
+
+    def test_local_deployment_host_gets_all_environments(self):
+        self.system_configuration.update_local_deployment_host_with_all_environments()
+        accounts = self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='test')
+        self.assertTrue('deployment-host' in [account_data['ObjectInstance'].account_name for account_data in accounts])
+
+
+class TestSystemConfigurationsTargetEnvironments(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.documents = list()
+        for environment in ('sandbox', 'test', 'prod'):
+            self.documents.append({
+                'apiVersion': 'v1-alpha',
+                'kind': 'SshCredentialsBasedAuthenticationConfig',
+                'metadata': {'name': 'deploy@{}.example.tld'.format(environment)},
+                'spec': {'authenticationType': 'password', 'password': 'secret'},
+            })
+            self.documents.append({
+                'apiVersion': 'v1-alpha',
+                'kind': 'UnixInfrastructureAccount',
+                'metadata': {'name': '{}-host'.format(environment), 'environments': [environment,]},
+                'spec': {'provider': 'RunOnRemoteHost', 'authentication': {'type': 'SshCredentialsBasedAuthenticationConfig', 'authenticationReference': 'deploy@{}.example.tld'.format(environment)}},
+            })
+        self.system_configuration = SystemConfigurations(target_environments=['sandbox',])
+        self.system_configuration.parse_documents(documents=self.documents)
+
+    def test_only_target_environment_objects_are_created(self):
+        self.assertEqual(list(self.system_configuration.parsed_configuration['UnixInfrastructureAccount'].keys()), ['deployment-host', 'sandbox-host'])
+        self.assertEqual(list(self.system_configuration.parsed_configuration['SshCredentialsBasedAuthenticationConfig'].keys()), ['deploy@sandbox.example.tld',])
+        account = self.system_configuration.parsed_configuration['UnixInfrastructureAccount']['sandbox-host']
+        self.assertIsInstance(account.authentication_config, SshCredentialsBasedAuthenticationConfig)
+        self.assertEqual(sorted(self.system_configuration.deferred_documents['UnixInfrastructureAccount'].keys()), ['prod-host', 'test-host'])
+
+    def test_environments_include_kept_accounts(self):
+        self.assertEqual(sorted(self.system_configuration.get_all_environments()), ['default', 'prod', 'sandbox', 'test'])
+        self.assertEqual(len(self.system_configuration.get_infrastructure_account_names()), 8)
+
+    def test_objects_are_created_on_demand(self):
+        accounts = self.system_configuration.get_infrastructure_Accounts_for_named_environment(environment_name='prod')
+        self.assertEqual(sorted([account['ObjectInstance'].account_name for account in accounts]), ['deployment-host', 'prod-host'])
+        self.assertEqual(accounts[-1]['ObjectInstance'].authentication_config.name, 'deploy@prod.example.tld')
+        self.assertFalse('deploy@prod.example.tld' in self.system_configuration.deferred_documents.get('SshCredentialsBasedAuthenticationConfig', dict()))
+
+        accounts = self.system_configuration.get_infrastructure_account_auth_config(infrastructure_account_name='test-host')
+        self.assertEqual(len(accounts), 1)
+        self.assertEqual(self.system_configuration.deferred_documents, dict())
+        self.assertEqual(self.system_configuration.deferred_accounts_by_environment, dict())
+
+    def test_same_result_as_creating_all_objects(self):
+        system_configuration = SystemConfigurations()
+        system_configuration.parse_documents(documents=self.documents)
+        self.assertEqual(str(self.system_configuration), str(system_configuration))
+
+    def test_widening_the_target_environments_creates_kept_accounts(self):
+        self.system_configuration.set_target_environments(environments=['sandbox', 'test'])
+        self.assertTrue('test-host' in self.system_configuration.parsed_configuration['UnixInfrastructureAccount'])
+        self.assertFalse('prod-host' in self.system_configuration.parsed_configuration['UnixInfrastructureAccount'])
+
+    def test_replaced_document_is_not_created_twice(self):
+        document = dict(self.documents[-1])
+        document['metadata'] = {'name': 'prod-host', 'environments': ['sandbox',]}
+        self.system_configuration.parse_documents(documents=[document,])
+        self.assertTrue('prod-host' in self.system_configuration.parsed_configuration['UnixInfrastructureAccount'])
+        self.assertFalse('prod' in self.system_configuration.deferred_accounts_by_environment)
+
+
+    def test_documents_are_streamed_once_per_object(self):
+        result = str(self.system_configuration)
+        self.assertEqual(result.count('name: deploy@prod.example.tld'), 1)
+        self.assertEqual(result.count('\n---\n') + 1, len(list(self.system_configuration.iter_documents())))
+        snapshot = self.system_configuration.as_dict()
+        self.assertEqual(sorted(snapshot['UnixInfrastructureAccount'].keys()), ['deployment-host', 'prod-host', 'sandbox-host', 'test-host'])
+        self.assertEqual(snapshot['SshCredentialsBasedAuthenticationConfig']['deploy@test.example.tld']['metadata']['name'], 'deploy@test.example.tld')
+
+    def test_documents_of_target_environments_only(self):
+        names = [data['metadata']['name'] for data in self.system_configuration.iter_documents(environments=['sandbox',])]
+        self.assertEqual(sorted(names), ['deploy@sandbox.example.tld', 'deployment-host', 'no-auth', 'sandbox-host'])
+        self.assertEqual(sorted(self.system_configuration.deferred_documents['UnixInfrastructureAccount'].keys()), ['prod-host', 'test-host'])
+        snapshot = self.system_configuration.as_dict(environments=['sandbox',])
+        self.assertEqual(sorted(snapshot['UnixInfrastructureAccount'].keys()), ['deployment-host', 'sandbox-host'])
+
+        # Objects that were all created, for example from a bundle, are filtered the same way
+        system_configuration = SystemConfigurations()
+        system_configuration.parse_documents(documents=self.documents)
+        self.assertEqual(list(system_configuration.iter_documents(environments=['sandbox',])), list(self.system_configuration.iter_documents(environments=['sandbox',])))
+
+
 if __name__ == '__main__':
     unittest.main()
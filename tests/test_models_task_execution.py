@@ -0,0 +1,188 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.models.task_execution import *
+from verbacratis.utils.parser import parse_configuration_file, validate_configuration
+
+
+def build_configuration(tasks: dict, deployments: dict)->dict:
+    configuration = {'tasks': list(), 'deployments': list()}
+    for task_name, task_depends_on in tasks.items():
+        configuration['tasks'].append({'name': task_name, 'taskDependsOn': task_depends_on})
+    for deployment_name, deployment_data in deployments.items():
+        deployment_tasks, depends_on_profile = deployment_data
+        configuration['deployments'].append({'name': deployment_name, 'tasks': deployment_tasks, 'dependsOnProfile': depends_on_profile})
+    return configuration
+
+
+class RecordingTaskRunner:
+
+    def __init__(self, failing_task_names: list=list(), delay: float=0.0):
+        self.failing_task_names = failing_task_names
+        self.delay = delay
+        self.started_task_names = list()
+        self.running_qty = 0
+        self.max_running_qty = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, task_name: str, task_configuration: dict):
+        with self.lock:
+            self.started_task_names.append(task_name)
+            self.running_qty += 1
+            self.max_running_qty = max(self.max_running_qty, self.running_qty)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running_qty -= 1
+        if task_name in self.failing_task_names:
+            raise Exception('Task {} failed'.format(task_name))
+        return True
+
+
+class TestFunctionGetTaskGraphReferenceErrors(unittest.TestCase):    # pragma: no cover
+
+    def test_example_01_is_valid(self):
+        configuration = parse_configuration_file(file_path='examples/example_01/example_01.yaml')
+        self.assertEqual(len(get_task_graph_reference_errors(configuration=configuration)), 0)
+        self.assertTrue(validate_configuration(configuration=configuration))
+
+    def test_unknown_task_and_profile_references(self):
+        configuration = build_configuration(
+            tasks={'t1': ['does-not-exist']},
+            deployments={'d1': (['t1'], ['None', 'missing-profile'])}
+        )
+        errors = get_task_graph_reference_errors(configuration=configuration)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue('does-not-exist' in errors[0])
+        self.assertTrue('missing-profile' in errors[1])
+
+
+class TestTaskGraph(unittest.TestCase):    # pragma: no cover
+
+    def test_task_and_profile_dependencies(self):
+        configuration = build_configuration(
+            tasks={'unit': [], 'table': [], 'lambda': ['table'], 'api': ['lambda']},
+            deployments={'test': (['unit'], ['None']), 'live': (['api'], ['test'])}
+        )
+        graph = TaskGraph(configuration=configuration, deployment_name='live')
+        self.assertEqual(graph.task_names, ['unit', 'table', 'lambda', 'api'])
+        self.assertEqual(graph.dependencies['table'], {'unit'})
+        self.assertEqual(graph.dependencies['lambda'], {'table', 'unit'})
+        self.assertEqual(graph.get_all_dependant_task_names(task_name='table'), ['lambda', 'api'])
+
+    def test_only_tasks_of_named_deployment_are_included(self):
+        configuration = build_configuration(
+            tasks={'t1': [], 't2': []},
+            deployments={'d1': (['t1'], list()), 'd2': (['t2'], list())}
+        )
+        graph = TaskGraph(configuration=configuration, deployment_name='d2')
+        self.assertEqual(graph.task_names, ['t2'])
+
+    def test_circular_task_dependencies(self):
+        configuration = build_configuration(
+            tasks={'t1': ['t3'], 't2': ['t1'], 't3': ['t2']},
+            deployments={'d1': (['t1'], list())}
+        )
+        with self.assertRaises(Exception) as context:
+            TaskGraph(configuration=configuration, deployment_name='d1')
+        self.assertTrue('Circular taskDependsOn' in str(context.exception))
+
+    def test_circular_profile_dependencies(self):
+        configuration = build_configuration(
+            tasks={'t1': [], 't2': []},
+            deployments={'d1': (['t1'], ['d2']), 'd2': (['t2'], ['d1'])}
+        )
+        with self.assertRaises(Exception) as context:
+            TaskGraph(configuration=configuration, deployment_name='d1')
+        self.assertTrue('Circular dependsOnProfile' in str(context.exception))
+
+    def test_unknown_deployment(self):
+        configuration = build_configuration(tasks={'t1': []}, deployments={'d1': (['t1'], list())})
+        with self.assertRaises(Exception):
+            TaskGraph(configuration=configuration, deployment_name='not-a-deployment')
+
+
+class TestTaskExecutor(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        # a -> b -> c and independent branch x -> y
+        self.configuration = build_configuration(
+            tasks={'a': [], 'b': ['a'], 'c': ['b'], 'x': [], 'y': ['x']},
+            deployments={'d1': (['c', 'y'], list())}
+        )
+        self.graph = TaskGraph(configuration=self.configuration, deployment_name='d1')
+
+    def test_all_tasks_succeed_in_dependency_order(self):
+        runner = RecordingTaskRunner()
+        executor = TaskExecutor(task_graph=self.graph, task_runner=runner, max_parallel_tasks=2)
+        self.assertTrue(executor.run())
+        for task_name in ('a', 'b', 'c', 'x', 'y'):
+            self.assertEqual(executor.task_states[task_name], TaskState.SUCCEEDED)
+        started = runner.started_task_names
+        self.assertTrue(started.index('a') < started.index('b') < started.index('c'))
+        self.assertTrue(started.index('x') < started.index('y'))
+
+    def test_parallelism_limit(self):
+        configuration = build_configuration(
+            tasks={'t{}'.format(i): [] for i in range(8)},
+            deployments={'d1': (['t{}'.format(i) for i in range(8)], list())}
+        )
+        graph = TaskGraph(configuration=configuration, deployment_name='d1')
+        runner = RecordingTaskRunner(delay=0.05)
+        executor = TaskExecutor(task_graph=graph, task_runner=runner, max_parallel_tasks=3)
+        self.assertTrue(executor.run())
+        self.assertTrue(runner.max_running_qty <= 3)
+        self.assertTrue(runner.max_running_qty > 1)
+
+    def test_continue_independent_policy(self):
+        runner = RecordingTaskRunner(failing_task_names=['a'])
+        executor = TaskExecutor(task_graph=self.graph, task_runner=runner, max_parallel_tasks=1, failure_policy=FailurePolicy.CONTINUE_INDEPENDENT)
+        self.assertFalse(executor.run())
+        self.assertEqual(executor.task_states['a'], TaskState.FAILED)
+        self.assertEqual(executor.task_states['b'], TaskState.SKIPPED)
+        self.assertEqual(executor.task_states['c'], TaskState.SKIPPED)
+        self.assertEqual(executor.task_states['x'], TaskState.SUCCEEDED)
+        self.assertEqual(executor.task_states['y'], TaskState.SUCCEEDED)
+        self.assertTrue('a' in executor.task_errors)
+
+    def test_fail_fast_policy(self):
+        runner = RecordingTaskRunner(failing_task_names=['a'])
+        executor = TaskExecutor(task_graph=self.graph, task_runner=runner, max_parallel_tasks=1, failure_policy=FailurePolicy.FAIL_FAST)
+        self.assertFalse(executor.run())
+        self.assertEqual(executor.task_states['a'], TaskState.FAILED)
+        self.assertEqual(runner.started_task_names[-1], 'a')
+        for task_name in ('b', 'c', 'x', 'y'):
+            if task_name not in runner.started_task_names:
+                self.assertEqual(executor.task_states[task_name], TaskState.SKIPPED)
+        self.assertEqual(executor.task_states['y'], TaskState.SKIPPED)
+
+    def test_runner_returning_false_fails_task(self):
+        executor = TaskExecutor(task_graph=self.graph, task_runner=lambda task_name, task_configuration: task_name != 'x', failure_policy=FailurePolicy.CONTINUE_INDEPENDENT)
+        self.assertFalse(executor.run())
+        self.assertEqual(executor.task_states['x'], TaskState.FAILED)
+        self.assertEqual(executor.task_states['y'], TaskState.SKIPPED)
+        self.assertEqual(executor.task_states['c'], TaskState.SUCCEEDED)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(Exception):
+            TaskExecutor(task_graph=self.graph, task_runner=RecordingTaskRunner(), max_parallel_tasks=0)
+        with self.assertRaises(Exception):
+            TaskExecutor(task_graph=self.graph, task_runner=RecordingTaskRunner(), failure_policy=99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.utils.build_context import *
+from verbacratis.utils.os_integration import run_process, exec_shell_cmd
+from verbacratis.utils.function_runner import execute_function
+from verbacratis.utils.http_requests_io import download_files
+from verbacratis.models.task_execution import TaskGraph, TaskExecutor, TaskState
+
+
+def slow_function(seconds: float=5.0):
+    time.sleep(seconds)
+    return 'done'
+
+
+class TestBuildContext(unittest.TestCase):    # pragma: no cover
+
+    def test_no_deadline(self):
+        context = BuildContext()
+        self.assertFalse(context.is_cancelled())
+        self.assertIsNone(context.get_remaining_time())
+        self.assertEqual(context.get_remaining_time(default=1.5), 1.5)
+        context.check()
+
+    def test_deadline_exceeded(self):
+        context = BuildContext(timeout=0.05)
+        self.assertFalse(context.is_cancelled())
+        time.sleep(0.1)
+        self.assertTrue(context.is_cancelled())
+        self.assertEqual(context.get_remaining_time(), 0.0)
+        with self.assertRaises(Exception) as cm:
+            context.check()
+        self.assertTrue('deadline exceeded' in str(cm.exception))
+
+    def test_invalid_timeout(self):
+        with self.assertRaises(Exception):
+            BuildContext(timeout=0)
+
+    def test_cancel_runs_cleanup_functions_once(self):
+        context = BuildContext()
+        calls = list()
+        context.register_cleanup(key='a', cleanup_function=lambda: calls.append('a'))
+        context.register_cleanup(key='b', cleanup_function=lambda: calls.append('b'))
+        context.unregister_cleanup(key='b')
+        context.cancel(reason='Testing')
+        context.cancel(reason='Testing again')
+        self.assertEqual(calls, ['a',])
+        self.assertEqual(context.cancel_reason, 'Testing')
+        context.register_cleanup(key='c', cleanup_function=lambda: calls.append('c'))
+        self.assertEqual(calls, ['a', 'c'])
+
+    def test_wait_wakes_up_on_cancel(self):
+        context = BuildContext()
+        threading.Timer(0.05, context.cancel).start()
+        start = time.monotonic()
+        self.assertTrue(context.wait(seconds=5))
+        self.assertTrue(time.monotonic() - start < 2)
+
+
+class TestRunProcess(unittest.TestCase):    # pragma: no cover
+
+    def test_run_process_without_context(self):
+        return_code, stdout_data, stderr_data = run_process(args=['/bin/sh', '-c', 'echo hello; echo oops 1>&2; exit 3'])
+        self.assertEqual(return_code, 3)
+        self.assertEqual(stdout_data.decode('utf-8').strip(), 'hello')
+        self.assertEqual(stderr_data.decode('utf-8').strip(), 'oops')
+
+    def test_run_process_with_context_completes(self):
+        return_code, stdout_data, stderr_data = run_process(args=['/bin/sh', '-c', 'sleep 0.3; echo hello'], build_context=BuildContext(timeout=10))
+        self.assertEqual(return_code, 0)
+        self.assertEqual(stdout_data.decode('utf-8').strip(), 'hello')
+
+    def test_run_process_is_stopped_at_deadline(self):
+        start = time.monotonic()
+        with self.assertRaises(Exception) as cm:
+            run_process(args=['/bin/sh', '-c', 'sleep 30'], build_context=BuildContext(timeout=0.3))
+        self.assertTrue('deadline exceeded' in str(cm.exception))
+        self.assertTrue(time.monotonic() - start < 10)
+
+    def test_run_process_is_stopped_on_cancel(self):
+        context = BuildContext()
+        threading.Timer(0.2, context.cancel, kwargs={'reason': 'Stop requested'}).start()
+        start = time.monotonic()
+        with self.assertRaises(Exception) as cm:
+            run_process(args=['/bin/sh', '-c', 'sleep 30'], build_context=context)
+        self.assertTrue('Stop requested' in str(cm.exception))
+        self.assertTrue(time.monotonic() - start < 10)
+
+    def test_run_process_not_started_when_cancelled(self):
+        context = BuildContext()
+        context.cancel()
+        with self.assertRaises(Exception):
+            run_process(args=['/bin/sh', '-c', 'echo should not run'], build_context=context)
+
+    def test_exec_shell_cmd_with_context(self):
+        self.assertEqual(exec_shell_cmd(cmd='echo hello', build_context=BuildContext(timeout=10)).strip(), 'hello')
+        with self.assertRaises(Exception):
+            exec_shell_cmd(cmd='sleep 30', build_context=BuildContext(timeout=0.2))
+
+
+class TestFunctionsWithBuildContext(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.registered_functions = {
+            'slow_function': {
+                'f': slow_function,
+                'fixed_parameters': dict(),
+            },
+        }
+
+    def test_execute_function_completes(self):
+        result = execute_function(function_template='func:slow_function(seconds=0.01)', registered_functions=self.registered_functions, build_context=BuildContext(timeout=10))
+        self.assertEqual(result, 'done')
+
+    def test_execute_function_is_abandoned_at_deadline(self):
+        start = time.monotonic()
+        with self.assertRaises(Exception):
+            execute_function(function_template='func:slow_function(seconds=30)', registered_functions=self.registered_functions, build_context=BuildContext(timeout=0.2))
+        self.assertTrue(time.monotonic() - start < 10)
+
+    def test_download_files_not_started_when_cancelled(self):
+        context = BuildContext()
+        context.cancel()
+        with self.assertRaises(Exception):
+            download_files(urls=['http://localhost:9/not-used',], build_context=context)
+
+    def test_task_executor_stops_scheduling_on_cancel(self):
+        configuration = {
+            'tasks': [{'name': 't1'}, {'name': 't2', 'taskDependsOn': ['t1']}],
+            'deployments': [{'name': 'd1', 'tasks': ['t2']}],
+        }
+        context = BuildContext()
+        def runner(task_name: str, task_configuration: dict):
+            context.cancel()
+            return True
+        executor = TaskExecutor(task_graph=TaskGraph(configuration=configuration, deployment_name='d1'), task_runner=runner, build_context=context)
+        self.assertFalse(executor.run())
+        self.assertEqual(executor.task_states['t1'], TaskState.SUCCEEDED)
+        self.assertEqual(executor.task_states['t2'], TaskState.SKIPPED)
+
+
+if __name__ == '__main__':
+    unittest.main()
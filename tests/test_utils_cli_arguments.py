@@ -72,6 +72,81 @@ class TestFunctionParseCommandLineArguments(unittest.TestCase):  # pragma: no co
             parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=self.cli_args_help)
         self.assertEqual(cm.exception.code, 0)
 
+    def test_multiple_environments_are_kept(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '-e', 'sandbox', 'test', 'prod', 'test',
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertEqual(result.environments, ['sandbox', 'test', 'prod'])
+        self.assertEqual(result.environment, 'sandbox')
+
+    def test_default_environment_when_env_is_not_supplied(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertEqual(result.environments, ['default',])
+        self.assertEqual(result.environment, 'default')
+
+    def test_timeout_sets_build_deadline(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '--timeout', '600',
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertIsNotNone(result.build_context.deadline)
+        self.assertTrue(0 < result.build_context.get_remaining_time() <= 600)
+
+    def test_read_git_objects_option(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertFalse(result.read_git_objects)
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args + ['--read-git-objects',])
+        self.assertTrue(result.read_git_objects)
+
+    def test_bundle_options(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertIsNone(result.compile_bundle_file)
+        self.assertIsNone(result.bundle_file)
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args + ['--compile', '/tmp/manifests.bundle', '--bundle', 'manifests.bundle'])
+        self.assertEqual(result.compile_bundle_file, '/tmp/manifests.bundle')
+        self.assertEqual(result.bundle_file, '{}{}manifests.bundle'.format(os.getcwd(), os.sep))
+
+    def test_export_options(self):
+        cli_args = [
+            '-s', self.config_dir,
+            '-p', self.config_dir,
+            '--conf', '{}{}test_config_file.yaml'.format(self.config_dir, os.sep),
+        ]
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertIsNone(result.export_file)
+        self.assertEqual(result.export_format, 'yaml')
+        result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args + ['--export', '/tmp/effective.json', '--export-format', 'json'])
+        self.assertEqual(result.export_file, '/tmp/effective.json')
+        self.assertEqual(result.export_format, 'json')
+
+    def test_invalid_timeout_fail_with_exit(self):
+        cli_args = ['-s', self.config_dir, '-p', self.config_dir, '--timeout', '-1']
+        with self.assertRaises(SystemExit) as cm:
+            parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=cli_args)
+        self.assertEqual(cm.exception.code, 2)
+
     def test_basic_invocation_args_complex_git_location(self):
         result = parse_command_line_arguments(state=ApplicationState(logger=get_logger()), cli_args=self.cli_args_complex)
         result.load_system_manifests()
@@ -67,6 +67,31 @@ class TestAllFunctions(unittest.TestCase):  # pragma: no cover
         self.assertIsNotNone(result)
         self.assertIsInstance(result, str)
         self.assertEqual(result, expected)
+        self.assertEqual(file_checksum(path=self.temp_file, chunk_size=1), expected)
+
+    def test_f_get_file_contents_large_file(self):
+        content = 'line: {}\r\n'.format('a' * 100) * 10000
+        with open(self.temp_file, 'w', newline='') as f:
+            f.write(content)
+        result = get_file_contents(file=self.temp_file)
+        self.assertEqual(result, content.replace('\r\n', '\n'))
+        with open(self.temp_file, 'r') as f:
+            self.assertEqual(result, f.read())
+
+    def test_f_snapshot_file(self):
+        write_content_to_file(file=self.temp_file, content='aaa')
+        target_file = '{}{}snapshot_file'.format(tempfile.gettempdir(), os.sep)
+        write_content_to_file(file=target_file, content='old content')
+        method = snapshot_file(source_file=self.temp_file, target_file=target_file)
+        self.assertTrue(method in (SnapshotMethod.REFLINK, SnapshotMethod.HARDLINK, SnapshotMethod.COPY))
+        self.assertEqual(get_file_contents(file=target_file), 'aaa')
+
+        # Replacing the source (as editors and Git do) must not change the snapshot
+        replacement_file = '{}.new'.format(self.temp_file)
+        write_content_to_file(file=replacement_file, content='bbb')
+        os.replace(replacement_file, self.temp_file)
+        self.assertEqual(get_file_contents(file=target_file), 'aaa')
+        os.remove(target_file)
 
 
 if __name__ == '__main__':
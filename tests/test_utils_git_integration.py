@@ -13,11 +13,156 @@ print('sys.path={}'.format(sys.path))
 
 import unittest
 import tempfile
+import subprocess
 from pathlib import Path
 
 
+from git.exc import GitCommandError
 from verbacratis.utils.git_integration import *
 from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
+from verbacratis.utils.build_context import BuildContext
+
+
+def create_local_test_repository(repository_dir: str, files: dict={'accounts.yaml': '---\nname: test\n'}, branch: str='main')->str:
+    """Create a Git repository with a single commit in a local directory, for tests that must not depend on the network"""
+    commands = [
+        ['git', 'init', '-q', '-b', branch, repository_dir],
+    ]
+    for file_name, data in files.items():
+        file_path = '{}{}{}'.format(repository_dir, os.sep, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(data)
+    commands.append(['git', '-C', repository_dir, 'add', '-A'])
+    commands.append(['git', '-C', repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'test commit'])
+    for command in commands:
+        subprocess.run(command, check=True)
+    return repository_dir
+
+
+class TestLocalRepositoryClone(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.repository_dir = create_local_test_repository(repository_dir=create_tmp_dir(sub_dir=random_word()))
+        self.target_dir = create_tmp_dir(sub_dir=random_word())
+
+    def tearDown(self) -> None:
+        remove_tmp_dir_recursively(dir=self.repository_dir)
+        remove_tmp_dir_recursively(dir=self.target_dir)
+
+    def test_clone_local_repository(self):
+        files = git_clone_checkout_and_return_list_of_files(git_clone_url=self.repository_dir, target_dir=self.target_dir, build_context=BuildContext(timeout=60))
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('accounts.yaml'))
+
+    def test_clone_unknown_branch_fails(self):
+        with self.assertRaises(GitCommandError) as context:
+            git_clone_to_local(git_clone_url=self.repository_dir, branch='does-not-exist', target_dir=self.target_dir)
+        self.assertNotEqual(context.exception.status, 0)
+        self.assertTrue('does-not-exist' in context.exception.stderr)
+
+    def test_clone_not_started_when_cancelled(self):
+        context = BuildContext()
+        context.cancel()
+        with self.assertRaises(Exception):
+            git_clone_to_local(git_clone_url=self.repository_dir, target_dir=self.target_dir, build_context=context)
+
+
+class TestShallowSparseClone(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.repository_dir = create_local_test_repository(
+            repository_dir=create_tmp_dir(sub_dir=random_word()),
+            files={
+                'README.md': 'test',
+                'systems/accounts.yaml': '---\nname: test\n',
+                'other/large.yaml': '---\ndata: {}\n'.format('x' * 1000),
+            }
+        )
+        with open('{}{}systems{}accounts.yaml'.format(self.repository_dir, os.sep, os.sep), 'a') as f:
+            f.write('version: 2\n')
+        subprocess.run(['git', '-C', self.repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-a', '-m', 'second commit'], check=True)
+        subprocess.run(['git', '-C', self.repository_dir, 'config', 'uploadpack.allowFilter', 'true'], check=True)
+        self.target_dir = create_tmp_dir(sub_dir=random_word())
+
+    def tearDown(self) -> None:
+        remove_tmp_dir_recursively(dir=self.repository_dir)
+        remove_tmp_dir_recursively(dir=self.target_dir)
+
+    def _git_output(self, *args)->str:
+        return subprocess.run(['git', '-C', self.target_dir] + list(args), check=True, capture_output=True).stdout.decode('utf-8').strip()
+
+    def test_clone_is_shallow_partial_and_sparse(self):
+        files = git_clone_checkout_and_return_list_of_files(
+            git_clone_url='file://{}'.format(self.repository_dir),
+            relative_start_directory='/systems',
+            target_dir=self.target_dir
+        )
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('systems{}accounts.yaml'.format(os.sep)))
+        self.assertFalse(os.path.exists('{}{}other'.format(self.target_dir, os.sep)))
+        self.assertEqual(self._git_output('rev-parse', '--is-shallow-repository'), 'true')
+        self.assertEqual(self._git_output('rev-list', '--count', 'HEAD'), '1')
+        self.assertEqual(self._git_output('config', 'remote.origin.partialclonefilter'), 'blob:none')
+
+    def test_full_clone_when_requested(self):
+        git_clone_to_local(git_clone_url='file://{}'.format(self.repository_dir), target_dir=self.target_dir, depth=None, partial_clone_filter=None)
+        self.assertEqual(self._git_output('rev-list', '--count', 'HEAD'), '2')
+        self.assertTrue(os.path.exists('{}{}other{}large.yaml'.format(self.target_dir, os.sep, os.sep)))
+
+    def test_read_tree_without_checkout(self):
+        repository_dir, revision = git_fetch_tree(git_clone_url='file://{}'.format(self.repository_dir), target_dir=self.target_dir)
+        self.assertEqual(revision, 'HEAD')
+        self.assertTrue(os.path.isfile('{}{}HEAD'.format(repository_dir, os.sep)))
+        self.assertFalse(os.path.exists('{}{}systems'.format(repository_dir, os.sep)))
+
+        tree_files = list_git_tree_files(repository_dir=repository_dir, revision=revision)
+        self.assertEqual([path for path, blob_sha in tree_files], ['other/large.yaml', 'systems/accounts.yaml'])
+        tree_files = list_git_tree_files(repository_dir=repository_dir, revision=revision, relative_start_directory='/systems')
+        self.assertEqual([path for path, blob_sha in tree_files], ['systems/accounts.yaml',])
+
+        contents = dict(read_git_blobs(repository_dir=repository_dir, blob_shas=[blob_sha for path, blob_sha in tree_files]))
+        self.assertEqual(contents[tree_files[0][1]], b'---\nname: test\nversion: 2\n')
+        self.assertEqual(list(read_git_blobs(repository_dir=repository_dir, blob_shas=[])), list())
+
+    def test_blobs_are_read_one_at_a_time(self):
+        repository_dir, revision = git_fetch_tree(git_clone_url='file://{}'.format(self.repository_dir), target_dir=self.target_dir)
+        tree_files = list_git_tree_files(repository_dir=repository_dir, revision=revision)
+        requested_blob_shas = list()
+
+        def iter_blob_shas():
+            for path, blob_sha in tree_files:
+                requested_blob_shas.append(blob_sha)
+                yield blob_sha
+
+        blobs = read_git_blobs(repository_dir=repository_dir, blob_shas=iter_blob_shas())
+        blob_sha, content = next(blobs)
+        self.assertEqual(blob_sha, tree_files[0][1])
+        self.assertEqual(requested_blob_shas, [tree_files[0][1],])
+        self.assertEqual(len(list(blobs)), 1)
+        self.assertEqual(len(requested_blob_shas), 2)
+
+        with self.assertRaises(Exception):
+            list(read_git_blobs(repository_dir=repository_dir, blob_shas=['0' * 40,]))
+
+    def test_remote_refs_are_kept_for_the_build(self):
+        build_context = BuildContext()
+        first_commit = get_git_remote_branch_commit(url=self.repository_dir, branch='main', build_context=build_context)
+        self.assertEqual(len(first_commit), 40)
+        self.assertTrue(is_url_a_git_repo(url=self.repository_dir, build_context=build_context))
+        subprocess.run(['git', '-C', self.repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '--allow-empty', '-m', 'third commit'], check=True)
+        self.assertEqual(get_git_remote_branch_commit(url=self.repository_dir, branch='main', build_context=build_context), first_commit)
+        self.assertIsNone(get_git_remote_branch_commit(url=self.repository_dir, branch='does-not-exist', build_context=build_context))
+
+        # Without a build context, and after the refs of the build were cleared, the remote is asked again
+        self.assertNotEqual(get_git_remote_branch_commit(url=self.repository_dir, branch='main'), first_commit)
+        build_context.clear_remote_refs()
+        self.assertNotEqual(get_git_remote_branch_commit(url=self.repository_dir, branch='main', build_context=build_context), first_commit)
+
+    def test_get_sparse_checkout_directory(self):
+        self.assertIsNone(get_sparse_checkout_directory(relative_start_directory='/'))
+        self.assertIsNone(get_sparse_checkout_directory(relative_start_directory=''))
+        self.assertEqual(get_sparse_checkout_directory(relative_start_directory='/systems/'), 'systems')
 
 
 class TestAllFunctions(unittest.TestCase):  # pragma: no cover
@@ -0,0 +1,123 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import subprocess
+import threading
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.utils.git_mirror_cache import *
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
+from verbacratis.utils.git_integration import git_clone_checkout_and_return_list_of_files
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.models.deployments_configuration import GitManifestLocation
+
+
+class TestGitMirrorCache(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.cache_dir = create_tmp_dir(sub_dir='TestGitMirrorCache')
+        self.repository_dir = create_tmp_dir(sub_dir='TestGitMirrorCacheRepository')
+        self.work_dir = create_tmp_dir(sub_dir='TestGitMirrorCacheWork')
+        self._git('init', '-q', '-b', 'main')
+        self._commit(file_name='systems/accounts.yaml', data='---\nversion: 1\n')
+        self.url = 'file://{}'.format(self.repository_dir)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.work_dir)
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+        remove_tmp_dir_recursively(dir=self.repository_dir)
+
+    def _git(self, *args):
+        subprocess.run(['git', '-C', self.repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args), check=True)
+
+    def _commit(self, file_name: str, data: str):
+        file_path = '{}{}{}'.format(self.repository_dir, os.sep, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(data)
+        self._git('add', '-A')
+        self._git('commit', '-q', '-m', 'update {}'.format(file_name))
+
+    def _target_dir(self, name: str)->str:
+        return '{}{}{}'.format(self.work_dir, os.sep, name)
+
+    def test_checkout_from_mirror(self):
+        cache = GitMirrorCache(cache_dir=self.cache_dir)
+        target_dir = cache.checkout(url=self.url, target_dir=self._target_dir(name='a'), build_context=BuildContext(timeout=60))
+        self.assertTrue(os.path.isfile('{}{}systems{}accounts.yaml'.format(target_dir, os.sep, os.sep)))
+        self.assertTrue(os.path.isfile('{}{}HEAD'.format(cache.get_mirror_dir(url=self.url), os.sep)))
+        # The working tree borrows the objects of the mirror
+        self.assertTrue(os.path.isfile('{}{}.git{}objects{}info{}alternates'.format(target_dir, os.sep, os.sep, os.sep, os.sep)))
+
+    def test_mirror_is_fetched_once_per_instance(self):
+        cache = GitMirrorCache(cache_dir=self.cache_dir)
+        cache.checkout(url=self.url, target_dir=self._target_dir(name='a'))
+        self._commit(file_name='systems/accounts.yaml', data='---\nversion: 2\n')
+
+        # The same repository used again in the same build is not fetched again
+        target_dir = cache.checkout(url=self.url, target_dir=self._target_dir(name='b'))
+        with open('{}{}systems{}accounts.yaml'.format(target_dir, os.sep, os.sep), 'r') as f:
+            self.assertTrue('version: 1' in f.read())
+
+        # The next build fetches the new commit into the existing mirror
+        target_dir = GitMirrorCache(cache_dir=self.cache_dir).checkout(url=self.url, target_dir=self._target_dir(name='c'))
+        with open('{}{}systems{}accounts.yaml'.format(target_dir, os.sep, os.sep), 'r') as f:
+            self.assertTrue('version: 2' in f.read())
+
+    def test_concurrent_checkouts(self):
+        errors = list()
+        def checkout(name: str):
+            try:
+                GitMirrorCache(cache_dir=self.cache_dir).checkout(url=self.url, target_dir=self._target_dir(name=name))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=checkout, args=('t{}'.format(idx),)) for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for idx in range(4):
+            self.assertTrue(os.path.isfile('{}{}systems{}accounts.yaml'.format(self._target_dir(name='t{}'.format(idx)), os.sep, os.sep)))
+
+    def test_lock_wait_respects_build_context(self):
+        cache = GitMirrorCache(cache_dir=self.cache_dir)
+        lock_file = cache._acquire_lock(url=self.url)
+        try:
+            with self.assertRaises(Exception):
+                cache.update(url=self.url, build_context=BuildContext(timeout=0.3))
+        finally:
+            cache._release_lock(lock_file=lock_file)
+
+    def test_checkout_and_return_list_of_files_with_cache(self):
+        cache = GitMirrorCache(cache_dir=self.cache_dir)
+        files = git_clone_checkout_and_return_list_of_files(git_clone_url=self.url, relative_start_directory='/systems', target_dir=self._target_dir(name='a'), git_mirror_cache=cache)
+        self.assertEqual(len(files), 1)
+        self.assertEqual(cache.updated_branches, set([(self.url, 'main'),]))
+
+    def test_git_manifest_location_with_cache(self):
+        cache = GitMirrorCache(cache_dir=self.cache_dir)
+        mirror_root = self._target_dir(name='mirrors')
+        loc = GitManifestLocation(reference=self.url, manifest_name='test', mirror_root=mirror_root, git_mirror_cache=cache)
+        self.assertEqual(len(loc.files), 1)
+        first_checksum = loc.checksum
+        self._commit(file_name='systems/accounts.yaml', data='---\nversion: 2\n')
+        loc.git_mirror_cache = GitMirrorCache(cache_dir=self.cache_dir)
+        loc.sync()
+        self.assertNotEqual(loc.checksum, first_checksum)
+        self.assertEqual(loc.mirror.index['metadata']['git_head'], subprocess.run(['git', '-C', self.repository_dir, 'rev-parse', 'HEAD'], capture_output=True).stdout.decode('utf-8').strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,10 @@
 
 import sys
 import os
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
 print('sys.path={}'.format(sys.path))
 
@@ -17,6 +21,48 @@ import tempfile
 
 from verbacratis.utils.http_requests_io import *
 from verbacratis.utils.file_io import create_tmp_dir, create_tmp_file, remove_tmp_dir_recursively
+from verbacratis.utils.build_context import BuildContext
+
+
+class LocalRequestHandler(BaseHTTPRequestHandler):
+    """Serves documents with an ETag, answers conditional requests with 304 Not Modified and records the concurrency"""
+
+    documents = dict()
+    delay = 0.0
+    requests_received = list()
+    running_qty = 0
+    max_running_qty = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with LocalRequestHandler.lock:
+            LocalRequestHandler.running_qty += 1
+            LocalRequestHandler.max_running_qty = max(LocalRequestHandler.max_running_qty, LocalRequestHandler.running_qty)
+            LocalRequestHandler.requests_received.append((self.path, self.headers.get('If-None-Match')))
+        try:
+            time.sleep(self.delay)
+            if self.path not in self.documents:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            data = self.documents[self.path]
+            etag = '"{}"'.format(hashlib.sha256(data).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with LocalRequestHandler.lock:
+                LocalRequestHandler.running_qty -= 1
+
+    def log_message(self, format, *args):
+        pass
 
 
 class TestAllFunctions(unittest.TestCase):  # pragma: no cover
@@ -74,5 +120,81 @@ class TestAllFunctions(unittest.TestCase):  # pragma: no cover
             self.assertTrue(len(file) > len(self.temp_dir))
 
 
+class TestDownloadsFromLocalServer(unittest.TestCase):  # pragma: no cover
+
+    def setUp(self):
+        self.temp_dir = create_tmp_dir(sub_dir='TestDownloadsFromLocalServer')
+        self.cache_dir = create_tmp_dir(sub_dir='TestDownloadsFromLocalServerCache')
+        LocalRequestHandler.documents = {
+            '/a.yaml': b'---\nname: a\n',
+            '/b.yaml': b'---\nname: b\n',
+            '/c.yaml': b'---\nname: c\n',
+            '/large.yaml': b'---\n' + b'# padding\n' * (DOWNLOAD_CHUNK_SIZE_BYTES // 5),
+        }
+        LocalRequestHandler.delay = 0.0
+        LocalRequestHandler.requests_received = list()
+        LocalRequestHandler.max_running_qty = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), LocalRequestHandler)
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        remove_tmp_dir_recursively(dir=self.temp_dir)
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+
+    def _read(self, file: str)->bytes:
+        with open(file, 'rb') as f:
+            return f.read()
+
+    def test_results_are_in_url_order_and_concurrent(self):
+        LocalRequestHandler.delay = 0.2
+        urls = ['{}/{}.yaml'.format(self.base_url, name) for name in ('c', 'a', 'b', 'a')]
+        files = download_files(urls=urls, target_dir=self.temp_dir, max_parallel_downloads=3)
+        self.assertEqual(len(files), 3)
+        self.assertEqual([self._read(file) for file in files], [LocalRequestHandler.documents['/{}.yaml'.format(name)] for name in ('c', 'a', 'b')])
+        self.assertEqual(LocalRequestHandler.max_running_qty, 3)
+        self.assertEqual(len(LocalRequestHandler.requests_received), 3)
+
+    def test_parallel_downloads_are_bounded(self):
+        LocalRequestHandler.delay = 0.1
+        download_files(urls=['{}/{}.yaml'.format(self.base_url, name) for name in ('a', 'b', 'c')], target_dir=self.temp_dir, max_parallel_downloads=1)
+        self.assertEqual(LocalRequestHandler.max_running_qty, 1)
+
+    def test_unchanged_files_are_not_transferred_again(self):
+        download_cache = DownloadCache(cache_dir=self.cache_dir)
+        url = '{}/large.yaml'.format(self.base_url)
+        target_file = '{}{}large.yaml'.format(self.temp_dir, os.sep)
+        self.assertTrue(download_file(url=url, target_file=target_file, download_cache=download_cache))
+        self.assertEqual(self._read(target_file), LocalRequestHandler.documents['/large.yaml'])
+        self.assertEqual(download_cache.get_metadata(url=url)['checksum'], hashlib.sha256(LocalRequestHandler.documents['/large.yaml']).hexdigest())
+
+        # The cached body is used on 304, even if the target was removed
+        os.remove(target_file)
+        self.assertFalse(download_file(url=url, target_file=target_file, download_cache=download_cache))
+        self.assertEqual(self._read(target_file), LocalRequestHandler.documents['/large.yaml'])
+        self.assertIsNone(LocalRequestHandler.requests_received[0][1])
+        self.assertIsNotNone(LocalRequestHandler.requests_received[1][1])
+
+        LocalRequestHandler.documents['/large.yaml'] = b'---\nname: changed\n'
+        self.assertTrue(download_file(url=url, target_file=target_file, download_cache=download_cache))
+        self.assertEqual(self._read(target_file), b'---\nname: changed\n')
+
+    def test_error_status_raises(self):
+        with self.assertRaises(Exception) as cm:
+            download_files(urls=['{}/a.yaml'.format(self.base_url), '{}/missing.yaml'.format(self.base_url)], target_dir=self.temp_dir)
+        self.assertTrue('404' in str(cm.exception))
+        self.assertEqual([file for file in os.listdir(self.temp_dir) if file.endswith('.part')], list())
+
+    def test_timeout_comes_from_build_context(self):
+        LocalRequestHandler.delay = 1.0
+        start = time.monotonic()
+        with self.assertRaises(Exception):
+            download_files(urls=['{}/a.yaml'.format(self.base_url),], target_dir=self.temp_dir, build_context=BuildContext(timeout=0.2))
+        self.assertTrue(time.monotonic() - start < 0.9)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,299 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import time
+import hashlib
+import subprocess
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.utils.location_mirror import *
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.file_io import create_tmp_dir, create_tmp_file, remove_tmp_dir_recursively, file_checksum
+from verbacratis.models.deployments_configuration import LocalDirectoryManifestLocation, GitManifestLocation, FileUrlManifestLocation
+
+
+class EtagRequestHandler(BaseHTTPRequestHandler):
+    """Serves a single document with an ETag, and answers conditional requests with 304 Not Modified"""
+
+    content = '---\nname: served\n'
+    requests_received = list()
+
+    def do_GET(self):
+        etag = '"{}"'.format(hashlib.sha256(self.content.encode('utf-8')).hexdigest())
+        EtagRequestHandler.requests_received.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        data = self.content.encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLocationMirrorLocalDirectory(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.mirror_root = create_tmp_dir(sub_dir='TestLocationMirrorRoot')
+        self.source_dir = create_tmp_dir(sub_dir='TestLocationMirrorSource')
+        self.file1 = create_tmp_file(tmp_dir=self.source_dir, file_name='file1.yaml', data='---\ntest1: true')
+        self.file2 = create_tmp_file(tmp_dir=self.source_dir, file_name='file2.yaml', data='---\ntest2: true')
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.mirror_root)
+        remove_tmp_dir_recursively(dir=self.source_dir)
+
+    def test_files_are_read_in_place(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        self.assertEqual(sorted(loc.files), sorted([self.file1, self.file2]))
+        self.assertEqual(loc.work_dir, self.source_dir)
+        self.assertFalse(os.path.exists(loc.mirror.files_dir) and len(os.listdir(loc.mirror.files_dir)) > 0)
+        first_checksum = loc.checksum
+
+        # The checksums of unchanged files come from the index
+        loc2 = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        self.assertEqual(loc2.checksum, first_checksum)
+        self.assertEqual(len(loc2.mirror.index['files']), 2)
+
+        time.sleep(0.01)
+        with open(self.file2, 'w') as f:
+            f.write('---\ntest2: false')
+        loc2.sync()
+        self.assertNotEqual(loc2.checksum, first_checksum)
+
+    def test_mirror_is_persistent_and_incremental(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', isolate=True, mirror_root=self.mirror_root)
+        self.assertEqual(len(loc.files), 2)
+        self.assertTrue(loc.work_dir.startswith(self.mirror_root))
+        first_checksum = loc.checksum
+        mirrored_mtimes = [os.stat(file).st_mtime_ns for file in loc.files]
+
+        # Warm start: nothing changed, so no snapshot is taken and the checksum is the same
+        loc2 = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', isolate=True, mirror_root=self.mirror_root)
+        self.assertEqual(loc2.checksum, first_checksum)
+        self.assertEqual([os.stat(file).st_mtime_ns for file in loc2.files], mirrored_mtimes)
+
+        # Replace one file (as an editor would): only that file gets a new snapshot
+        time.sleep(0.01)
+        with open('{}.new'.format(self.file2), 'w') as f:
+            f.write('---\ntest2: false')
+        os.replace('{}.new'.format(self.file2), self.file2)
+        loc2.sync()
+        self.assertNotEqual(loc2.checksum, first_checksum)
+        changed = [os.stat(file).st_mtime_ns != mtime for file, mtime in zip(loc2.files, mirrored_mtimes)]
+        self.assertEqual(sorted(changed), [False, True])
+
+    def test_removed_source_file_is_removed_from_mirror(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', isolate=True, mirror_root=self.mirror_root)
+        self.assertEqual(len(os.listdir(loc.work_dir)), 2)
+        os.remove(self.file1)
+        loc.sync()
+        self.assertEqual(len(loc.files), 1)
+        self.assertEqual(len(os.listdir(loc.work_dir)), 1)
+        self.assertEqual(len(loc.mirror.index['files']), 1)
+
+    def test_damaged_index_is_a_cold_start(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        with open(loc.mirror.index_file, 'w') as f:
+            f.write('not json')
+        loc2 = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        self.assertEqual(loc2.checksum, loc.checksum)
+
+    def test_cleanup_removes_mirror(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        mirror_dir = loc.mirror.mirror_dir
+        loc.cleanup_work_dir()
+        self.assertFalse(os.path.exists(mirror_dir))
+        self.assertEqual(len(loc.files), 0)
+        self.assertTrue(os.path.isfile(self.file1))
+        self.assertTrue(os.path.isfile(self.file2))
+
+    def test_sync_waits_for_the_lock_of_another_build(self):
+        loc = LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', mirror_root=self.mirror_root)
+        other_build_mirror = LocationMirror(reference=self.source_dir, mirror_root=self.mirror_root)
+        other_build_mirror.acquire_lock()
+        try:
+            loc.build_context = BuildContext(timeout=0.3)
+            with self.assertRaises(Exception):
+                loc.sync()
+        finally:
+            other_build_mirror.release_lock()
+        loc.build_context = None
+        loc.sync()
+        self.assertEqual(len(loc.files), 2)
+
+    def test_concurrent_syncs_keep_a_valid_index(self):
+        errors = list()
+        def sync():
+            try:
+                for _ in range(5):
+                    LocalDirectoryManifestLocation(reference=self.source_dir, manifest_name='test', isolate=True, mirror_root=self.mirror_root)
+            except:
+                errors.append(sys.exc_info()[1])
+        threads = [threading.Thread(target=sync) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        mirror = LocationMirror(reference=self.source_dir, mirror_root=self.mirror_root)
+        self.assertEqual(len(mirror.index['files']), 2)
+        self.assertEqual(len(mirror.index['metadata']['sources']), 2)
+
+
+class TestLocationMirrorChecksums(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.mirror_root = create_tmp_dir(sub_dir='TestLocationMirrorChecksumsRoot')
+        self.source_dir = create_tmp_dir(sub_dir='TestLocationMirrorChecksumsSource')
+        self.files = list()
+        for idx in range(PARALLEL_HASHING_THRESHOLD + 4):
+            self.files.append(create_tmp_file(tmp_dir=self.source_dir, file_name='file{}.yaml'.format(idx), data='---\nidx: {}\n'.format(idx)))
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.mirror_root)
+        remove_tmp_dir_recursively(dir=self.source_dir)
+
+    def test_parallel_hashing_matches_file_checksum(self):
+        mirror = LocationMirror(reference=self.source_dir, mirror_root=self.mirror_root)
+        checksums = mirror.get_checksums(paths=self.files, max_parallel_hashes=4)
+        self.assertEqual(checksums, [file_checksum(path=file) for file in self.files])
+        self.assertEqual(len(mirror.index['files']), len(self.files))
+
+    def test_unchanged_stat_uses_index(self):
+        mirror = LocationMirror(reference=self.source_dir, mirror_root=self.mirror_root)
+        first_checksum = mirror.get_checksum(path=self.files[0])
+        mirror.save_index()
+
+        # Same size and modification time, and the same inode: the index is trusted and the file is not read again
+        stat = os.stat(self.files[0])
+        with open(self.files[0], 'w') as f:
+            f.write('---\nidx: X\n')
+        os.utime(self.files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        mirror = LocationMirror(reference=self.source_dir, mirror_root=self.mirror_root)
+        self.assertEqual(mirror.get_checksum(path=self.files[0]), first_checksum)
+
+        # A replaced file has a new inode, even if the size and modification time are the same
+        replacement_file = '{}.new'.format(self.files[0])
+        with open(replacement_file, 'w') as f:
+            f.write('---\nidx: Y\n')
+        os.utime(replacement_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(replacement_file, self.files[0])
+        self.assertNotEqual(mirror.get_checksum(path=self.files[0]), first_checksum)
+
+
+class TestLocationMirrorGit(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.mirror_root = create_tmp_dir(sub_dir='TestLocationMirrorGitRoot')
+        self.repository_dir = create_tmp_dir(sub_dir='TestLocationMirrorGitRepository')
+        self._git('init', '-q', '-b', 'main')
+        self._commit(file_name='project.yaml', data='---\nversion: 1\n')
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.mirror_root)
+        remove_tmp_dir_recursively(dir=self.repository_dir)
+
+    def _git(self, *args):
+        subprocess.run(['git', '-C', self.repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args), check=True)
+
+    def _commit(self, file_name: str, data: str):
+        with open('{}{}{}'.format(self.repository_dir, os.sep, file_name), 'w') as f:
+            f.write(data)
+        self._git('add', '-A')
+        self._git('commit', '-q', '-m', 'update {}'.format(file_name))
+
+    def test_clone_then_fetch(self):
+        loc = GitManifestLocation(reference=self.repository_dir, manifest_name='test', mirror_root=self.mirror_root)
+        self.assertEqual(len(loc.files), 1)
+        first_checksum = loc.checksum
+        first_head = loc.mirror.index['metadata']['git_head']
+
+        loc.sync()
+        self.assertEqual(loc.checksum, first_checksum)
+        self.assertEqual(loc.mirror.index['metadata']['git_head'], first_head)
+
+        self._commit(file_name='project.yaml', data='---\nversion: 2\n')
+        self._commit(file_name='other.yml', data='---\nother: true\n')
+        loc.sync()
+        self.assertEqual(len(loc.files), 2)
+        self.assertNotEqual(loc.checksum, first_checksum)
+        self.assertNotEqual(loc.mirror.index['metadata']['git_head'], first_head)
+        with open([file for file in loc.files if file.endswith('project.yaml')][0], 'r') as f:
+            self.assertTrue('version: 2' in f.read())
+
+    def test_start_directories_in_one_repository(self):
+        os.makedirs('{}{}a'.format(self.repository_dir, os.sep))
+        os.makedirs('{}{}b'.format(self.repository_dir, os.sep))
+        self._commit(file_name='a{}a.yaml'.format(os.sep), data='---\nname: a\n')
+        self._commit(file_name='b{}b.yaml'.format(os.sep), data='---\nname: b\n')
+        url = 'file://{}'.format(self.repository_dir)
+        loc_a = GitManifestLocation(reference=url, manifest_name='a', relative_start_directory='/a', mirror_root=self.mirror_root)
+        loc_b = GitManifestLocation(reference=url, manifest_name='b', relative_start_directory='/b', mirror_root=self.mirror_root)
+        self.assertNotEqual(loc_a.mirror.mirror_dir, loc_b.mirror.mirror_dir)
+        self.assertEqual(len(loc_a.files), 1)
+        self.assertEqual(len(loc_b.files), 1)
+        for file in loc_a.files + loc_b.files:
+            self.assertTrue(os.path.isfile(file))
+
+        # A warm start reuses the checkout of each start directory
+        head_file = '{}{}repository{}.git{}HEAD'.format(loc_a.mirror.files_dir, os.sep, os.sep, os.sep)
+        inode = os.stat(head_file).st_ino
+        loc_a.sync()
+        loc_b.sync()
+        self.assertEqual(os.stat(head_file).st_ino, inode)
+        for file in loc_a.files + loc_b.files:
+            self.assertTrue(os.path.isfile(file))
+
+
+class TestLocationMirrorUrl(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.mirror_root = create_tmp_dir(sub_dir='TestLocationMirrorUrlRoot')
+        EtagRequestHandler.requests_received = list()
+        EtagRequestHandler.content = '---\nname: served\n'
+        self.server = HTTPServer(('127.0.0.1', 0), EtagRequestHandler)
+        self.url = 'http://127.0.0.1:{}/project.yaml'.format(self.server.server_address[1])
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        remove_tmp_dir_recursively(dir=self.mirror_root)
+
+    def test_conditional_request(self):
+        loc = FileUrlManifestLocation(reference=self.url, manifest_name='test', mirror_root=self.mirror_root)
+        first_checksum = loc.checksum
+        loc.sync()
+        self.assertEqual(loc.checksum, first_checksum)
+        self.assertIsNone(EtagRequestHandler.requests_received[0])
+        self.assertIsNotNone(EtagRequestHandler.requests_received[1])
+
+        EtagRequestHandler.content = '---\nname: changed\n'
+        loc.sync()
+        self.assertNotEqual(loc.checksum, first_checksum)
+        with open(loc.files[0], 'r') as f:
+            self.assertTrue('changed' in f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+    Copyright (c) 2023. All rights reserved. NS Coetzee <nicc777@gmail.com>
+
+    This file is licensed under GPLv3 and a copy of the license should be included in the project (look for the file
+    called LICENSE), or alternatively view the license text at
+    https://raw.githubusercontent.com/nicc777/verbacratis/main/LICENSE or https://www.gnu.org/licenses/gpl-3.0.txt
+"""
+
+import sys
+import os
+import threading
+import time
+import subprocess
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+print('sys.path={}'.format(sys.path))
+
+import unittest
+
+
+from verbacratis.utils.manifest_fetcher import *
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
+from verbacratis.utils.git_integration import git_fetch_tree
+from verbacratis.utils.build_context import BuildContext
+from verbacratis.utils.parser2 import ParsedDocumentCache
+
+
+class SlowFetcher:
+    """Simulates network fetches that complete in reverse order, and records the peak concurrency"""
+
+    def __init__(self, failing_locations: list=list()):
+        self.failing_locations = failing_locations
+        self.running_qty = 0
+        self.max_running_qty = 0
+        self.work_dirs = list()
+        self.lock = threading.Lock()
+
+    def __call__(self, location: str, build_context=None, git_mirror_cache=None, read_git_objects: bool=False, parse_cache=None, download_cache=None):
+        with self.lock:
+            self.running_qty += 1
+            self.max_running_qty = max(self.max_running_qty, self.running_qty)
+        time.sleep(0.3 - int(location) * 0.05)
+        with self.lock:
+            self.running_qty -= 1
+        if location in self.failing_locations:
+            raise Exception('Location {} not reachable'.format(location))
+        work_dir = create_tmp_dir(sub_dir='SlowFetcher{}'.format(location))
+        self.work_dirs.append(work_dir)
+        return FetchedLocation(location=location, files=['{}.yaml'.format(location),], work_dir=work_dir)
+
+
+class TestFunctionFetchLocations(unittest.TestCase):    # pragma: no cover
+
+    def test_local_files_are_not_copied(self):
+        fetched_locations = fetch_locations(locations=['/path/to/a.yaml', '/path/to/b.yaml'])
+        self.assertEqual(len(fetched_locations), 2)
+        self.assertEqual(fetched_locations[0].files, ['/path/to/a.yaml',])
+        self.assertIsNone(fetched_locations[1].work_dir)
+
+    def test_results_are_in_location_order_and_concurrent(self):
+        fetcher = SlowFetcher()
+        locations = ['1', '2', '3', '4', '5']
+        start = time.monotonic()
+        fetched_locations = fetch_locations(locations=locations, max_parallel_fetches=5, fetch_location_function=fetcher)
+        duration = time.monotonic() - start
+        self.assertEqual([fetched_location.location for fetched_location in fetched_locations], locations)
+        self.assertEqual(fetcher.max_running_qty, 5)
+        self.assertTrue(duration < 0.9, 'duration={}'.format(duration))
+        cleanup_fetched_locations(fetched_locations=fetched_locations)
+        for work_dir in fetcher.work_dirs:
+            self.assertFalse(os.path.exists(work_dir))
+
+    def test_parallel_fetches_are_bounded(self):
+        fetcher = SlowFetcher()
+        fetched_locations = fetch_locations(locations=['1', '2', '3', '4', '5'], max_parallel_fetches=2, fetch_location_function=fetcher)
+        self.assertEqual(fetcher.max_running_qty, 2)
+        cleanup_fetched_locations(fetched_locations=fetched_locations)
+
+    def test_failure_cleans_up_and_raises(self):
+        fetcher = SlowFetcher(failing_locations=['2',])
+        with self.assertRaises(Exception) as cm:
+            fetch_locations(locations=['1', '2', '3'], fetch_location_function=fetcher)
+        self.assertTrue('Location 2 not reachable' in str(cm.exception))
+        self.assertEqual(len(fetcher.work_dirs), 2)
+        for work_dir in fetcher.work_dirs:
+            self.assertFalse(os.path.exists(work_dir))
+
+    def test_invalid_max_parallel_fetches(self):
+        with self.assertRaises(Exception):
+            fetch_locations(locations=['/path/to/a.yaml',], max_parallel_fetches=0)
+
+
+class TestFunctionGetParsePool(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.source_dir = create_tmp_dir(sub_dir='TestFunctionGetParsePool')
+        self.fetched_locations = list()
+        for i in range(4):
+            file = '{}{}{}.yaml'.format(self.source_dir, os.sep, i)
+            with open(file, 'w') as f:
+                f.write('---\nfile: {}\n'.format(i))
+            self.fetched_locations.append(FetchedLocation(location=file, files=[file,]))
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.source_dir)
+
+    def test_threshold_applies_to_all_locations_together(self):
+        self.assertIsNone(get_parse_pool(fetched_locations=self.fetched_locations, parallel_parsing_threshold=5, max_parse_processes=2))
+        parse_pool = get_parse_pool(fetched_locations=self.fetched_locations, parallel_parsing_threshold=4, max_parse_processes=2)
+        self.assertIsInstance(parse_pool, ParsePool)
+        try:
+            documents = list()
+            for fetched_location in self.fetched_locations:
+                documents += list(fetched_location.iter_documents(parse_pool=parse_pool))
+        finally:
+            parse_pool.shutdown()
+        self.assertEqual(documents, [{'file': 0}, {'file': 1}, {'file': 2}, {'file': 3}])
+
+    def test_single_process_is_not_parallel(self):
+        self.assertIsNone(get_parse_pool(fetched_locations=self.fetched_locations, parallel_parsing_threshold=1, max_parse_processes=1))
+
+
+class TestFetchedLocationGitTree(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.repository_dir = create_tmp_dir(sub_dir='TestFetchedLocationGitTreeRepository')
+        self.work_dir = create_tmp_dir(sub_dir='TestFetchedLocationGitTreeWork')
+        self.cache_dir = create_tmp_dir(sub_dir='TestFetchedLocationGitTreeCache')
+        os.makedirs('{}{}projects'.format(self.repository_dir, os.sep))
+        for file_name, data in (('projects/b.yaml', '---\nname: b\n'), ('projects/a.yaml', '---\nname: a\n---\nname: a2\n'), ('README.md', 'test')):
+            with open('{}{}{}'.format(self.repository_dir, os.sep, file_name), 'w') as f:
+                f.write(data)
+        for args in (['init', '-q', '-b', 'main'], ['add', '-A'], ['-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-m', 'test']):
+            subprocess.run(['git', '-C', self.repository_dir] + args, check=True)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.repository_dir)
+        remove_tmp_dir_recursively(dir=self.work_dir)
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+
+    def test_configurations_are_read_from_git_objects(self):
+        repository_dir, revision = git_fetch_tree(git_clone_url='file://{}'.format(self.repository_dir), target_dir=self.work_dir)
+        fetched_location = FetchedLocation(
+            location='file://{}'.format(self.repository_dir),
+            files=list(),
+            work_dir=self.work_dir,
+            git_tree={'repository_dir': repository_dir, 'revision': revision, 'relative_start_directory': '/projects'}
+        )
+        parse_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        documents = list(fetched_location.iter_documents(parse_cache=parse_cache))
+        self.assertEqual(documents, [{'name': 'a'}, {'name': 'a2'}, {'name': 'b'}])
+
+        # The parsed files are cached by blob SHA, and callers may change the results without changing the cache
+        self.assertEqual(len([file for root, dirs, files in os.walk(self.cache_dir) for file in files if file.endswith('.pickle')]), 2)
+        documents[0]['name'] = 'changed'
+        self.assertEqual(list(fetched_location.iter_documents(parse_cache=parse_cache))[0]['name'], 'a')
+        fetched_location.cleanup()
+        self.assertFalse(os.path.exists(self.work_dir))
+
+    def test_git_tree_file_that_cannot_be_parsed_is_skipped(self):
+        with open('{}{}projects{}b.yaml'.format(self.repository_dir, os.sep, os.sep), 'w') as f:
+            f.write('---\nname: [b\n')
+        subprocess.run(['git', '-C', self.repository_dir, '-c', 'user.name=test', '-c', 'user.email=test@example.com', 'commit', '-q', '-a', '-m', 'broken'], check=True)
+        repository_dir, revision = git_fetch_tree(git_clone_url='file://{}'.format(self.repository_dir), target_dir=self.work_dir)
+        fetched_location = FetchedLocation(
+            location='file://{}'.format(self.repository_dir),
+            work_dir=self.work_dir,
+            git_tree={'repository_dir': repository_dir, 'revision': revision, 'relative_start_directory': '/projects'},
+            commit_cache_key='test-commit'
+        )
+        parse_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        self.assertEqual(list(fetched_location.iter_documents(parse_cache=parse_cache)), [{'name': 'a'}, {'name': 'a2'}])
+        self.assertFalse(parse_cache.has_entry(key='test-commit'))
+        fetched_location.cleanup()
+
+    def test_local_locations_have_no_git_tree(self):
+        fetched_location = fetch_location(location='/path/to/a.yaml', read_git_objects=True)
+        self.assertIsNone(fetched_location.git_tree)
+        self.assertEqual(list(fetched_location.iter_documents()), list())
+
+
+class TestCommitShortCircuit(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.cache_dir = create_tmp_dir(sub_dir='TestCommitShortCircuitCache')
+        self.source_dir = create_tmp_dir(sub_dir='TestCommitShortCircuitSource')
+        self.url = 'https://git.example.invalid/manifests.git'
+        self.commit = 'a' * 40
+        # The result of the ls-remote that identified the location as a Git repository
+        self.build_context = BuildContext()
+        self.build_context.remote_refs[self.url] = {'HEAD': self.commit, 'refs/heads/main': self.commit}
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+        remove_tmp_dir_recursively(dir=self.source_dir)
+
+    def test_unchanged_commit_is_not_cloned(self):
+        parse_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        fragment = [{'name': 'cached'},]
+        list(parse_cache.store_documents(
+            key=get_commit_cache_key(parse_cache=parse_cache, git_clone_url=self.url, branch='main', relative_start_directory='/', commit=self.commit),
+            documents=fragment
+        ))
+        fetched_location = fetch_location(location=self.url, parse_cache=parse_cache, build_context=self.build_context)
+        self.assertIsNone(fetched_location.work_dir)
+        self.assertTrue(fetched_location.from_cache)
+        self.assertEqual(list(fetched_location.iter_documents(parse_cache=parse_cache)), fragment)
+
+    def test_parsed_configurations_are_stored_by_commit(self):
+        parse_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        file1 = '{}{}a.yaml'.format(self.source_dir, os.sep)
+        with open(file1, 'w') as f:
+            f.write('---\nname: a\n')
+        key = get_commit_cache_key(parse_cache=parse_cache, git_clone_url=self.url, branch='main', relative_start_directory='/', commit=self.commit)
+        fetched_location = FetchedLocation(location=self.url, files=[file1,], commit_cache_key=key)
+        self.assertEqual(list(fetched_location.iter_documents(parse_cache=parse_cache)), [{'name': 'a'},])
+        self.assertEqual(list(parse_cache.iter_documents(key=key)), [{'name': 'a'},])
+
+    def test_incomplete_parse_is_not_stored(self):
+        parse_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        key = get_commit_cache_key(parse_cache=parse_cache, git_clone_url=self.url, branch='main', relative_start_directory='/', commit=self.commit)
+        fetched_location = FetchedLocation(location=self.url, files=['/path/does/not/exist.yaml',], commit_cache_key=key)
+        self.assertEqual(list(fetched_location.iter_documents(parse_cache=parse_cache)), list())
+        self.assertFalse(parse_cache.has_entry(key=key))
+
+
+if __name__ == '__main__':
+    unittest.main()
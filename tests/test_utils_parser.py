@@ -190,6 +190,42 @@ class TestFunctionValidateConfiguration(unittest.TestCase):    # pragma: no cove
         self.assertFalse(result)
 
 
+class TestCachedValidators(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.configuration = parse_configuration_file(file_path='/path/to/configuration', get_file_contents_function=mock_get_file_contents)
+
+    def test_validator_is_compiled_once_per_schema(self):
+        self.assertIs(get_validator(schema=TASKS_SCHEMA), get_validator(schema=TASKS_SCHEMA))
+        self.assertIsNot(get_validator(schema=TASKS_SCHEMA), get_validator(schema=DEPLOYMENT_SCHEMA))
+
+    def test_all_errors_are_collected(self):
+        self.configuration['deployments'][0] = {'name': 'this_name_is_valid', 'incorrectParameter': 123}
+        self.configuration['logging']['handlers'] = [dict(),]
+        self.configuration['tasks'][0]['name'] = 123
+        errors = get_configuration_validation_errors(configuration=self.configuration)
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith('Deployment Configuration Validation Errors'))
+        self.assertFalse(validate_configuration(configuration=self.configuration))
+
+    def test_valid_configuration_can_be_validated_again(self):
+        self.assertEqual(get_configuration_validation_errors(configuration=self.configuration), list())
+        self.assertTrue(validate_configuration(configuration=self.configuration))
+        self.assertTrue(validate_configuration(configuration=self.configuration))
+        self.configuration['tasks'][0]['name'] = 123
+        self.assertFalse(validate_configuration(configuration=self.configuration))
+
+    def test_not_a_dictionary(self):
+        self.assertEqual(len(get_configuration_validation_errors(configuration=123)), 1)
+        self.assertFalse(validate_configuration(configuration=123))
+
+    def test_missing_tasks_is_a_validation_error(self):
+        errors = get_configuration_validation_errors(configuration={'deployments': []})
+        self.assertEqual(len(errors), 1)
+        self.assertTrue('tasks' in errors[0])
+        self.assertTrue('required field' in errors[0])
+
+
 @unittest.skip("Deprecated")
 class TestFunctionFromConfigurationGetAllTaskNamesAsList(unittest.TestCase):    # pragma: no cover
 
@@ -8,6 +8,8 @@
 
 import sys
 import os
+import io
+import pickle
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
 print('sys.path={}'.format(sys.path))
 
@@ -15,6 +17,8 @@ import unittest
 
 
 from verbacratis.utils.parser2 import *
+from verbacratis.utils import parser2 as parser2_module
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
 
 
 def mock_get_file_contents(file: str)->str: # pragma: no cover
@@ -44,5 +48,257 @@ class TestFunctionParseConfigurationFile(unittest.TestCase):    # pragma: no cov
         self.assertEqual(len(configuration), 0)
 
 
+class StaticFileReader:   # pragma: no cover
+
+    def __init__(self, content: str):
+        self.content = content
+
+    def __call__(self, file: str)->str:
+        return self.content
+
+
+class TestParsedDocumentCache(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.cache_dir = create_tmp_dir(sub_dir='TestParsedDocumentCache')
+        self.cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+
+    def test_cached_result_is_used_for_the_same_content(self):
+        reader = StaticFileReader(content='---\na: 1\n---\nb: [1, 2]\n')
+        configuration1 = parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        key = self.cache.get_key(content=reader.content)
+        self.assertEqual(list(self.cache.iter_documents(key=key)), list(configuration1.values()))
+
+        # Callers may modify the result, which must not change the cache
+        configuration1['part_1']['a'] = 100
+        configuration2 = parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        self.assertEqual(configuration2, {'part_1': {'a': 1}, 'part_2': {'b': [1, 2]}})
+
+    def test_cached_result_is_not_used_for_changed_content(self):
+        reader = StaticFileReader(content='---\na: 1\n')
+        parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        reader.content = '---\na: 2\n'
+        configuration = parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        self.assertEqual(configuration['part_1']['a'], 2)
+
+    def test_key_includes_parser_version(self):
+        other_cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        other_cache.parser_version = 'another version'
+        self.assertNotEqual(self.cache.get_key(content='a: 1'), other_cache.get_key(content='a: 1'))
+
+    def test_damaged_entry_is_a_miss(self):
+        reader = StaticFileReader(content='---\na: 1\n')
+        parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        key = self.cache.get_key(content=reader.content)
+        with open(self.cache._get_entry_file(key=key), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(self.cache.load(key=key))
+        self.assertFalse(self.cache.has_entry(key=key))
+        configuration = parse_yaml_file(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        self.assertEqual(configuration['part_1']['a'], 1)
+
+
+class CountingFileReader(StaticFileReader):   # pragma: no cover
+
+    def __init__(self, content: str):
+        super().__init__(content=content)
+        self.reads = 0
+
+    def __call__(self, file: str)->str:
+        self.reads += 1
+        return self.content
+
+
+class TestFunctionIterYamlFileDocuments(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.cache_dir = create_tmp_dir(sub_dir='TestFunctionIterYamlFileDocuments')
+        self.cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+
+    def test_documents_are_yielded_as_they_are_parsed(self):
+        reader = StaticFileReader(content='---\na: 1\n---\nb: 2\n---\n[not: valid\n')
+        documents = iter_yaml_file_documents(file_path='/path/to/configuration', get_file_contents_function=reader)
+        self.assertEqual(next(documents), {'a': 1})
+        self.assertEqual(next(documents), {'b': 2})
+        with self.assertRaises(Exception) as cm:
+            next(documents)
+        self.assertTrue('Failed to parse configuration' in str(cm.exception))
+
+    def test_partially_consumed_documents_are_not_cached(self):
+        reader = StaticFileReader(content='---\na: 1\n---\nb: 2\n')
+        documents = iter_yaml_file_documents(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)
+        next(documents)
+        documents.close()
+        key = self.cache.get_key(content=reader.content)
+        self.assertFalse(self.cache.has_entry(key=key))
+        self.assertEqual(len([file for root, dirs, files in os.walk(self.cache_dir) for file in files]), 0)
+
+        self.assertEqual(list(iter_yaml_file_documents(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache)), [{'a': 1}, {'b': 2}])
+        self.assertTrue(self.cache.has_entry(key=key))
+
+    def test_damaged_entry_continues_after_yielded_documents(self):
+        reader = StaticFileReader(content='---\na: 1\n---\nb: 2\n---\nc: 3\n')
+        list(iter_yaml_file_documents(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache))
+        key = self.cache.get_key(content=reader.content)
+        with open(self.cache._get_entry_file(key=key), 'rb') as f:
+            data = f.read()
+        # Keep the first document, and damage the rest
+        first_document_length = len(pickle.dumps({'a': 1}, protocol=pickle.HIGHEST_PROTOCOL))
+        with open(self.cache._get_entry_file(key=key), 'wb') as f:
+            f.write(data[:first_document_length] + b'not a pickle')
+        documents = list(iter_yaml_file_documents(file_path='/path/to/configuration', get_file_contents_function=reader, parse_cache=self.cache))
+        self.assertEqual(documents, [{'a': 1}, {'b': 2}, {'c': 3}])
+        self.assertEqual(list(self.cache.iter_documents(key=key)), documents)
+
+
+class TestFunctionIterParsedFiles(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.source_dir = create_tmp_dir(sub_dir='TestFunctionIterParsedFilesSource')
+        self.cache_dir = create_tmp_dir(sub_dir='TestFunctionIterParsedFilesCache')
+        self.files = list()
+        for i in range(8):
+            file = '{}{}{}.yaml'.format(self.source_dir, os.sep, i)
+            with open(file, 'w') as f:
+                f.write('---\nfile: {}\n---\nfile: {}\nsecond: true\n'.format(i, i))
+            self.files.append(file)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.source_dir)
+        remove_tmp_dir_recursively(dir=self.cache_dir)
+
+    def _collect(self, **kwargs)->list:
+        return [(file, list(documents)) for file, documents in iter_parsed_files(files=self.files, **kwargs)]
+
+    def test_parallel_results_are_in_file_order(self):
+        sequential = self._collect(parallel_parsing_threshold=len(self.files) + 1)
+        parallel = self._collect(parallel_parsing_threshold=2, max_parse_processes=3)
+        self.assertEqual(parallel, sequential)
+        self.assertEqual([file for file, documents in parallel], self.files)
+        self.assertEqual(parallel[5][1], [{'file': 5}, {'file': 5, 'second': True}])
+
+    def test_workers_fill_the_parse_cache(self):
+        cache = ParsedDocumentCache(cache_dir=self.cache_dir)
+        self._collect(parse_cache=cache, parallel_parsing_threshold=2, max_parse_processes=2)
+        with open(self.files[3], 'r') as f:
+            key = cache.get_key(content=f.read())
+        self.assertEqual(list(cache.iter_documents(key=key)), [{'file': 3}, {'file': 3, 'second': True}])
+
+    def test_failed_file_raises_when_its_documents_are_read(self):
+        with open(self.files[2], 'w') as f:
+            f.write('---\n[not: valid\n')
+        results = iter_parsed_files(files=self.files, parallel_parsing_threshold=2, max_parse_processes=2)
+        for i, (file, documents) in enumerate(results):
+            if i == 2:
+                with self.assertRaises(Exception) as cm:
+                    list(documents)
+                self.assertTrue('Failed to parse configuration' in str(cm.exception))
+            else:
+                self.assertEqual(list(documents)[0], {'file': i})
+
+
+    def test_shared_parse_pool(self):
+        parse_pool = ParsePool(max_parse_processes=2)
+        try:
+            parse_pool.submit(files=self.files)
+            first = self._collect(parse_pool=parse_pool)
+            # Results are released once used, so the files are parsed again
+            second = self._collect(parse_pool=parse_pool)
+        finally:
+            parse_pool.shutdown()
+        self.assertEqual(first, self._collect(parallel_parsing_threshold=len(self.files) + 1))
+        self.assertEqual(second, first)
+
+    def test_failed_result(self):
+        result = ParsedFileResult(file_path='a.yaml', error='test error')
+        with self.assertRaises(Exception) as cm:
+            list(result)
+        self.assertTrue('test error' in str(cm.exception))
+        self.assertEqual(list(ParsedFileResult(file_path='a.yaml', documents=[{'a': 1},])), [{'a': 1},])
+
+
+class UpperCaseParserBackend(ParserBackend):    # pragma: no cover
+
+    def __init__(self):
+        super().__init__(name='upper')
+
+    def accepts(self, content: str, file_path: str=None)->bool:
+        return file_path is not None and file_path.endswith('.upper')
+
+    def iter_documents(self, content: str):
+        yield {'value': content.upper()}
+
+
+class TestParserBackends(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        reset_parser_metrics()
+
+    def test_json_is_selected_by_extension_and_by_content(self):
+        self.assertEqual(list(iter_content_documents(content='{"a": [1, 2]}', file_path='/path/to/manifest.json')), [{'a': [1, 2]},])
+        self.assertEqual(list(iter_content_documents(content='\n---\n{"kind": "Project"}\n', file_path='/path/to/manifest.yaml')), [{'kind': 'Project'},])
+        self.assertEqual(get_parser_metrics(), {'json': 2})
+
+    def test_yaml_flow_style_falls_back_to_yaml(self):
+        self.assertEqual(list(iter_content_documents(content='{a: 1}\n')), [{'a': 1},])
+        self.assertEqual(list(iter_content_documents(content='---\n{"a": 1}\n---\nb: 2\n')), [{'a': 1}, {'b': 2}])
+        metrics = get_parser_metrics()
+        self.assertEqual(metrics['json-fallback'], 2)
+        self.assertEqual(metrics[get_parser_backends()[-1].name], 2)
+
+    def test_invalid_content_raises(self):
+        with self.assertRaises(Exception):
+            list(iter_content_documents(content='[not: valid\n'))
+        with self.assertRaises(Exception):
+            list(iter_content_documents(content='{"a": 1', file_path='/path/to/manifest.json'))
+
+    def test_json_and_yaml_give_the_same_documents(self):
+        content = '{"kind": "Project", "metadata": {"name": "app", "environments": ["sandbox"]}, "spec": {"count": 2, "enabled": true, "none": null}}'
+        self.assertEqual(list(iter_content_documents(content=content)), list(yaml.load_all(content, Loader=Loader)))
+
+    def test_registered_backend_is_tried_first(self):
+        backend = UpperCaseParserBackend()
+        register_parser_backend(backend=backend)
+        try:
+            self.assertEqual(list(iter_content_documents(content='abc', file_path='/path/to/file.upper')), [{'value': 'ABC'},])
+            self.assertEqual(list(iter_content_documents(content='a: 1', file_path='/path/to/file.yaml')), [{'a': 1},])
+        finally:
+            parser2_module._parser_backends.remove(backend)
+
+
+class TestFunctionDumpDocuments(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.documents = [{'kind': 'Project', 'metadata': {'name': 'app'}}, {'kind': 'Project', 'metadata': {'name': 'base'}}]
+
+    def _iter_documents(self):
+        for data in self.documents:
+            yield data
+
+    def test_yaml_round_trip(self):
+        stream = io.StringIO()
+        dump_documents(documents=self._iter_documents(), stream=stream)
+        self.assertEqual(stream.getvalue().count('---\n'), 2)
+        self.assertEqual(list(iter_content_documents(content=stream.getvalue())), self.documents)
+
+    def test_json_round_trip(self):
+        stream = io.StringIO()
+        dump_documents(documents=self._iter_documents(), stream=stream, output_format='json')
+        self.assertEqual(json.loads(stream.getvalue()), self.documents)
+        stream = io.StringIO()
+        dump_documents(documents=list(), stream=stream, output_format='json')
+        self.assertEqual(json.loads(stream.getvalue()), list())
+
+    def test_unsupported_format(self):
+        with self.assertRaises(Exception):
+            dump_documents(documents=self.documents, stream=io.StringIO(), output_format='xml')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -8,6 +8,7 @@
 
 import sys
 import os
+import json
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
 print('sys.path={}'.format(sys.path))
 
@@ -16,6 +17,7 @@ import unittest
 
 from verbacratis.verbacratis import main
 from verbacratis.utils import *
+from verbacratis.utils.file_io import create_tmp_dir, remove_tmp_dir_recursively
 
 
 class TestFunctionMain(unittest.TestCase):    # pragma: no cover
@@ -31,5 +33,40 @@ class TestFunctionMain(unittest.TestCase):    # pragma: no cover
         self.assertIsInstance(result, dict)
 
 
+class TestFunctionMainExport(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        self.test_dir = create_tmp_dir(sub_dir='TestFunctionMainExport')
+        self.project_file = '{}{}project.yaml'.format(self.test_dir, os.sep)
+        with open(self.project_file, 'w') as f:
+            f.write("""---
+apiVersion: v1-alpha
+kind: LocalFileManifestLocation
+metadata:
+  name: app-location
+spec:
+  location: {}
+---
+apiVersion: v1-alpha
+kind: Project
+metadata:
+  name: app
+spec:
+  locations:
+  - app-location
+""".format(self.project_file))
+        self.export_file = '{}{}effective.json'.format(self.test_dir, os.sep)
+
+    def tearDown(self):
+        remove_tmp_dir_recursively(dir=self.test_dir)
+
+    def test_effective_configuration_is_exported(self):
+        result = main(cli_args=['-s', self.project_file, '-p', self.project_file, '--export', self.export_file, '--export-format', 'json'])
+        self.assertEqual(result['export'], {'file': self.export_file, 'format': 'json'})
+        with open(self.export_file, 'r') as f:
+            documents = json.load(f)
+        self.assertTrue({'kind': 'Project', 'name': 'app'} in [{'kind': data['kind'], 'name': data['metadata']['name']} for data in documents])
+
+
 if __name__ == '__main__':
     unittest.main()